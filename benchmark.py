@@ -0,0 +1,369 @@
+"""
+Infinium's benchmark suite. Generates a synthetic database of industries,
+companies, finances and stock prices at a configurable scale, then times bulk
+ingest, training data extraction, model construction, model serialization and
+batch scoring. Results are written as JSON so that runs from different commits
+can be compared with ``--compare``.
+
+Example
+  python benchmark.py --rows 100000 --output bench.json
+  python benchmark.py --rows 100000 --compare bench.json
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import date, timedelta
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib import data, db, ml
+from lib.scoring import LinearScorer
+from lib.features import FINANCE_FEATURES, StreamingNormalizer, finance_matrix
+from lib.ui.config import get_config
+
+
+# Module header.
+__maintainer__ = data.Developer.JERRAD_GENSON
+__contact__ = data.Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+TRADING_DAYS_PER_YEAR = 252
+FIRST_YEAR = 2000
+INSERT_BATCH_SIZE = 50000
+INDUSTRY_COUNT = 20
+
+
+def main():
+    """
+    Parse command line, run every benchmark and report the results.
+
+    Returns
+      None; exits with a nonzero status if ``--compare`` finds a regression.
+
+    """
+
+    cl_args = parse_command_line()
+    results = run_benchmarks(cl_args)
+    document = json.dumps(results, indent=2, sort_keys=True)
+    if cl_args.output:
+        Path(cl_args.output).write_text(document + '\n')
+
+    else:
+        print(document)
+
+    if cl_args.compare:
+        baseline = json.loads(Path(cl_args.compare).read_text())
+        regressions = compare_results(baseline, results, cl_args.tolerance)
+        for name, old, new in regressions:
+            msg = 'REGRESSION {}: {:.4f}s -> {:.4f}s'.format(name, old, new)
+            print(msg, file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+def parse_command_line():
+    """
+    Parse command line arguments to the benchmark suite.
+
+    Returns
+      An instance of ``argparse.Namespace``.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark {}.'.format(data.PROGRAM_NAME))
+    parser.add_argument('--rows',
+                        help='Approximate number of stock price rows to generate.',
+                        type=int,
+                        default=10000)
+
+    parser.add_argument('--years',
+                        help='Years of price and finance history per company.',
+                        type=int,
+                        default=10)
+
+    parser.add_argument('--url',
+                        help='SQLAlchemy URL of an empty database to benchmark against. '
+                             'Defaults to a temporary SQLite file.')
+
+    parser.add_argument('--seed',
+                        help='Seed for the synthetic data generator.',
+                        type=int,
+                        default=0)
+
+    parser.add_argument('--output',
+                        help='Write JSON results to this file instead of stdout.')
+
+    parser.add_argument('--compare',
+                        help='JSON results of an earlier run to check for regressions.')
+
+    parser.add_argument('--tolerance',
+                        help='Slowdown ratio above which a stage counts as a regression.',
+                        type=float,
+                        default=1.2)
+
+    return parser.parse_args()
+
+
+def run_benchmarks(cl_args):
+    """
+    Generate the synthetic database and time every stage. The training
+    checkpoint and label cache are kept in the temporary work directory
+    alongside the database, rather than at their configured paths.
+
+    Args
+      cl_args: A namespace created by ``parse_command_line``.
+
+    Returns
+      A dict of run metadata and per-stage timings.
+
+    """
+
+    company_count = max(1, -(-cl_args.rows // (cl_args.years * TRADING_DAYS_PER_YEAR)))
+    configuration = get_config()
+    with tempfile.TemporaryDirectory() as work_dir, \
+         configuration.override('general', checkpoint_path=str(Path(work_dir) / 'training.ckpt')), \
+         configuration.override('labels', cache_path=str(Path(work_dir) / 'labels.npz')):
+        url = cl_args.url or 'sqlite:///{}'.format(Path(work_dir) / 'benchmark.db')
+        Session = db.connect_database(url)
+        generator = SyntheticData(company_count, cl_args.years, cl_args.seed)
+        stages = {}
+
+        stages['ingest'] = time_stage(ingest, Session, generator)
+        stages['extract_training_data'] = time_stage(lambda: list(ml.extract_training_data(Session)))
+        stages['construct_model'] = time_stage(ml.construct_model, Session)
+
+        valuation_model = stages['construct_model'].pop('result', None)
+        if valuation_model is None:
+            valuation_model = generator.fallback_model()
+
+        model_path = str(Path(work_dir) / 'valuation_model.pkl')
+        stages['save_model'] = time_stage(ml.save_model, valuation_model, model_path)
+        stages['load_model'] = time_stage(ml.load_model, model_path)
+        stages['score'] = time_stage(score, Session, valuation_model)
+
+        artifact_path = str(Path(work_dir) / 'valuation_model.npz')
+        stages['export_scoring_artifact'] = time_stage(ml.export_scoring_artifact, valuation_model, artifact_path)
+        stages['load_scoring_artifact'] = time_stage(LinearScorer.load, artifact_path)
+        scorer = stages['load_scoring_artifact'].get('result')
+        if scorer is not None:
+            stages['score_scoring_artifact'] = time_stage(score, Session, scorer)
+
+    for stage in stages.values():
+        stage.pop('result', None)
+
+    return {'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': url.split(':', 1)[0],
+            'seed': cl_args.seed,
+            'companies': company_count,
+            'years': cl_args.years,
+            'stock_rows': company_count * cl_args.years * TRADING_DAYS_PER_YEAR,
+            'finance_rows': company_count * cl_args.years,
+            'stages': stages}
+
+
+def time_stage(function, *args):
+    """
+    Call ``function`` with ``args`` and measure it.
+
+    Returns
+      A dict with the wall clock ``seconds`` and the process' peak resident
+      memory ``max_rss_kb`` after the call, or a ``skipped`` reason if the
+      operation is not implemented. The return value of ``function`` is kept
+      under ``result``.
+
+    """
+
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+
+    except NotImplementedError as error:
+        return {'skipped': str(error)}
+
+    seconds = time.perf_counter() - start
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {'seconds': seconds, 'max_rss_kb': max_rss_kb, 'result': result}
+
+
+def ingest(Session, generator):
+    """ Bulk load every synthetic table, committing once per table. """
+
+    session = Session()
+    for table, batches in generator.tables():
+        for rows in batches:
+            db.bulk_insert(session, table, rows)
+
+        session.commit()
+
+
+def score(Session, valuation_model):
+    """ Score every company by its latest finances with one predict call. """
+
+    session = Session()
+    snapshots = [snapshot for snapshot in db.get_company_snapshots(session)
+                 if snapshot.finance_year is not None]
+
+    industries = db.get_company_industries(session)
+    industry_ids = [industries[snapshot.company_id] for snapshot in snapshots]
+
+    return valuation_model.predict(finance_matrix(snapshots), industry_ids)
+
+
+def compare_results(baseline, results, tolerance):
+    """
+    Find stages that got slower than ``tolerance`` times their baseline.
+
+    Returns
+      A list of (stage name, baseline seconds, new seconds) tuples.
+
+    """
+
+    regressions = []
+    for name, stage in sorted(results['stages'].items()):
+        old = baseline['stages'].get(name, {}).get('seconds')
+        new = stage.get('seconds')
+        if old and new and new > old * tolerance:
+            regressions.append((name, old, new))
+
+    return regressions
+
+
+def _git_commit():
+    """ Return the current git commit hash, or None outside a git checkout. """
+
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         cwd=str(data.INSTALL_PATH),
+                                         stderr=subprocess.DEVNULL)
+
+        return output.decode().strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class SyntheticData:
+    """
+    Deterministic generator of synthetic Infinium tables. Stock prices follow
+    a geometric random walk, and finances are drawn around plausible values.
+    Rows are produced in batches so that memory use does not grow with scale.
+    """
+
+    def __init__(self, company_count, years, seed):
+        self.company_count = company_count
+        self.years = years
+        self.seed = seed
+        self.company_ids = ['C{:07d}'.format(i) for i in range(company_count)]
+
+    def tables(self):
+        """
+        Yield (mapped class, iterable of row batches) pairs in foreign key
+        order.
+        """
+
+        yield db.Industry, [[{'id': i + 1, 'name': 'Industry {}'.format(i + 1)}
+                             for i in range(INDUSTRY_COUNT)]]
+
+        yield db.Company, self._batched({'id': company_id,
+                                         'industry_id': i % INDUSTRY_COUNT + 1,
+                                         'name': 'Company {}'.format(company_id)}
+                                        for i, company_id in enumerate(self.company_ids))
+
+        yield db.Finances, self._batched(self._finances())
+        yield db.Stock, self._batched(self._stocks())
+
+    def fallback_model(self):
+        """
+        Fit a classifier to random labels, for benchmarking serialization and
+        scoring when ``construct_model`` is unavailable.
+        """
+
+        random = np.random.RandomState(self.seed)
+        features = random.normal(size=(1000, len(FINANCE_FEATURES)))
+        industry_ids = random.randint(1, INDUSTRY_COUNT + 1, size=1000)
+        valuation_model = ml.ValuationModel(ml.create_classifier(),
+                                            StreamingNormalizer(len(FINANCE_FEATURES)),
+                                            industries=range(1, INDUSTRY_COUNT + 1))
+
+        training_data = [(features, industry_ids, random.randint(0, 2, size=1000))]
+        ml.fit_normalizer(valuation_model, training_data)
+        ml.train_classifier(valuation_model, training_data)
+
+        return valuation_model
+
+    def _finances(self):
+        random = np.random.RandomState(self.seed)
+        for company_id in self.company_ids:
+            values = random.normal(loc=1.0, scale=0.5, size=(self.years, len(FINANCE_FEATURES)))
+            values[:, FINANCE_FEATURES.index('net_sales')] *= 1e9
+            values[:, FINANCE_FEATURES.index('net_income')] *= 1e8
+            for offset, row in enumerate(values.tolist()):
+                record = dict(zip(FINANCE_FEATURES, row))
+                record['company_id'] = company_id
+                record['year'] = date(FIRST_YEAR + offset, 1, 1)
+                yield record
+
+    def _stocks(self):
+        random = np.random.RandomState(self.seed + 1)
+        days = self.years * TRADING_DAYS_PER_YEAR
+        start = date(FIRST_YEAR, 1, 3)
+        dates = [start + timedelta(days=day * 365 // TRADING_DAYS_PER_YEAR)
+                 for day in range(days)]
+
+        for company_id in self.company_ids:
+            returns = random.normal(loc=0.0003, scale=0.02, size=days)
+            prices = 20.0 * np.exp(np.cumsum(returns))
+            for stock_date, price in zip(dates, prices.tolist()):
+                yield {'company_id': company_id,
+                       'date': stock_date,
+                       'price': price,
+                       'intrinsic_value': None}
+
+    @staticmethod
+    def _batched(rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == INSERT_BATCH_SIZE:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+
+if __name__ == '__main__':
+    main()
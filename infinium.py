@@ -25,11 +25,13 @@ along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
 
 # Python standard library imports.
 import sys
+import atexit
 import logging
+from contextlib import ExitStack
 
 # Infinium library imports.
-from lib import data
-from lib.ui.cli import parse_command_line, launch_cli
+from lib import data, log, metrics
+from lib.ui.cli import parse_command_line, launch_cli, run_batch
 from lib.ui.config import get_config, ConfigurationError
 
 
@@ -65,42 +67,63 @@ def main():
     # Configure root Logger.
     configure_logging(cl_args)
 
-    # Launch user interface.
-    if cl_args.graphical:
-        # Use graphical user interface.
-        raise NotImplementedError('GUI under construction. Please use CLI.')
+    # Export metrics when the program exits.
+    if cl_args.metrics:
+        atexit.register(metrics.write_prometheus, cl_args.metrics)
 
-    else:
-        # Use command line interface.
-        launch_cli()
+    with ExitStack() as stack:
+        if cl_args.profile:
+            stack.enter_context(metrics.profile(cl_args.profile))
+
+        # Run a batch operation without user interaction.
+        if cl_args.command:
+            exit_code = run_batch(cl_args)
+            sys.exit(exit_code.value)
+
+        # Launch user interface.
+        elif cl_args.graphical:
+            # Use graphical user interface.
+            raise NotImplementedError('GUI under construction. Please use CLI.')
+
+        else:
+            # Use command line interface.
+            launch_cli()
 
 
 def configure_logging(cl_args):
     """
-    Configure root Logger for Infinium.
+    Configure root Logger for Infinium. Records are queued by the emitting
+    thread and formatted and written by a background thread.
 
     Args
       cl_args: A namespace created by ``argparse``.
 
     Returns
-      None
+      The ``QueueListener`` that writes log records.
 
     """
 
     configuration = get_config()
     log_level = logging.DEBUG if cl_args.debug or configuration.debug else logging.INFO
-    formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s',
-                                  datefmt='%m/%d/%Y %I:%M:%S %p')
+    formatter = log.create_formatter(configuration.log_format)
 
     root = logging.getLogger()
     root.setLevel(log_level)
-    file_handler = logging.FileHandler(str(configuration.log_path))
+    file_handler = log.create_file_handler(configuration.log_path,
+                                           max_bytes=configuration.log_max_bytes,
+                                           rotate_when=configuration.log_rotate_when,
+                                           backup_count=configuration.log_backup_count)
+
     file_handler.setFormatter(formatter)
-    root.addHandler(file_handler)
+    handlers = [file_handler]
     if cl_args.verbose or configuration.verbose:
         stderr_handler = logging.StreamHandler(sys.stderr)
         stderr_handler.setFormatter(formatter)
-        root.addHandler(stderr_handler)
+        handlers.append(stderr_handler)
+
+    return log.start_queue_logging(root,
+                                   handlers,
+                                   debug_sample_rate=configuration.log_debug_sample_rate)
 
 
 if __name__ == '__main__':
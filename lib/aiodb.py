@@ -0,0 +1,205 @@
+"""
+Asynchronous access to the Infinium database, for ingest and scoring jobs
+that benefit from having many queries in flight at once. Connections use
+SQLAlchemy's asyncio extension with asyncpg for PostgreSQL and aiosqlite for
+SQLite. The query helpers run the synchronous helpers of ``lib.db`` on an
+``AsyncSession``, so both APIs always behave the same, and read replica
+routing, instrumentation and stock partitioning apply to both.
+
+The synchronous API in ``lib.db`` remains the default. This module is only
+imported by operations that ask for concurrency.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import asyncio
+from contextlib import asynccontextmanager
+
+# Third-party library imports.
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+# Infinium library imports.
+from lib import db, metrics
+from lib.data import Developer
+from lib.querystats import QUERY_STATISTICS
+from lib.ui.config import get_config
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Maps database dialects to their asyncio drivers.
+ASYNC_DRIVERS = {'postgresql': 'asyncpg',
+                 'sqlite': 'aiosqlite'}
+
+
+class _AsyncRoutingSession(db.RoutingSession):
+    """ The synchronous session wrapped by every ``AsyncSession``. """
+
+
+@asynccontextmanager
+async def connect_database_async(url=None):
+    """
+    Asynchronous context manager that connects to the Infinium database with
+    an asyncio driver, and creates the schema if needed. The engines are
+    disposed of, closing their connections, when the block exits, which must
+    happen before the event loop closes.
+
+    Args
+      url: SQLAlchemy URL of the database to connect to. Defaults to the URL
+           described by the ``database`` section of the configuration file.
+           The driver is replaced by the dialect's asyncio driver. An
+           explicit URL disables replica routing.
+
+    Returns
+      A factory of ``AsyncSession`` objects, as the target of ``async with``.
+
+    """
+
+    configuration = get_config()
+    engine = _create_async_engine(url or db.database_url())
+    replica = None
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(db.create_schema)
+
+        replica_url = None if url else configuration.db_replica_url
+        replica = _create_async_engine(replica_url) if replica_url else None
+        if configuration.db_partition_stocks:
+            event.listen(_AsyncRoutingSession, 'before_flush', db._ensure_flushed_stock_partitions)
+
+        Session = sessionmaker(class_=AsyncSession,
+                               sync_session_class=_AsyncRoutingSession,
+                               primary=engine.sync_engine,
+                               replica=replica.sync_engine if replica else None,
+                               expire_on_commit=False)
+
+        async with Session() as session:
+            await session.run_sync(db.backfill_company_snapshot)
+
+        yield Session
+
+    finally:
+        await engine.dispose()
+        if replica is not None:
+            await replica.dispose()
+
+
+def async_database_url(url):
+    """ Return ``url`` with its driver replaced by the dialect's asyncio driver. """
+
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError('No asyncio driver is known for `{}` databases.'.format(backend))
+
+    return url.set(drivername='{}+{}'.format(backend, ASYNC_DRIVERS[backend]))
+
+
+def _create_async_engine(url):
+    """ Create an asyncio engine for ``url`` with Infinium's instrumentation attached. """
+
+    configuration = get_config()
+    engine = create_async_engine(async_database_url(url), echo=configuration.db_echo)
+    metrics.instrument_engine(engine.sync_engine)
+    if configuration.db_query_stats:
+        QUERY_STATISTICS.slow_query_seconds = configuration.db_slow_query_ms / 1000
+        QUERY_STATISTICS.attach(engine.sync_engine)
+        QUERY_STATISTICS.log_summary_at_exit()
+
+    return engine
+
+
+async def get_company_snapshots(session, company_ids=None):
+    """ Asynchronous ``lib.db.get_company_snapshots``. """
+
+    return await session.run_sync(db.get_company_snapshots, company_ids)
+
+
+async def get_stock_prices(session, start=None, end=None, company_ids=None):
+    """ Asynchronous ``lib.db.get_stock_prices``. """
+
+    return await session.run_sync(db.get_stock_prices, start, end, company_ids)
+
+
+async def get_watermark(session):
+    """ Asynchronous ``lib.db.get_watermark``. """
+
+    return await session.run_sync(db.get_watermark)
+
+
+async def bulk_insert(session, table, rows):
+    """ Asynchronous ``lib.db.bulk_insert``. The caller is responsible for committing. """
+
+    return await session.run_sync(db.bulk_insert, table, rows)
+
+
+async def bulk_insert_concurrently(Session, table, batches, concurrency):
+    """
+    Insert batches of rows, each in its own transaction, with up to
+    ``concurrency`` transactions in flight at once. A failed batch is rolled
+    back, and batches committed before it are kept. Batches of Stock or
+    Finances rows should not share companies, because concurrent transactions
+    updating the same company snapshot conflict.
+
+    Only PostgreSQL supports concurrent writers. SQLite locks the whole
+    database for every write transaction, so on SQLite the batches are
+    inserted one transaction at a time whatever ``concurrency`` is.
+
+    Stock partitions for every year in the batches are created first, in a
+    transaction of their own, so that concurrent transactions do not race
+    to create the same partitions.
+
+    Args
+      Session: A factory returned by ``connect_database_async``.
+      table: The mapped class to insert into, e.g. ``lib.db.Stock``.
+      batches: An iterable of lists of row dicts.
+      concurrency: Maximum number of concurrent transactions.
+
+    Returns
+      The total number of rows inserted.
+
+    """
+
+    if Session.kw['primary'].dialect.name == 'sqlite':
+        concurrency = 1
+
+    batches = list(batches)
+    if table is db.Stock and get_config().db_partition_stocks:
+        years = {row['date'].year for rows in batches for row in rows}
+        async with Session() as session:
+            async with session.begin():
+                await session.run_sync(db.ensure_stock_partitions, years)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def insert(rows):
+        async with semaphore, Session() as session:
+            async with session.begin():
+                return await bulk_insert(session, table, rows)
+
+    counts = await asyncio.gather(*(insert(rows) for rows in batches))
+    return sum(counts)
+
@@ -0,0 +1,217 @@
+"""
+Historical backtests of valuation models. A backtest walks a sequence of
+as-of dates. At each date it scores every company using only the finances
+that were available then, buys an equal-weighted portfolio of the companies
+the model ranks as most undervalued, and holds it until the next date.
+
+The history is loaded once into columnar ``lib.labels.Timeline`` objects, and
+all point-in-time lookups and all scoring for every date are done with single
+vectorized calls, so long backtests over large universes stay fast.
+
+A model's training labels are forward returns over the whole price history it
+was trained on, so only dates after its training watermark are out of sample;
+see ``check_training_watermark``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import logging
+from datetime import date
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib import db, metrics
+from lib.data import Developer
+from lib.features import FINANCE_FEATURES
+from lib.labels import Timeline, date_days, year_start_days
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+def load_history(Session):
+    """
+    Load the full price and finance history into memory.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+
+    Raises
+      ValueError if there are no stock prices.
+
+    Returns
+      A tuple of (prices, finances, features, industry IDs). ``prices`` is a
+      Timeline of stock prices. ``finances`` is a Timeline, over the same
+      companies, of the row in ``features`` that became available on each
+      day; finances for a year become available on January 1st of the
+      following year. Industry IDs holds the industry of every company in
+      ``prices.companies``, or -1 if unknown.
+
+    """
+
+    session = Session()
+    with metrics.span('backtest_load_history'):
+        prices = Timeline.from_stock_history(session)
+        if not len(prices.keys):
+            raise ValueError('There are no stock prices to backtest against.')
+
+        columns = [getattr(db.Finances, feature) for feature in FINANCE_FEATURES]
+        rows = session.query(db.Finances.company_id, db.Finances.year, *columns).all()
+        industries = db.get_company_industries(session)
+
+    company_ids = [row[0] for row in rows]
+    available_days = year_start_days(np.array([row[1].year for row in rows], dtype=np.int64) + 1)
+    features = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(FINANCE_FEATURES))
+    finances = Timeline(company_ids, available_days, np.arange(len(rows)), companies=prices.companies)
+    industry_ids = np.array([industries.get(company_id, -1) for company_id in prices.companies.tolist()],
+                            dtype=np.int64)
+
+    return prices, finances, features, industry_ids
+
+
+def monthly_dates(start, end, months=1):
+    """
+    Return the first day of every ``months``-th month from ``start`` to
+    ``end``, inclusive.
+    """
+
+    dates = []
+    year, month = start.year, start.month
+    while date(year, month, 1) <= end:
+        if date(year, month, 1) >= start:
+            dates.append(date(year, month, 1))
+
+        year, month = year + (month - 1 + months) // 12, (month - 1 + months) % 12 + 1
+
+    return dates
+
+
+def check_training_watermark(watermark, start, allow_lookahead=False):
+    """
+    Check that a model was trained only on prices up to the first as-of date
+    of a backtest. A model trained on later prices was labeled with the very
+    returns that the backtest measures.
+
+    Args
+      watermark: The ``lib.db.get_watermark`` tuple of the model's training
+                 data, or None if it is unknown.
+      start: The first as-of date of the backtest.
+      allow_lookahead: Log a warning instead of raising an error if the model
+                       was trained on later prices.
+
+    Raises
+      ValueError if the model was trained on prices after ``start`` and
+      ``allow_lookahead`` is False.
+
+    Returns
+      None
+
+    """
+
+    if watermark is None:
+        logging.warning('The training watermark of the model is unknown, so the backtest may use '
+                        'returns that the model was trained on.')
+        return
+
+    latest_price = watermark[1]
+    if latest_price is None or latest_price <= start.isoformat():
+        return
+
+    msg = 'The model was trained on prices up to {}, after the backtest start {}.'.format(latest_price, start)
+    if not allow_lookahead:
+        raise ValueError(msg + ' Start after the training watermark, or allow look-ahead.')
+
+    logging.warning(msg + ' Returns before that date were used to train it.')
+
+
+def run_backtest(history, valuation_model, as_of_dates, top_n):
+    """
+    Simulate investing by ``valuation_model`` at every date in
+    ``as_of_dates``. Companies are scored with the finances available on the
+    as-of date, and bought and sold at their first prices strictly after the
+    as-of dates, so no period's return is known when it is chosen.
+
+    Args
+      history: A tuple returned by ``load_history``.
+      valuation_model: Any model with a ``decision_function`` where a positive
+                       score means undervalued, such as ``ValuationModel`` or
+                       ``lib.scoring.LinearScorer``.
+      as_of_dates: Ascending list of rebalancing dates.
+      top_n: Maximum number of companies to hold in each period.
+
+    Returns
+      A dict with a ``periods`` list, holding for every period its start
+      date, number of holdings, portfolio return and the equal-weighted return
+      of the whole universe, and a ``summary`` of cumulative returns.
+
+    """
+
+    prices, finances, features, industry_ids = history
+    days = date_days(as_of_dates)[:, None]
+    codes = np.arange(len(prices.companies))[None, :]
+
+    # Point-in-time lookups for every (date, company) pair at once.
+    finance_index = finances.last_at_or_before(codes, days)
+    listed = prices.last_at_or_before(codes, days) >= 0
+    trade_index = prices.first_at_or_after(codes, days + 1)
+
+    # Score every company at every date with one call.
+    scored = (finance_index >= 0) & listed
+    scores = np.full(scored.shape, np.nan)
+    if scored.any():
+        with metrics.span('backtest_score'):
+            rows = finances.values[finance_index[scored]]
+            industries = np.broadcast_to(industry_ids, scored.shape)[scored]
+            scores[scored] = valuation_model.decision_function(features[rows], industries)
+
+    # Return of every company from each date to the next, between the first
+    # trades after the dates. A company that did not trade before the next
+    # date has no return.
+    start, end = trade_index[:-1], trade_index[1:]
+    traded = (start >= 0) & (end >= 0)
+    traded[traded] &= prices.days[start[traded]] <= np.broadcast_to(days[1:], start.shape)[traded]
+    returns = np.full(start.shape, np.nan)
+    returns[traded] = prices.values[end[traded]] / prices.values[start[traded]] - 1.0
+
+    periods = []
+    for period in range(len(as_of_dates) - 1):
+        candidates = np.flatnonzero(scored[period] & traded[period] & (scores[period] > 0))
+        ranked = candidates[np.argsort(-scores[period, candidates], kind='mergesort')[:top_n]]
+        universe = returns[period, traded[period]]
+        periods.append({'date': as_of_dates[period].isoformat(),
+                        'holdings': len(ranked),
+                        'return': float(returns[period, ranked].mean()) if len(ranked) else 0.0,
+                        'universe_return': float(universe.mean()) if len(universe) else 0.0})
+
+    return {'periods': periods, 'summary': _summarize(periods)}
+
+
+def _summarize(periods):
+    """ Compound period returns of the portfolio and of the universe. """
+
+    portfolio = np.prod([1 + period['return'] for period in periods]) - 1
+    universe = np.prod([1 + period['universe_return'] for period in periods]) - 1
+
+    return {'periods': len(periods),
+            'cumulative_return': float(portfolio),
+            'universe_cumulative_return': float(universe)}
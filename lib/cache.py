@@ -0,0 +1,159 @@
+"""
+A persistent cache of valuation results: the valuation, and the mean and
+standard deviation of the model's scores. A valuation is keyed on the company,
+the watermark of the company's own history, i.e. the dates of its latest
+stock price and finances, and the version of the model that computed it, so a
+cached valuation is reused until either the company's data or the active model
+changes.
+
+The cache is a small SQLite database separate from the Infinium database, so
+lookups need no database server. Its size is bounded by evicting the least
+recently used entries.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import time
+import sqlite3
+from pathlib import Path
+
+# Infinium library imports.
+from lib.data import Developer
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Maximum number of companies looked up per query, below SQLite's limit on
+# query parameters.
+_LOOKUP_BATCH_SIZE = 500
+
+# Version of ``_SCHEMA``, kept in the file's ``user_version``. Caches of
+# other versions are discarded.
+_SCHEMA_VERSION = 1
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS valuations (
+    company_id TEXT NOT NULL,
+    watermark TEXT NOT NULL,
+    model TEXT NOT NULL,
+    valuation INTEGER NOT NULL,
+    score REAL NOT NULL,
+    deviation REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (company_id, watermark, model)
+);
+CREATE INDEX IF NOT EXISTS valuations_last_used ON valuations (last_used);
+'''
+
+
+def snapshot_watermark(snapshot):
+    """ Return the watermark of a company's history from its ``CompanySnapshot``. """
+
+    return '{}/{}'.format(snapshot.stock_date, snapshot.finance_year)
+
+
+class ValuationCache:
+    """
+    Valuations cached in a SQLite file, which is created on first use.
+
+    Args
+      path: Path of the SQLite file.
+      max_entries: Number of entries to keep when evicting.
+
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(str(self.path))
+        # Write-ahead logging lets readers proceed while another process writes.
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        version, = self.__connection.execute('PRAGMA user_version').fetchone()
+        if version != _SCHEMA_VERSION:
+            self.__connection.executescript('DROP TABLE IF EXISTS valuations;' + _SCHEMA +
+                                            'PRAGMA user_version = {};'.format(_SCHEMA_VERSION))
+
+    def get_many(self, model, watermarks):
+        """
+        Look up cached valuations, marking every hit as recently used.
+
+        Args
+          model: Version of the model whose valuations to look up.
+          watermarks: A dict mapping company IDs to their current watermarks.
+
+        Returns
+          A dict mapping the IDs of the companies found to (valuation, score,
+          deviation) tuples.
+
+        """
+
+        company_ids = list(watermarks)
+        found = {}
+        for start in range(0, len(company_ids), _LOOKUP_BATCH_SIZE):
+            batch = company_ids[start:start + _LOOKUP_BATCH_SIZE]
+            query = ('SELECT company_id, watermark, valuation, score, deviation FROM valuations '
+                     'WHERE model = ? AND company_id IN ({})'.format(', '.join('?' * len(batch))))
+
+            for company_id, watermark, *valuation in self.__connection.execute(query, [model] + batch):
+                if watermarks[company_id] == watermark:
+                    found[company_id] = tuple(valuation)
+
+        with self.__connection:
+            self.__connection.executemany('UPDATE valuations SET last_used = ? '
+                                          'WHERE company_id = ? AND watermark = ? AND model = ?',
+                                          [(time.time(), company_id, watermarks[company_id], model)
+                                           for company_id in found])
+
+        return found
+
+    def put_many(self, model, watermarks, valuations):
+        """
+        Store valuations, then evict the least recently used entries above
+        ``max_entries``.
+
+        Args
+          model: Version of the model that computed the valuations.
+          watermarks: A dict mapping company IDs to their current watermarks.
+          valuations: A dict mapping company IDs to (valuation, score,
+                      deviation) tuples.
+
+        Returns
+          None
+
+        """
+
+        now = time.time()
+        with self.__connection:
+            self.__connection.executemany('INSERT OR REPLACE INTO valuations VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                          [(company_id, watermarks[company_id], model) + tuple(valuation) + (now,)
+                                           for company_id, valuation in valuations.items()])
+
+            count, = self.__connection.execute('SELECT count(*) FROM valuations').fetchone()
+            if count > self.max_entries:
+                self.__connection.execute('DELETE FROM valuations WHERE rowid IN '
+                                          '(SELECT rowid FROM valuations ORDER BY last_used LIMIT ?)',
+                                          (count - self.max_entries,))
+
+    def close(self):
+        self.__connection.close()
@@ -49,9 +49,11 @@ class DatabaseType(Enum):
     """
 
     pgsql = 1
+    sqlite = 2
 
 # Maps strings to DatabaseType values.
-STR_TO_DATABASE_TYPE = {'pgsql': DatabaseType.pgsql}
+STR_TO_DATABASE_TYPE = {'pgsql': DatabaseType.pgsql,
+                        'sqlite': DatabaseType.sqlite}
 
 # Maps DatabaseType values to strings.
 DATABASE_TYPE_TO_STR = {value: key for key, value in STR_TO_DATABASE_TYPE.items()}
@@ -76,4 +78,18 @@ class ExitCode(Enum):
 
     success = 0
     config_file_not_found = 1
-    config_file_corrupt = 2
\ No newline at end of file
+    config_file_corrupt = 2
+    database_connection_failed = 3
+    invalid_input = 4
+    operation_not_implemented = 5
+    operation_failed = 6
+
+
+# Patterns that typed and bulk loaded values must match.
+DOLLARS = r'^\d*\.?\d{0,2}$'
+YEARS = r'^\d{4}$'
+MONTHS = r'^\d{1,2}$'
+DAYS = r'^\d{1,2}$'
+INTEGER = r'^\d+$'
+NUMBER = r'^-?(\d+\.?\d*|\.\d+)$'
+DATE = r'^\d{4}-\d{1,2}-\d{1,2}$'
@@ -21,15 +21,22 @@ along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 # Python standard library imports.
+import re
+import logging
 from datetime import date
+from contextlib import contextmanager
+from collections import defaultdict
 
 # Third-party imports.
-from sqlalchemy import Column, String, ForeignKey, Integer, Date, Float, create_engine
-from sqlalchemy.orm import relationship, backref, sessionmaker
+from sqlalchemy import Column, String, ForeignKey, Integer, Date, Float, Table, Index, create_engine, event, func, inspect, text, literal_column
+from sqlalchemy.orm import relationship, backref, sessionmaker, aliased, Session as _Session, SessionTransactionOrigin
+from sqlalchemy.sql.expression import Select, CompoundSelect, TextClause
 from sqlalchemy.ext.declarative import declarative_base
 
 # Infinium library imports.
-from lib import data
+from lib import data, metrics
+from lib.features import FINANCE_FEATURES
+from lib.querystats import QUERY_STATISTICS
 from lib.ui.config import get_config
 
 
@@ -41,6 +48,22 @@ __contact__ = data.Developer.EMAIL[__maintainer__]
 # Module constants.
 _Base = declarative_base()
 
+# Prefix of the names of yearly stock partitions, e.g. 'stocks_y2015'.
+STOCK_PARTITION_PREFIX = 'stocks_y'
+
+# On SQLite, the table holding stock prices that are not in a yearly
+# partition, such as those of a database created before partitioning.
+UNPARTITIONED_STOCK_TABLE = 'stocks_unpartitioned'
+
+_STOCK_COLUMNS = 'company_id, date, price, intrinsic_value'
+
+# Matches the row locking clauses of textual SELECT statements.
+_LOCKING_CLAUSE = re.compile(r'\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b', re.IGNORECASE)
+
+# Stock partitions known to exist, as (database URL, year) pairs. Partitions
+# are only added once the transaction that created them commits.
+_known_partitions = set()
+
 
 def get_finance_record(session, company_id, year):
     """
@@ -83,33 +106,889 @@ def extract_training_data(database):
     raise NotImplementedError('`extract_training_data` operation not yet implemented.')
 
 
-def connect_database():
+def get_latest_finance_records(session, company_ids=None):
+    """
+    Get the most recent Finances record of every company in a single query.
+
+    Args
+      session: The Session object to query.
+      company_ids: An iterable of company IDs to restrict the query to, or None
+                   to return records for all companies.
+
+    Return
+      A list of ``Finances`` records, ordered by ``company_id``.
+
+    """
+
+    latest = session.query(Finances.company_id,
+                           func.max(Finances.year).label('year'))
+
+    if company_ids is not None:
+        latest = latest.filter(Finances.company_id.in_(list(company_ids)))
+
+    latest = latest.group_by(Finances.company_id).subquery()
+    query = session.query(Finances).join(latest,
+                                         (Finances.company_id == latest.c.company_id) &
+                                         (Finances.year == latest.c.year))
+
+    return query.order_by(Finances.company_id).all()
+
+
+def bulk_insert(session, table, rows):
+    """
+    Insert many rows into a table with one executemany statement, bypassing
+    the ORM unit of work. The caller is responsible for committing.
+
+    Args
+      session: The Session object to insert with.
+      table: A mapped class, such as ``Stock`` or ``Finances``.
+      rows: A list of dicts mapping column names to values.
+
+    Return
+      Number of rows inserted.
+
+    """
+
+    if not rows:
+        return 0
+
+    if table is Stock and get_config().db_partition_stocks:
+        _insert_partitioned_stocks(session, rows)
+
+    else:
+        session.execute(table.__table__.insert(), rows)
+
+    if table in (Stock, Finances):
+        _update_company_snapshot(session, table, rows)
+
+    return len(rows)
+
+
+def get_company_snapshots(session, company_ids=None):
+    """
+    Get the latest stock price and finances of companies from the
+    ``company_snapshot`` table, without scanning their history.
+
+    Args
+      session: The Session object to query.
+      company_ids: An iterable of company IDs to restrict the query to, or None
+                   to return snapshots of all companies.
+
+    Return
+      A list of ``CompanySnapshot`` records, ordered by ``company_id``.
+
+    """
+
+    query = session.query(CompanySnapshot)
+    if company_ids is not None:
+        query = query.filter(CompanySnapshot.company_id.in_(list(company_ids)))
+
+    return query.order_by(CompanySnapshot.company_id).all()
+
+
+def refresh_company_snapshot(session, company_ids=None):
+    """
+    Recompute ``company_snapshot`` rows from the full Finances and Stock
+    history. Use after changing history outside of ``bulk_insert``. Reads go
+    to the primary database. The caller is responsible for committing.
+
+    Args
+      session: The Session object to refresh with.
+      company_ids: An iterable of company IDs to refresh, or None to rebuild
+                   the whole table.
+
+    Return
+      None
+
+    """
+
+    # The snapshots are rewritten from what is read, so read from the primary.
+    with session.using_primary():
+        if company_ids is not None:
+            company_ids = list(company_ids)
+
+        stale = {snapshot.company_id: snapshot
+                 for snapshot in get_company_snapshots(session, company_ids)}
+
+        snapshots = {}
+        for finances in get_latest_finance_records(session, company_ids):
+            snapshot = snapshots[finances.company_id] = _reset_snapshot(stale, finances.company_id)
+            snapshot.finance_year = finances.year
+            for feature in FINANCE_FEATURES:
+                setattr(snapshot, feature, getattr(finances, feature))
+
+        for company_id, stock_date, price, intrinsic_value in get_latest_stock_prices(session, company_ids):
+            if company_id not in snapshots:
+                snapshots[company_id] = _reset_snapshot(stale, company_id)
+
+            snapshot = snapshots[company_id]
+            snapshot.stock_date = stock_date
+            snapshot.price = price
+            snapshot.intrinsic_value = intrinsic_value
+
+        stock_counts, finance_counts = _count_history(session, company_ids)
+        for company_id, snapshot in snapshots.items():
+            snapshot.stock_rows = stock_counts.get(company_id, 0)
+            snapshot.finance_rows = finance_counts.get(company_id, 0)
+
+        for snapshot in stale.values():
+            session.delete(snapshot)
+
+        session.add_all(snapshots.values())
+        session.flush()
+
+
+def backfill_company_snapshot(session):
+    """
+    Build the ``company_snapshot`` table if it is empty but there is history,
+    as in a database created before the table existed, or rebuild it if its
+    row counts are missing. Commits if it builds the table.
+
+    Args
+      session: The Session object to build the table with.
+
+    Return
+      True if the table was built, otherwise False.
+
+    """
+
+    with session.using_primary():
+        uncounted = session.query(CompanySnapshot.company_id).filter(CompanySnapshot.stock_rows.is_(None))
+        if uncounted.first() is None and session.query(CompanySnapshot.company_id).first() is not None:
+            return False
+
+        has_history = session.query(Finances.company_id).first() is not None or any(
+            session.query(table.c.company_id).first() is not None
+            for table in _stock_tables(session, None, None))
+
+        if not has_history:
+            return False
+
+        logging.info('Building the company snapshot table from the stock and finances history.')
+        refresh_company_snapshot(session)
+        session.commit()
+        return True
+
+
+def refresh_screening_index(session, snapshots, valuations, model_version=None, replace_all=False):
+    """
+    Store the latest valuation and intrinsic value to price ratio of scored
+    companies in the ``screening_index`` table. Reads go to the primary
+    database. The caller is responsible for committing.
+
+    Args
+      session: The Session object to write with.
+      snapshots: The ``CompanySnapshot`` records of the scored companies.
+      valuations: The valuation of every snapshot, in the same order.
+      model_version: Version of the model that computed the valuations.
+      replace_all: Whether ``snapshots`` covers every company, so that index
+                   entries of other companies are deleted.
+
+    Return
+      None
+
+    """
+
+    with session.using_primary():
+        company_ids = [snapshot.company_id for snapshot in snapshots]
+        industry_ids = get_company_industries(session, company_ids)
+        existing = {}
+        for chunk in _chunked(company_ids):
+            if not replace_all:
+                existing.update((entry.company_id, entry) for entry in
+                                session.query(ScreeningEntry).filter(ScreeningEntry.company_id.in_(chunk)))
+
+        if replace_all:
+            existing = {entry.company_id: entry for entry in session.query(ScreeningEntry)}
+
+        for snapshot, valuation in zip(snapshots, valuations):
+            entry = existing.pop(snapshot.company_id, None) or ScreeningEntry(company_id=snapshot.company_id)
+            entry.industry_id = industry_ids[snapshot.company_id]
+            entry.model_version = model_version
+            entry.valuation = valuation
+            entry.stock_date = snapshot.stock_date
+            entry.price = snapshot.price
+            entry.intrinsic_value = snapshot.intrinsic_value
+            entry.value_ratio = _value_ratio(snapshot.intrinsic_value, snapshot.price)
+            session.add(entry)
+
+        if replace_all:
+            for entry in existing.values():
+                session.delete(entry)
+
+        session.flush()
+
+
+def screen_companies(session, top_per_industry=None, min_ratio=None, undervalued_only=False, industry_ids=None):
+    """
+    Screen companies by the ``screening_index`` table, highest intrinsic value
+    to price ratio first. Companies without a ratio are left out.
+
+    Args
+      session: The Session object to query.
+      top_per_industry: Maximum number of companies per industry, or None.
+      min_ratio: Smallest intrinsic value to price ratio to include, or None.
+      undervalued_only: Whether to include only companies valued as
+                        undervalued.
+      industry_ids: An iterable of industries to restrict the screen to, or
+                    None to screen all industries.
+
+    Return
+      A list of ``ScreeningEntry`` records, ordered by industry, then by
+      descending ratio.
+
+    """
+
+    query = session.query(ScreeningEntry).filter(ScreeningEntry.value_ratio.isnot(None))
+    if min_ratio is not None:
+        query = query.filter(ScreeningEntry.value_ratio >= min_ratio)
+
+    if undervalued_only:
+        query = query.filter(ScreeningEntry.valuation == 1)
+
+    if industry_ids is not None:
+        query = query.filter(ScreeningEntry.industry_id.in_(list(industry_ids)))
+
+    entry = ScreeningEntry
+    if top_per_industry is not None:
+        rank = func.row_number().over(partition_by=ScreeningEntry.industry_id,
+                                      order_by=(ScreeningEntry.value_ratio.desc(), ScreeningEntry.company_id))
+
+        ranked = query.add_columns(rank.label('rank')).subquery()
+        entry = aliased(ScreeningEntry, ranked)
+        query = session.query(entry).filter(ranked.c.rank <= top_per_industry)
+
+    return query.order_by(entry.industry_id, entry.value_ratio.desc(), entry.company_id).all()
+
+
+def count_unscreenable(session, industry_ids=None):
+    """
+    Count the companies in the ``screening_index`` table that screens leave
+    out because they have no intrinsic value to price ratio, usually because
+    no intrinsic value was ingested for them.
+
+    Args
+      session: The Session object to query.
+      industry_ids: An iterable of industries to restrict the count to, or
+                    None to count all industries.
+
+    Return
+      The number of companies without a ratio.
+
+    """
+
+    query = session.query(func.count(ScreeningEntry.company_id)).filter(ScreeningEntry.value_ratio.is_(None))
+    if industry_ids is not None:
+        query = query.filter(ScreeningEntry.industry_id.in_(list(industry_ids)))
+
+    return query.scalar()
+
+
+def get_watermark(session):
+    """
+    Describe how far the Finances and Stock history extends. The watermark
+    changes whenever rows are added to either table, so it can key caches of
+    anything derived from the history. It is read from the ``company_snapshot``
+    table, so the cost is proportional to the number of companies rather than
+    to the length of the history.
+
+    Args
+      session: The Session object to query.
+
+    Return
+      A tuple of (number of stock rows, latest stock date, number of finance
+      rows, latest finance year). Dates are ISO strings, or None if the table
+      is empty.
+
+    """
+
+    query = session.query(func.sum(CompanySnapshot.stock_rows),
+                          func.max(CompanySnapshot.stock_date),
+                          func.sum(CompanySnapshot.finance_rows),
+                          func.max(CompanySnapshot.finance_year))
+
+    stock_count, stock_date, finance_count, finance_year = query.one()
+    return (stock_count or 0,
+            stock_date.isoformat() if stock_date else None,
+            finance_count or 0,
+            finance_year.isoformat() if finance_year else None)
+
+
+def get_latest_stock_prices(session, company_ids=None):
+    """
+    Get the most recent stock price of every company from the stock history.
+    Prefer ``get_company_snapshots``, which does not scan the history.
+
+    Args
+      session: The Session object to query.
+      company_ids: An iterable of company IDs to restrict the query to, or None
+                   to return prices of all companies.
+
+    Return
+      A list of (company_id, date, price, intrinsic_value) tuples, ordered by
+      ``company_id``.
+
+    """
+
+    if company_ids is not None:
+        company_ids = list(company_ids)
+
+    latest = {}
+    for table in _stock_tables(session, None, None):
+        newest = session.query(table.c.company_id, func.max(table.c.date).label('date'))
+        if company_ids is not None:
+            newest = newest.filter(table.c.company_id.in_(company_ids))
+
+        newest = newest.group_by(table.c.company_id).subquery()
+        query = session.query(table.c.company_id, table.c.date, table.c.price, table.c.intrinsic_value)
+        query = query.join(newest, (table.c.company_id == newest.c.company_id) &
+                                   (table.c.date == newest.c.date))
+
+        for row in query:
+            if row[0] not in latest or row[1] > latest[row[0]][1]:
+                latest[row[0]] = tuple(row)
+
+    return [latest[company_id] for company_id in sorted(latest)]
+
+
+def get_stock_prices(session, start=None, end=None, company_ids=None):
+    """
+    Get stock prices within a date window. When stocks are partitioned, only
+    the partitions that overlap the window are read.
+
+    Args
+      session: The Session object to query.
+      start: Earliest date to include, or None for no lower bound.
+      end: Latest date to include, or None for no upper bound.
+      company_ids: An iterable of company IDs to restrict the query to, or None
+                   to return prices of all companies.
+
+    Return
+      A list of (company_id, date, price) tuples ordered by company and date.
+
+    """
+
+    return [tuple(row) for row in stock_price_query(session, start, end, company_ids)]
+
+
+def stock_price_query(session, start=None, end=None, company_ids=None):
+    """
+    Build the query of ``get_stock_prices`` without running it, so that long
+    histories can be read a chunk of rows at a time.
+
+    Args
+      session: The Session object to query.
+      start: Earliest date to include, or None for no lower bound.
+      end: Latest date to include, or None for no upper bound.
+      company_ids: An iterable of company IDs to restrict the query to, or None
+                   to return prices of all companies.
+
+    Return
+      A ``Query`` of (company_id, date, price) rows ordered by company and date.
+
+    """
+
+    if company_ids is not None:
+        company_ids = list(company_ids)
+
+    queries = []
+    for table in _stock_tables(session, start, end):
+        query = session.query(table.c.company_id.label('company_id'),
+                              table.c.date.label('date'),
+                              table.c.price.label('price'))
+        if start is not None:
+            query = query.filter(table.c.date >= start)
+
+        if end is not None:
+            query = query.filter(table.c.date <= end)
+
+        if company_ids is not None:
+            query = query.filter(table.c.company_id.in_(company_ids))
+
+        queries.append(query)
+
+    query = queries[0].union_all(*queries[1:]) if len(queries) > 1 else queries[0]
+    return query.order_by(literal_column('company_id'), literal_column('date'))
+
+
+def ensure_stock_partitions(session, years):
+    """
+    Create the yearly stock partitions that hold ``years``, if they do not
+    already exist. On PostgreSQL these are declarative range partitions of
+    ``stocks``; on SQLite they are separate tables, and ``stocks`` is a view
+    of all of them; see ``create_schema``. Does nothing unless the
+    ``partition_stocks`` configuration field is set.
+
+    Args
+      session: The Session object to create partitions with.
+      years: An iterable of years as integers.
+
+    Return
+      None
+
+    """
+
+    if not get_config().db_partition_stocks:
+        return
+
+    connection = session.connection()
+    url = str(connection.engine.url)
+    dialect = connection.dialect.name
+    created = _created_partitions(session)
+    for year in sorted(set(years)):
+        if (url, year) in _known_partitions or (url, year) in created:
+            continue
+
+        if dialect == 'postgresql':
+            if not _is_partitioned(connection):
+                logging.warning('Table `stocks` is not partitioned; recreate it to enable partitioning.')
+                return
+
+            ddl = ("CREATE TABLE IF NOT EXISTS {} PARTITION OF stocks "
+                   "FOR VALUES FROM ('{}-01-01') TO ('{}-01-01')")
+
+            connection.execute(text(ddl.format(stock_partition_name(year), year, year + 1)))
+
+        else:
+            _stock_shard_table(year).create(bind=connection, checkfirst=True)
+            _create_stock_view(connection)
+
+        created.add((url, year))
+
+
+def detach_stock_partition(session, year):
+    """
+    Remove one year of stock prices from the partitioned ``stocks`` layout
+    without deleting them, so that the year can be archived or dropped on
+    its own. The rows are kept in a standalone table named
+    'stocks_archive_y<year>', and the ``company_snapshot`` table is rebuilt
+    without them. The caller is responsible for committing.
+
+    Args
+      session: The Session object to detach the partition with.
+      year: The year to detach as an integer.
+
+    Return
+      Name of the standalone table.
+
+    """
+
+    connection = session.connection()
+    archive_name = 'stocks_archive_y{}'.format(year)
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE stocks DETACH PARTITION {}'.format(stock_partition_name(year))))
+
+    else:
+        connection.execute(text('DROP VIEW IF EXISTS stocks'))
+
+    connection.execute(text('ALTER TABLE {} RENAME TO {}'.format(stock_partition_name(year), archive_name)))
+    if connection.dialect.name != 'postgresql':
+        _create_stock_view(connection)
+
+    _known_partitions.discard((str(connection.engine.url), year))
+    _created_partitions(session).discard((str(connection.engine.url), year))
+    shard = _Base.metadata.tables.get(stock_partition_name(year))
+    if shard is not None:
+        _Base.metadata.remove(shard)
+
+    refresh_company_snapshot(session)
+    return archive_name
+
+
+def stock_partition_name(year):
+    """ Return the name of the stock partition holding ``year``. """
+
+    return '{}{}'.format(STOCK_PARTITION_PREFIX, year)
+
+
+def _created_partitions(session):
+    """
+    Return the set of partitions created in the current transaction of
+    ``session``, which are added to ``_known_partitions`` if the transaction
+    commits and forgotten if it rolls back.
+    """
+
+    if 'infinium_created_partitions' not in session.info:
+        session.info['infinium_created_partitions'] = set()
+        event.listen(session, 'after_commit', _remember_created_partitions)
+        event.listen(session, 'after_rollback', _forget_created_partitions)
+
+    return session.info['infinium_created_partitions']
+
+
+def _remember_created_partitions(session):
+    """ Session event that records the partitions of a committed transaction. """
+
+    _known_partitions.update(session.info['infinium_created_partitions'])
+    session.info['infinium_created_partitions'].clear()
+
+
+def _forget_created_partitions(session):
+    """ Session event that forgets the partitions of a rolled back transaction. """
+
+    session.info['infinium_created_partitions'].clear()
+
+
+def _update_company_snapshot(session, table, rows):
+    """
+    Advance the ``company_snapshot`` rows of the companies in a batch of
+    newly inserted Stock or Finances rows. Only the batch and the existing
+    snapshots are read, so the cost is proportional to the batch size.
+    """
+
+    date_field = 'date' if table is Stock else 'year'
+    newest = {}
+    counts = defaultdict(int)
+    for row in rows:
+        counts[row['company_id']] += 1
+        current = newest.get(row['company_id'])
+        if current is None or row[date_field] > current[date_field]:
+            newest[row['company_id']] = row
+
+    snapshots = {}
+    for company_ids in _chunked(sorted(newest)):
+        for snapshot in get_company_snapshots(session, company_ids):
+            snapshots[snapshot.company_id] = snapshot
+
+    for company_id, row in newest.items():
+        snapshot = snapshots.get(company_id)
+        if snapshot is None:
+            snapshot = CompanySnapshot(company_id=company_id)
+            session.add(snapshot)
+
+        if table is Stock:
+            snapshot.stock_rows = (snapshot.stock_rows or 0) + counts[company_id]
+            if snapshot.stock_date is None or row['date'] >= snapshot.stock_date:
+                snapshot.stock_date = row['date']
+                snapshot.price = row['price']
+                snapshot.intrinsic_value = row.get('intrinsic_value')
+
+        else:
+            snapshot.finance_rows = (snapshot.finance_rows or 0) + counts[company_id]
+            if snapshot.finance_year is None or row['year'] >= snapshot.finance_year:
+                snapshot.finance_year = row['year']
+                for feature in FINANCE_FEATURES:
+                    setattr(snapshot, feature, row[feature])
+
+    session.flush()
+
+
+def _count_history(session, company_ids):
+    """
+    Count the Stock and Finances rows of each company, or of the companies in
+    ``company_ids`` if it is not None. Returns two dicts mapping company IDs
+    to row counts.
+    """
+
+    stock_counts = defaultdict(int)
+    for table in _stock_tables(session, None, None):
+        query = session.query(table.c.company_id, func.count()).group_by(table.c.company_id)
+        if company_ids is not None:
+            query = query.filter(table.c.company_id.in_(company_ids))
+
+        for company_id, count in query:
+            stock_counts[company_id] += count
+
+    query = session.query(Finances.company_id, func.count()).group_by(Finances.company_id)
+    if company_ids is not None:
+        query = query.filter(Finances.company_id.in_(company_ids))
+
+    return stock_counts, dict(query.all())
+
+
+def _value_ratio(intrinsic_value, price):
+    """ Return intrinsic value divided by price, or None if it is undefined. """
+
+    if intrinsic_value is None or not price:
+        return None
+
+    return intrinsic_value / price
+
+
+def _reset_snapshot(stale, company_id):
+    """
+    Take the snapshot of ``company_id`` out of ``stale`` with every column
+    cleared, or create a new one if there is none.
+    """
+
+    snapshot = stale.pop(company_id, None) or CompanySnapshot(company_id=company_id)
+    for column in CompanySnapshot.__table__.columns:
+        if not column.primary_key:
+            setattr(snapshot, column.name, None)
+
+    return snapshot
+
+
+def _chunked(items, size=500):
+    """ Split a list into lists of at most ``size`` items. """
+
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _insert_partitioned_stocks(session, rows):
+    """
+    Insert stock rows into their yearly partitions, creating any missing
+    partitions first.
+    """
+
+    by_year = defaultdict(list)
+    for row in rows:
+        by_year[row['date'].year].append(row)
+
+    ensure_stock_partitions(session, by_year)
+    if session.connection().dialect.name == 'postgresql':
+        # PostgreSQL routes rows to partitions itself.
+        session.execute(Stock.__table__.insert(), rows)
+
+    else:
+        for year, year_rows in by_year.items():
+            session.execute(_stock_shard_table(year).insert(), year_rows)
+
+    return len(rows)
+
+
+def _stock_tables(session, start, end):
+    """
+    Return the tables to read for stock prices between ``start`` and ``end``.
+    PostgreSQL prunes partitions itself, so only SQLite shards are listed.
+    The ``stocks`` view of SQLite is not listed, so that shards outside the
+    window are not read.
+    """
+
+    if not get_config().db_partition_stocks or session.bind.dialect.name == 'postgresql':
+        return [Stock.__table__]
+
+    tables = [_unpartitioned_stock_table()]
+    for year in _stock_shard_years(session):
+        if (start is None or year >= start.year) and (end is None or year <= end.year):
+            tables.append(_stock_shard_table(year))
+
+    return tables
+
+
+def _stock_shard_years(connection):
+    """ Return the years of the SQLite stock shards, in ascending order. """
+
+    query = "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '{}%'"
+    names = connection.execute(text(query.format(STOCK_PARTITION_PREFIX))).fetchall()
+    return sorted(int(name[len(STOCK_PARTITION_PREFIX):]) for (name,) in names)
+
+
+def _create_stock_view(connection):
+    """
+    (Re)create the SQLite ``stocks`` view as the union of the unpartitioned
+    stock table and every shard, with triggers that insert rows written to
+    the view into the shard of their year, or into the unpartitioned table
+    if there is no such shard. Updates and deletes through the view apply to
+    whichever table holds the row; an update deletes the row and inserts it
+    through the view again, so that a changed date moves it to its new shard.
+    An existing ``stocks`` table is kept as the unpartitioned table.
+    """
+
+    query = "SELECT type FROM sqlite_master WHERE name = 'stocks'"
+    if connection.execute(text(query)).scalar() == 'table':
+        connection.execute(text('ALTER TABLE stocks RENAME TO {}'.format(UNPARTITIONED_STOCK_TABLE)))
+
+    _unpartitioned_stock_table().create(bind=connection, checkfirst=True)
+    years = _stock_shard_years(connection)
+    names = [UNPARTITIONED_STOCK_TABLE] + [stock_partition_name(year) for year in years]
+    connection.execute(text('DROP VIEW IF EXISTS stocks'))
+    connection.execute(text('CREATE VIEW stocks AS ' +
+                            ' UNION ALL '.join('SELECT {} FROM {}'.format(_STOCK_COLUMNS, name)
+                                               for name in names)))
+
+    # Dates are stored as ISO strings, so the year is their first 4 characters.
+    trigger = ('CREATE TRIGGER {name}_insert INSTEAD OF INSERT ON stocks WHEN {condition} '
+               'BEGIN INSERT INTO {name} ({columns}) '
+               'VALUES (NEW.company_id, NEW.date, NEW.price, NEW.intrinsic_value); END')
+
+    year = 'CAST(substr(NEW.date, 1, 4) AS INTEGER)'
+    for shard_year, name in zip(years, names[1:]):
+        condition = '{} = {}'.format(year, shard_year)
+        connection.execute(text(trigger.format(name=name, condition=condition, columns=_STOCK_COLUMNS)))
+
+    condition = '{} NOT IN ({})'.format(year, ', '.join(str(shard_year) for shard_year in years)) if years else '1'
+    connection.execute(text(trigger.format(name=UNPARTITIONED_STOCK_TABLE,
+                                           condition=condition,
+                                           columns=_STOCK_COLUMNS)))
+
+    delete = ' '.join('DELETE FROM {} WHERE company_id = OLD.company_id AND date = OLD.date;'.format(name)
+                      for name in names)
+
+    connection.execute(text('CREATE TRIGGER stocks_delete INSTEAD OF DELETE ON stocks '
+                            'BEGIN {} END'.format(delete)))
+
+    connection.execute(text('CREATE TRIGGER stocks_update INSTEAD OF UPDATE ON stocks '
+                            'BEGIN {} INSERT INTO stocks ({}) '
+                            'VALUES (NEW.company_id, NEW.date, NEW.price, NEW.intrinsic_value); '
+                            'END'.format(delete, _STOCK_COLUMNS)))
+
+    # SQLite counts no changes for statements on a view that triggers carry
+    # out, so the ORM cannot confirm that its updates matched a row.
+    connection.dialect.supports_sane_rowcount = False
+    connection.dialect.supports_sane_multi_rowcount = False
+
+
+def _unpartitioned_stock_table():
+    """ Return the SQLite table holding stock prices outside of any shard. """
+
+    return _stock_shard_table(None)
+
+
+def _stock_shard_table(year):
+    """ Return the SQLite table holding the stock prices of ``year``. """
+
+    name = stock_partition_name(year) if year is not None else UNPARTITIONED_STOCK_TABLE
+    if name in _Base.metadata.tables:
+        return _Base.metadata.tables[name]
+
+    return Table(name, _Base.metadata,
+                 Column('company_id', String, ForeignKey('companies.id'), primary_key=True),
+                 Column('date', Date, primary_key=True),
+                 Column('price', Float, nullable=False),
+                 Column('intrinsic_value', Float))
+
+
+def _is_partitioned(connection):
+    """ Return True if the PostgreSQL ``stocks`` table is partitioned. """
+
+    query = "SELECT relkind FROM pg_class WHERE relname = 'stocks'"
+    return connection.execute(text(query)).scalar() == 'p'
+
+
+def _ensure_flushed_stock_partitions(session, flush_context, instances):
+    """ Session event that creates partitions for new ``Stock`` records. """
+
+    years = {obj.date.year for obj in session.new if isinstance(obj, Stock)}
+    if years:
+        ensure_stock_partitions(session, years)
+
+
+def connect_database(url=None):
     """
     Connect to the Infinium database and create a ``Session`` class which can
     be instantiated to interact with the database.
 
+    If the configuration file names a read replica, sessions send reads to
+    the replica and writes to the primary database; see ``RoutingSession``.
+    The ``company_snapshot`` table of an existing database is built on first
+    connection; see ``backfill_company_snapshot``.
+
+    Args:
+      url: SQLAlchemy URL of the database to connect to. Defaults to the URL
+           described by the ``database`` section of the configuration file.
+           An explicit URL disables replica routing.
+
     Returns:
       SQLAlchemy ``Session`` class.
 
     """
 
     configuration = get_config()
-    url = '{dialect}+{driver}://{username}:{password}@{host}:{port}/{database}'
-    url = url.format(dialect=configuration.db_dialect,
-                     driver=configuration.db_driver,
-                     username=configuration.db_username,
-                     password=configuration.db_password,
-                     host=configuration.db_host,
-                     port=configuration.db_port,
-                     database=configuration.db_database)
+    engine = _create_engine(url or database_url())
+    with engine.begin() as connection:
+        create_schema(connection)
 
-    engine = create_engine(url, echo=configuration.db_echo)
-    _Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
+    # The replica's schema is maintained by replication, so it is not created.
+    replica_url = None if url else configuration.db_replica_url
+    replica = _create_engine(replica_url) if replica_url else None
+    Session = sessionmaker(class_=RoutingSession, primary=engine, replica=replica)
+    if configuration.db_partition_stocks:
+        event.listen(Session, 'before_flush', _ensure_flushed_stock_partitions)
+
+    session = Session()
+    try:
+        backfill_company_snapshot(session)
+
+    finally:
+        session.close()
 
     return Session
 
 
+def create_schema(connection):
+    """
+    Create any missing tables of the Infinium schema.
+
+    With the ``partition_stocks`` configuration field set, a new PostgreSQL
+    ``stocks`` table is range partitioned by date. On SQLite, ``stocks``
+    becomes a view of the yearly shard tables instead, so that ORM queries
+    and inserts see every shard, and the rows of an existing ``stocks`` table
+    are kept in the ``stocks_unpartitioned`` table.
+
+    Args
+      connection: A SQLAlchemy ``Connection``.
+
+    Return
+      None
+
+    """
+
+    partition_stocks = get_config().db_partition_stocks
+    sqlite_view = partition_stocks and connection.dialect.name == 'sqlite'
+    if partition_stocks:
+        # Only affects newly created databases; see ``ensure_stock_partitions``.
+        Stock.__table__.dialect_kwargs['postgresql_partition_by'] = 'RANGE (date)'
+
+    tables = [table for table in _Base.metadata.sorted_tables
+              if not table.name.startswith(STOCK_PARTITION_PREFIX) and
+              table.name != UNPARTITIONED_STOCK_TABLE and
+              not (sqlite_view and table is Stock.__table__)]
+
+    _Base.metadata.create_all(connection, tables=tables)
+    _add_snapshot_counts(connection)
+    if sqlite_view:
+        _create_stock_view(connection)
+
+
+def _add_snapshot_counts(connection):
+    """
+    Add the row count columns to a ``company_snapshot`` table created before
+    they existed. ``backfill_company_snapshot`` fills them in.
+    """
+
+    columns = {column['name'] for column in inspect(connection).get_columns(CompanySnapshot.__tablename__)}
+    for name in ('stock_rows', 'finance_rows'):
+        if name not in columns:
+            connection.execute(text('ALTER TABLE {} ADD COLUMN {} INTEGER'.format(CompanySnapshot.__tablename__,
+                                                                                   name)))
+
+
+def _create_engine(url):
+    """ Create an engine for ``url`` with Infinium's instrumentation attached. """
+
+    configuration = get_config()
+    engine = create_engine(url, echo=configuration.db_echo)
+    metrics.instrument_engine(engine)
+    if configuration.db_query_stats:
+        QUERY_STATISTICS.slow_query_seconds = configuration.db_slow_query_ms / 1000
+        QUERY_STATISTICS.attach(engine)
+        QUERY_STATISTICS.log_summary_at_exit()
+
+    return engine
+
+
+def database_url():
+    """
+    Build the SQLAlchemy URL of the database described by the ``database``
+    section of the configuration file. For SQLite, ``database`` is the path of
+    the database file and the remaining connection fields are ignored.
+    """
+
+    configuration = get_config()
+    if configuration.db_dialect == data.DATABASE_TYPE_TO_STR[data.DatabaseType.sqlite]:
+        return 'sqlite:///{database}'.format(database=configuration.db_database)
+
+    url = '{dialect}+{driver}://{username}:{password}@{host}:{port}/{database}'
+    return url.format(dialect=configuration.db_dialect,
+                      driver=configuration.db_driver,
+                      username=configuration.db_username,
+                      password=configuration.db_password,
+                      host=configuration.db_host,
+                      port=configuration.db_port,
+                      database=configuration.db_database)
+
+
 def get_industries(session):
     """
     Return list of industries from database, ordered by ``industry_id``.
@@ -119,6 +998,27 @@ def get_industries(session):
     return [x.name for x in sorted(industries, key=lambda x: x.id)]
 
 
+def get_company_industries(session, company_ids=None):
+    """
+    Return a dict mapping company IDs to their industry IDs.
+
+    Args
+      session: The Session object to query.
+      company_ids: An iterable of company IDs to restrict the query to, or None
+                   to return the industries of all companies.
+
+    """
+
+    if company_ids is None:
+        return dict(session.query(Company.id, Company.industry_id))
+
+    industries = {}
+    for chunk in _chunked(list(company_ids)):
+        industries.update(session.query(Company.id, Company.industry_id).filter(Company.id.in_(chunk)))
+
+    return industries
+
+
 def get_industry_id(session, name):
     """
     Return ``id`` of the corresponding industry ``name``.
@@ -127,6 +1027,74 @@ def get_industry_id(session, name):
     return session.query(Industry).filter(Industry.name == name).add_column('id').first().id
 
 
+class RoutingSession(_Session):
+    """
+    A Session that executes ORM and Core SELECTs on a read replica, and every
+    other statement, including flushes and bulk inserts, on the primary.
+
+    Once a session has written, it reads from the primary until the end of the
+    transaction, so that it always sees its own writes despite replication
+    lag. Locking reads, such as ``SELECT ... FOR UPDATE``, count as writes.
+    Transactions begun explicitly with ``begin`` are taken to be write
+    transactions, and read from the primary throughout. Use ``using_primary``
+    to read from the primary at any other time. Without a replica, everything
+    goes to the primary.
+    """
+
+    def __init__(self, primary, replica=None, bind=None, **kwargs):
+        super().__init__(bind=primary, **kwargs)
+        self.primary = primary
+        self.replica = replica
+        self._pinned = False
+        event.listen(self, 'after_commit', self.__unpin)
+        event.listen(self, 'after_rollback', self.__unpin)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is None or self._pinned:
+            return self.primary
+
+        if _is_read(clause) and not self._flushing and not self.__in_explicit_transaction():
+            return self.replica
+
+        # Writes, DDL and raw connections pin the session to the primary.
+        self._pinned = True
+        return self.primary
+
+    @contextmanager
+    def using_primary(self):
+        """
+        Context manager that sends every statement in its block to the
+        primary, for reads that must not lag behind writes made elsewhere.
+        """
+
+        pinned = self._pinned
+        self._pinned = True
+        try:
+            yield self
+
+        finally:
+            self._pinned = pinned
+
+    def __in_explicit_transaction(self):
+        """ Return True if the current transaction was begun with ``begin``. """
+
+        transaction = self.get_transaction()
+        return transaction is not None and transaction.origin is not SessionTransactionOrigin.AUTOBEGIN
+
+    def __unpin(self, session):
+        self._pinned = False
+
+
+def _is_read(clause):
+    """ Return True if ``clause`` is a SELECT statement that takes no row locks. """
+
+    if isinstance(clause, (Select, CompoundSelect)):
+        return clause._for_update_arg is None
+
+    return (isinstance(clause, TextClause) and clause.text.lstrip().upper().startswith('SELECT') and
+            _LOCKING_CLAUSE.search(clause.text) is None)
+
+
 class Industry(_Base):
     __tablename__ = 'industries'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -159,8 +1127,65 @@ class Finances(_Base):
 
 class Stock(_Base):
     __tablename__ = 'stocks'
+    # Deletes through the SQLite ``stocks`` view report no matched rows.
+    __mapper_args__ = {'confirm_deleted_rows': False}
     company = relationship(Company, backref=backref('stocks', uselist=True))
     company_id = Column(String, ForeignKey('companies.id'), primary_key=True)
     date = Column(Date, primary_key=True)
     price = Column(Float, nullable=False)
-    intrinsic_value = Column(Float)
\ No newline at end of file
+    intrinsic_value = Column(Float)
+
+
+class CompanySnapshot(_Base):
+    """
+    The latest stock price and finances of each company, maintained by
+    ``bulk_insert`` and rebuilt by ``refresh_company_snapshot``. Feature
+    columns are named after their Finances counterparts. ``stock_rows`` and
+    ``finance_rows`` count the company's history, so that ``get_watermark``
+    need not scan it.
+    """
+
+    __tablename__ = 'company_snapshot'
+    company = relationship(Company, backref=backref('snapshot', uselist=False))
+    company_id = Column(String, ForeignKey('companies.id'), primary_key=True)
+    stock_date = Column(Date)
+    price = Column(Float)
+    intrinsic_value = Column(Float)
+    stock_rows = Column(Integer)
+    finance_year = Column(Date)
+    finance_rows = Column(Integer)
+    return_on_equity = Column(Float)
+    net_profit_margin = Column(Float)
+    net_sales = Column(Float)
+    net_income = Column(Float)
+    earnings_per_share_growth = Column(Float)
+    total_current_assets = Column(Float)
+    total_current_liabilities = Column(Float)
+    free_cash_flow = Column(Float)
+    operating_margin = Column(Float)
+
+
+class ScreeningEntry(_Base):
+    """
+    The latest valuation and intrinsic value to price ratio of each scored
+    company, maintained by ``refresh_screening_index``. Indexed by industry
+    and ratio, so that screens read only the entries they return.
+    """
+
+    __tablename__ = 'screening_index'
+    __table_args__ = (Index('screening_index_industry_ratio', 'industry_id', 'value_ratio'),
+                      Index('screening_index_ratio', 'value_ratio'))
+
+    industry = relationship(Industry)
+    company_id = Column(String, ForeignKey('companies.id'), primary_key=True)
+    industry_id = Column(ForeignKey('industries.id'), nullable=False)
+    model_version = Column(String)
+    valuation = Column(Integer)
+    stock_date = Column(Date)
+    price = Column(Float)
+    intrinsic_value = Column(Float)
+    value_ratio = Column(Float)
+
+
+# Maps table names to mapped classes.
+TABLES = {table.__tablename__: table for table in (Industry, Company, Finances, Stock)}
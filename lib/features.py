@@ -0,0 +1,170 @@
+"""
+Feature extraction for Infinium valuation models. Turns database records into
+the numeric matrices consumed by the models in ``lib.ml``.
+
+Models take two kinds of features: the dense Finances columns listed in
+``FINANCE_FEATURES``, and one indicator per industry. Industries are passed
+around as integer codes, the column of each industry among the industries a
+model was trained with, rather than as one-hot matrices.
+
+This module depends only on NumPy, so that processes which merely score
+companies do not need to import scikit-learn.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib.data import Developer
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Columns of the Finances table used as model features, in model order.
+FINANCE_FEATURES = ('return_on_equity',
+                    'net_profit_margin',
+                    'net_sales',
+                    'net_income',
+                    'earnings_per_share_growth',
+                    'total_current_assets',
+                    'total_current_liabilities',
+                    'free_cash_flow',
+                    'operating_margin')
+
+
+def finance_matrix(records):
+    """
+    Build a feature matrix from Finances records.
+
+    Args
+      records: An iterable of ``Finances`` records, or of any objects with an
+               attribute for every name in ``FINANCE_FEATURES``.
+
+    Returns
+      A two-dimensional float64 ``numpy.ndarray`` with one row per record and
+      one column per feature.
+
+    """
+
+    rows = [[getattr(record, feature) for feature in FINANCE_FEATURES]
+            for record in records]
+
+    return np.array(rows, dtype=np.float64).reshape(len(rows),
+                                                    len(FINANCE_FEATURES))
+
+
+def industry_codes(industries, industry_ids):
+    """
+    Map industry IDs to the columns of their indicators.
+
+    Args
+      industries: Sorted array of the industry IDs known to a model.
+      industry_ids: Array of industry IDs to map; -1 stands for an unknown
+                    industry.
+
+    Returns
+      An integer array with the index of every industry in ``industries``,
+      or -1 for industries that are not in ``industries``.
+
+    """
+
+    industries = np.asarray(industries, dtype=np.int64)
+    industry_ids = np.asarray(industry_ids, dtype=np.int64)
+    if not len(industries):
+        return np.full(len(industry_ids), -1, dtype=np.int64)
+
+    codes = np.searchsorted(industries, industry_ids)
+    codes[codes == len(industries)] = 0
+    codes[industries[codes] != industry_ids] = -1
+
+    return codes
+
+
+class StreamingNormalizer:
+    """
+    Standardizes features to zero mean and unit variance using statistics
+    accumulated one chunk at a time, so that they are gathered in a single
+    streaming pass over data too large for memory. Statistics are combined
+    with the parallel form of Welford's algorithm (Chan et al.), which is
+    numerically stable, and normalizers fed with different chunks, e.g. in
+    different worker processes, can be merged.
+    """
+
+    def __init__(self, n_features):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def update(self, features):
+        """
+        Add a chunk of samples to the statistics.
+
+        Args
+          features: Matrix of shape (n_samples, n_features).
+
+        Returns
+          None
+
+        """
+
+        features = np.asarray(features, dtype=np.float64)
+        if not len(features):
+            return
+
+        chunk_mean = features.mean(axis=0)
+        chunk_m2 = ((features - chunk_mean) ** 2).sum(axis=0)
+        self.__combine(len(features), chunk_mean, chunk_m2)
+
+    def merge(self, other):
+        """ Add the statistics of another ``StreamingNormalizer`` to this one. """
+
+        if other.count:
+            self.__combine(other.count, other.mean, other.m2)
+
+    @property
+    def variance(self):
+        """ Population variance of every feature. """
+
+        return self.m2 / self.count if self.count else np.zeros_like(self.m2)
+
+    @property
+    def scale(self):
+        """ Standard deviation of every feature, with 1 for constant features. """
+
+        scale = np.sqrt(self.variance)
+        scale[scale == 0] = 1.0
+
+        return scale
+
+    def transform(self, features):
+        """ Return ``features`` standardized with the current statistics. """
+
+        return (np.asarray(features, dtype=np.float64) - self.mean) / self.scale
+
+    def __combine(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
@@ -0,0 +1,317 @@
+"""
+Generation of training labels for valuation models. A company's finances for
+a year are labeled undervalued if its stock price rose by more than a
+threshold over a horizon starting when those finances became available, i.e.
+at the start of the following year.
+
+Forward returns are computed for every company and horizon at once from the
+price history sorted by (company, date), using binary search instead of
+per-company loops. The history is read in chunks sized by the memory budget
+and held as NumPy arrays. Results are cached on disk, keyed on the history
+watermark, so they are only recomputed when the history changes.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import os
+import json
+import logging
+from pathlib import Path
+from itertools import islice
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib import db, metrics
+from lib.data import Developer
+from lib.memory import ChunkSizer, current_rss
+from lib.ui.config import get_config
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Multiplier that separates companies in combined (company, day) sort keys.
+# Must exceed any date ordinal.
+_KEY_STRIDE = 10 ** 7
+
+# Ordinal of 1970-01-01, to convert NumPy epoch days to positive day numbers
+# equal to ``date.toordinal``.
+_EPOCH_ORDINAL = 719163
+
+# Version of the label definition, part of the label cache key.
+_LABEL_VERSION = 2
+
+# Initial estimate of the memory taken by a stock price row while it is read
+# and converted to arrays; corrected as chunks are read.
+PRICE_ROW_BYTES = 512
+
+
+def get_labels(Session):
+    """
+    Get the training label of every Finances record that has a known forward
+    return over the configured ``training_horizon``.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+
+    Returns
+      A dict mapping (company_id, year) to a label in
+      ``lib.ml.VALUATION_CLASSES``; 1 if the forward return exceeds the
+      configured ``threshold``, otherwise 0.
+
+    """
+
+    configuration = get_config()
+    horizons = configuration.label_horizons
+    company_ids, years, returns = get_forward_returns(Session, horizons)
+    column = returns[:, horizons.index(configuration.label_training_horizon)]
+    known = ~np.isnan(column)
+    labels = (column[known] > configuration.label_threshold).astype(np.int64)
+
+    return dict(zip(zip(company_ids[known].tolist(), years[known].tolist()), labels.tolist()))
+
+
+def get_forward_returns(Session, horizons):
+    """
+    Get forward stock returns after every Finances record, using the label
+    cache when the history has not changed since it was written.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+      horizons: A list of horizons in days.
+
+    Returns
+      A tuple of (company IDs, years, returns), where returns is a matrix with
+      one row per Finances record and one column per horizon. Returns are NaN
+      where the price history does not cover the horizon.
+
+    """
+
+    session = Session()
+    cache_key = json.dumps({'watermark': db.get_watermark(session),
+                            'horizons': list(horizons),
+                            'version': _LABEL_VERSION})
+    cache_path = Path(get_config().label_cache_path)
+    cached = _read_cache(cache_path, cache_key)
+    if cached is not None:
+        return cached
+
+    with metrics.span('label_generation'):
+        anchors = session.query(db.Finances.company_id, db.Finances.year).all()
+        company_ids = np.array([row[0] for row in anchors], dtype=np.str_)
+        years = np.array([row[1].year for row in anchors], dtype=np.int64)
+        prices = Timeline.from_stock_history(session)
+        returns = forward_returns(company_ids, years, prices, horizons)
+
+    _write_cache(cache_path, cache_key, company_ids, years, returns)
+
+    return company_ids, years, returns
+
+
+def forward_returns(company_ids, years, prices, horizons):
+    """
+    Compute forward returns for many (company, year) anchors at once.
+    Finances for ``year`` become available on January 1st of the following
+    year, and can be traded on from the next day, so the return for an anchor
+    starts at the first price strictly after January 1st, and ends at the
+    first price on or after the start date plus the horizon.
+
+    Args
+      company_ids: Array of company IDs of the anchors.
+      years: Array of finance years of the anchors.
+      prices: A Timeline of stock prices.
+      horizons: A list of horizons in days.
+
+    Returns
+      A float matrix of shape (len(company_ids), len(horizons)), NaN where
+      no start or end price exists.
+
+    """
+
+    returns = np.full((len(company_ids), len(horizons)), np.nan)
+    if not len(company_ids) or not len(prices.keys):
+        return returns
+
+    codes = prices.codes(company_ids)
+    start = prices.first_at_or_after(codes, year_start_days(years + 1) + 1)
+    for column, horizon in enumerate(horizons):
+        end = prices.first_at_or_after(codes, prices.days[np.maximum(start, 0)] + horizon)
+        known = (start >= 0) & (end >= 0)
+        returns[known, column] = prices.values[end[known]] / prices.values[start[known]] - 1.0
+
+    return returns
+
+
+def date_days(dates):
+    """ Convert a sequence of dates to an array of ``date.toordinal`` values. """
+
+    return np.array(dates, dtype='datetime64[D]').astype(np.int64) + _EPOCH_ORDINAL
+
+
+def year_start_days(years):
+    """ Return day ordinals of January 1st of every year in ``years``. """
+
+    starts = (np.asarray(years) - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    return starts.astype(np.int64) + _EPOCH_ORDINAL
+
+
+class Timeline:
+    """
+    Values recorded per company and day, held as columns sorted by (company,
+    day), for point-in-time lookups of many companies and dates at once. Each
+    lookup is a single binary search over combined (company, day) keys.
+
+    Companies are identified by integer codes, their index in
+    ``self.companies``; -1 stands for an unknown company.
+    """
+
+    def __init__(self, company_ids, days, values, companies=None):
+        """
+        Args
+          company_ids: Array of the company of every value.
+          days: Array of the day ordinal of every value.
+          values: Array of values, e.g. prices, in any order.
+          companies: Sorted array of companies to assign codes to. Defaults to
+                     the distinct ``company_ids``. Values of other companies
+                     are dropped.
+        """
+
+        company_ids = np.asarray(company_ids, dtype=np.str_)
+        self.companies = np.unique(company_ids) if companies is None else companies
+        codes = self.codes(company_ids)
+        known = codes >= 0
+        keys = codes[known].astype(np.int64) * _KEY_STRIDE + np.asarray(days)[known]
+        order = np.argsort(keys, kind='mergesort')
+        self.keys = keys[order]
+        self.values = np.asarray(values)[known][order]
+        self.days = self.keys % _KEY_STRIDE
+
+    @classmethod
+    def from_prices(cls, price_rows):
+        """ Build a Timeline of prices from (company_id, date, price) tuples. """
+
+        company_ids, dates, prices = zip(*price_rows)
+        return cls(company_ids, date_days(dates), np.array(prices, dtype=np.float64))
+
+    @classmethod
+    def from_stock_history(cls, session):
+        """
+        Build a Timeline of every stock price in the database. Rows are read
+        in chunks sized by the configured memory budget, and each chunk is
+        converted to arrays before the next is read.
+        """
+
+        sizer = ChunkSizer.from_config(PRICE_ROW_BYTES)
+        rows = iter(db.stock_price_query(session).yield_per(sizer.size))
+        company_ids, days, prices = [], [], []
+        while True:
+            rss = current_rss()
+            chunk = list(islice(rows, sizer.size))
+            if not chunk:
+                break
+
+            chunk_ids, chunk_dates, chunk_prices = zip(*chunk)
+            company_ids.append(np.array(chunk_ids, dtype=np.str_))
+            days.append(date_days(chunk_dates))
+            prices.append(np.array(chunk_prices, dtype=np.float64))
+            del chunk, chunk_ids, chunk_dates, chunk_prices
+            sizer.observe(len(prices[-1]), current_rss() - rss)
+
+        if not prices:
+            return cls(np.array([], dtype=np.str_), np.array([], dtype=np.int64), np.array([]))
+
+        return cls(np.concatenate(company_ids), np.concatenate(days), np.concatenate(prices))
+
+    def codes(self, company_ids):
+        """ Return the code of every company in ``company_ids``. """
+
+        company_ids = np.asarray(company_ids, dtype=np.str_)
+        codes = np.searchsorted(self.companies, company_ids)
+        codes[codes == len(self.companies)] = 0
+        codes[self.companies[codes] != company_ids] = -1
+
+        return codes
+
+    def first_at_or_after(self, codes, days):
+        """
+        Return the index of the first value of each company in ``codes`` on or
+        after the corresponding day in ``days``, or -1 if there is none.
+        Arguments are broadcast against each other.
+        """
+
+        codes, days = np.broadcast_arrays(codes, days)
+        indices = np.searchsorted(self.keys, codes * _KEY_STRIDE + days, side='left')
+        return self.__check(codes, indices)
+
+    def last_at_or_before(self, codes, days):
+        """
+        Return the index of the last value of each company in ``codes`` on or
+        before the corresponding day in ``days``, or -1 if there is none.
+        Arguments are broadcast against each other.
+        """
+
+        codes, days = np.broadcast_arrays(codes, days)
+        indices = np.searchsorted(self.keys, codes * _KEY_STRIDE + days, side='right') - 1
+        return self.__check(codes, indices)
+
+    def __check(self, codes, indices):
+        """ Replace indices that fall outside their company's values with -1. """
+
+        found = (codes >= 0) & (indices >= 0) & (indices < len(self.keys))
+        found[found] &= self.keys[indices[found]] // _KEY_STRIDE == codes[found]
+
+        return np.where(found, indices, -1)
+
+
+def _read_cache(path, cache_key):
+    """ Return cached (company IDs, years, returns) if the cache key matches. """
+
+    try:
+        with np.load(str(path), allow_pickle=False) as cache:
+            if str(cache['key']) != cache_key:
+                return None
+
+            return cache['company_ids'], cache['years'], cache['returns']
+
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_cache(path, cache_key, company_ids, years, returns):
+    """ Atomically replace the label cache. Failures are logged and ignored. """
+
+    temporary_path = path.with_name(path.name + '.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with temporary_path.open('wb') as cache_file:
+            np.savez(cache_file,
+                     key=np.array(cache_key),
+                     company_ids=company_ids,
+                     years=years,
+                     returns=returns)
+
+        os.replace(str(temporary_path), str(path))
+
+    except OSError as error:
+        logging.warning('Could not write label cache "%s": %s', path, error)
@@ -0,0 +1,187 @@
+"""
+Logging utilities for Infinium. Log records are handed to a queue by the
+thread that emits them, and formatted and written to their destinations by a
+background listener thread, so that logging never blocks on disk I/O.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+# Infinium library imports.
+from lib.data import Developer
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+TEXT_FORMAT = '%(asctime)s %(levelname)s: %(message)s'
+DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+# Renders exceptions of queued records in the emitting thread.
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+def start_queue_logging(logger, handlers, debug_sample_rate=1.0):
+    """
+    Attach a queue handler to ``logger`` and start a background thread that
+    passes queued records on to ``handlers``. The thread is stopped, and the
+    queue flushed, when the interpreter exits.
+
+    Args
+      logger: The Logger to attach the queue handler to.
+      handlers: Handlers that format and write records in the background.
+      debug_sample_rate: Fraction of DEBUG records to keep, between 0 and 1.
+
+    Returns
+      The started ``QueueListener``.
+
+    """
+
+    record_queue = queue.Queue(-1)
+    queue_handler = DeferredQueueHandler(record_queue)
+    if debug_sample_rate < 1.0:
+        queue_handler.addFilter(DebugSampler(debug_sample_rate))
+
+    listener = QueueListener(record_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(queue_handler)
+
+    return listener
+
+
+def create_file_handler(path, max_bytes=0, rotate_when=None, backup_count=5):
+    """
+    Create a handler that writes to the log file at ``path``.
+
+    Args
+      path: Path of the log file.
+      max_bytes: Rotate the log file when it reaches this size. 0 disables
+                 size-based rotation.
+      rotate_when: Rotate the log file at this interval, given in the format of
+                   ``TimedRotatingFileHandler`` (e.g. 'midnight' or 'H'). None
+                   disables time-based rotation. Takes precedence over
+                   ``max_bytes``.
+      backup_count: Number of rotated log files to keep.
+
+    Returns
+      A ``logging.FileHandler``.
+
+    """
+
+    path = str(path)
+    if rotate_when:
+        return TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count)
+
+    elif max_bytes:
+        return RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+
+    else:
+        return logging.FileHandler(path)
+
+
+def create_formatter(log_format):
+    """
+    Create a Formatter for the named log format, either 'text' or 'json'.
+    """
+
+    if log_format == 'json':
+        return JsonFormatter()
+
+    elif log_format == 'text':
+        return logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+    else:
+        raise ValueError('Unknown log format `{}`.'.format(log_format))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    A ``QueueHandler`` that enqueues records without formatting them first.
+    The message is merged with its arguments, and any exception rendered, in
+    the emitting thread, so that the record captures arguments as they were
+    when it was logged. Formatting with the destination's formatter, such as
+    JSON serialization, is left to the listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keep only a fraction of DEBUG records. Records of any higher level always
+    pass. Sampling is deterministic: every n-th DEBUG record is kept, where n
+    is the reciprocal of ``rate``.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        if not 0.0 < rate <= 1.0:
+            raise ValueError('Debug sample rate must be in the range (0, 1].')
+
+        self.__interval = round(1 / rate)
+        self.__count = 0
+        self.__lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+
+        with self.__lock:
+            self.__count += 1
+            return self.__count % self.__interval == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as single-line JSON documents.
+    """
+
+    def format(self, record):
+        document = {'time': self.formatTime(record, DATE_FORMAT),
+                    'level': record.levelname,
+                    'logger': record.name,
+                    'thread': record.threadName,
+                    'message': record.getMessage()}
+
+        if record.exc_info:
+            document['exception'] = self.formatException(record.exc_info)
+
+        elif record.exc_text:
+            document['exception'] = record.exc_text
+
+        return json.dumps(document)
@@ -0,0 +1,165 @@
+"""
+Memory budgeting for chunked pipelines. ``ChunkSizer`` picks the number of
+rows per chunk from the configured ``memory_budget``, the resident memory the
+process already uses, and the bytes per row measured on the chunks seen so
+far, and shrinks chunks quickly when resident memory nears the budget.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import os
+import re
+import resource
+
+# Infinium library imports.
+from lib.data import Developer
+from lib.ui.config import get_config
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Fraction of available memory used when ``memory_budget`` is ``auto``.
+AUTO_BUDGET_FRACTION = 0.5
+
+# Fraction of the remaining budget a single chunk may take. The rest is left
+# for copies made while the chunk is processed.
+CHUNK_BUDGET_FRACTION = 0.25
+
+# Fraction of the budget above which chunks are shrunk.
+HIGH_WATER_FRACTION = 0.9
+
+_SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+
+def memory_budget():
+    """
+    Return the configured memory budget of the process in bytes. The setting
+    is either ``auto``, for a fraction of the memory available at the time of
+    the call, or a size such as ``512MB`` or ``8GB``.
+
+    Raises
+      ValueError if the setting is not a valid size.
+
+    """
+
+    setting = str(get_config().memory_budget).strip()
+    if setting.lower() == 'auto':
+        return int(current_rss() + available_memory() * AUTO_BUDGET_FRACTION)
+
+    return parse_size(setting)
+
+
+def parse_size(size):
+    """ Convert a size such as ``512MB`` or ``8GB`` to bytes. """
+
+    match = _SIZE_PATTERN.match(size)
+    if not match:
+        raise ValueError('Invalid memory size `{}`.'.format(size))
+
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def available_memory():
+    """ Return the bytes of memory available to new allocations on this machine. """
+
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+
+    except OSError:
+        pass
+
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+
+def current_rss():
+    """
+    Return the resident memory of this process in bytes. Where it cannot be
+    read, the peak resident memory is returned instead.
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    except OSError:
+        # ru_maxrss is in kilobytes on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ChunkSizer:
+    """
+    Sizes chunks of rows to fit a memory budget.
+
+    Args
+      budget: Memory budget of the process in bytes.
+      bytes_per_row: Initial estimate of the memory a row takes while it is
+                     being processed.
+      minimum: Smallest chunk size returned.
+      maximum: Largest chunk size returned.
+
+    """
+
+    def __init__(self, budget, bytes_per_row, minimum=100, maximum=1000000):
+        self.budget = budget
+        self.bytes_per_row = float(bytes_per_row)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def from_config(cls, bytes_per_row, **kwargs):
+        """ Create a ChunkSizer for the configured ``memory_budget``. """
+
+        return cls(memory_budget(), bytes_per_row, **kwargs)
+
+    @property
+    def size(self):
+        """ Number of rows the next chunk should have. """
+
+        rss = current_rss()
+        if rss > self.budget * HIGH_WATER_FRACTION:
+            return self.minimum
+
+        rows = (self.budget - rss) * CHUNK_BUDGET_FRACTION / self.bytes_per_row
+        return int(max(self.minimum, min(self.maximum, rows)))
+
+    def observe(self, rows, nbytes):
+        """
+        Refine the bytes per row estimate with a measurement, e.g. the growth
+        of resident memory while a chunk of ``rows`` rows was built. Larger
+        measurements are adopted at once, smaller ones gradually, because
+        freed memory is not always returned to the operating system.
+        """
+
+        if rows <= 0 or nbytes <= 0:
+            return
+
+        measured = nbytes / rows
+        if measured > self.bytes_per_row:
+            self.bytes_per_row = measured
+
+        else:
+            self.bytes_per_row = 0.75 * self.bytes_per_row + 0.25 * measured
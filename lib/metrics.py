@@ -0,0 +1,280 @@
+"""
+Lightweight instrumentation for Infinium. Provides counters and histograms,
+timing spans around hot paths, SQLAlchemy engine instrumentation, a profiler
+wrapper, and export of all metrics in the Prometheus text exposition format.
+
+All metrics live in the module-level registry ``REGISTRY``. This module is
+thread safe.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import os
+import time
+import bisect
+import cProfile
+import threading
+import functools
+from pathlib import Path
+from contextlib import contextmanager
+
+# Third-party library imports.
+from sqlalchemy import event
+
+# Infinium library imports.
+from lib.data import Developer
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Upper bounds, in seconds, of the default histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0)
+
+
+def span(name):
+    """
+    Context manager that records the wall clock duration of its block in the
+    ``infinium_span_seconds`` histogram under the label ``span=name``.
+    """
+
+    return SPAN_SECONDS.time(span=name)
+
+
+def timed(name):
+    """
+    To be used as a decorator.
+    Record the duration of every call to the decorated function as a span
+    called ``name``.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def new_func(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return new_func
+
+    return decorator
+
+
+def instrument_engine(engine):
+    """
+    Record the latency and count of every statement executed by ``engine`` in
+    ``infinium_db_query_seconds`` and ``infinium_db_queries_total``.
+
+    Args
+      engine: A SQLAlchemy ``Engine``.
+
+    Returns
+      None
+
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('infinium_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['infinium_query_start'].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        DB_QUERY_SECONDS.observe(elapsed, verb=verb)
+        DB_QUERIES_TOTAL.inc(verb=verb)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        # A failed statement never reaches ``after_cursor_execute``.
+        if context.connection is not None and context.execution_context is not None:
+            starts = context.connection.info.get('infinium_query_start')
+            if starts:
+                starts.pop()
+
+
+@contextmanager
+def profile(path):
+    """
+    Context manager that runs its block under ``cProfile`` and writes the
+    collected statistics to ``path``, even if the block raises or exits the
+    program. The file can be read with ``pstats.Stats``.
+    """
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
+
+
+def write_prometheus(path, registry=None):
+    """
+    Atomically write every metric in ``registry`` (``REGISTRY`` by default) to
+    ``path`` in the Prometheus text exposition format, suitable for the node
+    exporter's textfile collector.
+    """
+
+    registry = registry or REGISTRY
+    path = Path(path)
+    temporary_path = path.with_name(path.name + '.tmp')
+    with temporary_path.open('w') as metrics_file:
+        metrics_file.write(registry.expose())
+
+    os.replace(str(temporary_path), str(path))
+
+
+class Registry:
+    """
+    A collection of metrics that can be exposed together.
+    """
+
+    def __init__(self):
+        self.__metrics = []
+        self.__lock = threading.Lock()
+
+    def register(self, metric):
+        with self.__lock:
+            self.__metrics.append(metric)
+
+        return metric
+
+    def expose(self):
+        """ Return all metrics in the Prometheus text exposition format. """
+
+        with self.__lock:
+            metrics = list(self.__metrics)
+
+        return ''.join(metric.expose() for metric in metrics)
+
+
+class Counter:
+    """
+    A monotonically increasing count, optionally broken down by labels.
+    """
+
+    type_name = 'counter'
+
+    def __init__(self, name, help_text, registry=None):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append('{}{} {}'.format(self.name, _format_labels(key), _format_value(value)))
+
+        return '\n'.join(lines) + '\n'
+
+    def _header(self):
+        return ['# HELP {} {}'.format(self.name, self.help_text),
+                '# TYPE {} {}'.format(self.name, self.type_name)]
+
+
+class Histogram(Counter):
+    """
+    A distribution of observed values counted in cumulative buckets,
+    optionally broken down by labels.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, help_text, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """ Context manager that observes the duration of its block. """
+
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def expose(self):
+        lines = self._header()
+        bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    bucket_key = key + (('le', bound),)
+                    lines.append('{}_bucket{} {}'.format(self.name, _format_labels(bucket_key), cumulative))
+
+                lines.append('{}_sum{} {}'.format(self.name, _format_labels(key), _format_value(total)))
+                lines.append('{}_count{} {}'.format(self.name, _format_labels(key), cumulative))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+
+    pairs = ('{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"'))
+             for name, value in key)
+
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Module-level registry and metrics.
+REGISTRY = Registry()
+
+SPAN_SECONDS = Histogram('infinium_span_seconds',
+                         'Duration of instrumented operations in seconds.')
+
+DB_QUERY_SECONDS = Histogram('infinium_db_query_seconds',
+                             'Latency of database statements in seconds.')
+
+DB_QUERIES_TOTAL = Counter('infinium_db_queries_total',
+                           'Number of database statements executed.')
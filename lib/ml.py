@@ -20,12 +20,30 @@ along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
 
 """
 
+# Python standard library imports
+import os
+import time
+import zlib
+import logging
+import tempfile
+from pathlib import Path
+from itertools import islice, repeat
+from concurrent.futures import ProcessPoolExecutor
+
 # Third-party library imports
+import numpy as np
+from scipy import sparse
 from sklearn.linear_model import SGDClassifier
 from sklearn.externals import joblib
 
 # Infinium library imports
 from lib.data import Developer
+from lib.db import Company, Finances, Industry, get_watermark
+from lib.labels import get_labels
+from lib.metrics import timed, span
+from lib.scoring import write_artifact
+from lib.features import FINANCE_FEATURES, StreamingNormalizer, industry_codes
+from lib.memory import ChunkSizer, memory_budget, current_rss
 from lib.ui.config import get_config
 
 
@@ -33,15 +51,216 @@ __maintainer__ = Developer.JERRAD_GENSON
 __contact__ = Developer.EMAIL[__maintainer__]
 
 
-def construct_model():
+# Module constants.
+# Valuation labels: 1 if a company is undervalued, otherwise 0.
+VALUATION_CLASSES = np.array([0, 1])
+
+# Initial estimates of the memory, in bytes, a training sample takes while it
+# is extracted from the database, and while it is trained on.
+EXTRACTED_ROW_BYTES = 2048
+TRAINING_ROW_BYTES = 4 * 8 * (len(FINANCE_FEATURES) + 3)
+
+
+def construct_model(Session, resume=False):
+    """
+    Construct a valuation model from the training data in the database. The
+    training data is read from the database once, by ``extract_training_files``,
+    which gathers the feature scaling statistics in the same pass, so that
+    every chunk is scaled identically. Each epoch then streams the extracted
+    files in chunks sized to the memory budget. Every industry in the
+    database gets an indicator feature. If ``ensemble_size`` is greater than 1, a bagged
+    ensemble is constructed by ``construct_ensemble`` instead. If a
+    ``checkpoint_path`` is configured, a single model is trained by
+    ``construct_checkpointed_model``.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+      resume: Whether to continue from the last checkpoint, if there is one.
+
+    Raises
+      ValueError if ``resume`` is set but training is not checkpointed,
+      because no ``checkpoint_path`` is configured or an ensemble is trained.
+
+    Returns
+      A trained ``ValuationModel``.
+
+    """
+
+    configuration = get_config()
+    if resume and (configuration.checkpoint_path is None or configuration.sgd_ensemble_size > 1):
+        raise ValueError('Only single models trained with a `checkpoint_path` configured can be resumed.')
+
+    if configuration.sgd_ensemble_size > 1:
+        return construct_ensemble(Session, configuration.sgd_ensemble_size)
+
+    if configuration.checkpoint_path is not None:
+        return construct_checkpointed_model(Session, configuration.checkpoint_path, resume)
+
+    valuation_model = create_valuation_model(Session)
+    with tempfile.TemporaryDirectory(prefix='infinium-') as directory:
+        paths, n_samples = extract_training_files(Session, valuation_model.normalizer, directory)
+        training_files = open_training_files(paths, n_samples)
+        sizer = ChunkSizer.from_config(TRAINING_ROW_BYTES)
+        for epoch in range(configuration.sgd_n_iter):
+            batches = _training_file_batches(training_files, sizer)
+            train_classifier(valuation_model, (batch[:3] for batch in batches))
+
+    return valuation_model
+
+
+def construct_checkpointed_model(Session, path, resume=False):
+    """
+    Construct a valuation model like ``construct_model``, writing a
+    checkpoint to ``path`` every ``checkpoint_seconds`` so that an interrupted
+    run can be resumed. The checkpoint records the row of the extracted
+    training files that the epoch in progress has reached, rather than a
+    chunk size, so chunks are sized to the memory budget at runtime and a
+    resumed run continues from the same row, with the same random state. The
+    checkpoint is deleted when training completes.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+      path: Path of the checkpoint file.
+      resume: Whether to continue from the checkpoint at ``path``, if any.
+
+    Raises
+      ValueError if the training data changed since the checkpoint was
+      written.
+
+    Returns
+      A trained ``ValuationModel``.
+
+    """
+
     configuration = get_config()
+    msg = 'Training data changed since checkpoint "{}" was written; train without resuming.'.format(path)
+    watermark = get_watermark(Session())
+    checkpoint = load_checkpoint(path) if resume else None
+    if checkpoint is None and resume:
+        logging.info('No training checkpoint at "%s"; starting from scratch.', path)
+
+    elif checkpoint is not None and tuple(checkpoint.watermark) != tuple(watermark):
+        raise ValueError(msg)
+
+    with tempfile.TemporaryDirectory(prefix='infinium-') as directory:
+        if checkpoint is None:
+            valuation_model = create_valuation_model(Session)
+            paths, n_samples = extract_training_files(Session, valuation_model.normalizer, directory)
+            checkpoint = TrainingCheckpoint(valuation_model, n_samples, watermark)
+
+        else:
+            # The checkpointed model already holds the scaling statistics.
+            normalizer = StreamingNormalizer(len(FINANCE_FEATURES))
+            paths, n_samples = extract_training_files(Session, normalizer, directory)
+            if getattr(checkpoint, 'n_samples', None) != n_samples:
+                raise ValueError(msg)
+
+            np.random.set_state(checkpoint.random_state)
+
+        training_files = open_training_files(paths, n_samples)
+        sizer = ChunkSizer.from_config(TRAINING_ROW_BYTES)
+
+        def tracked(batches):
+            saved_at = time.monotonic()
+            for features, industry_ids, targets, end in batches:
+                yield features, industry_ids, targets
+                # The chunk has now been trained on.
+                checkpoint.offset = end
+                if time.monotonic() - saved_at >= configuration.checkpoint_seconds:
+                    save_checkpoint(checkpoint, path)
+                    saved_at = time.monotonic()
+
+        valuation_model = checkpoint.valuation_model
+        while checkpoint.epoch < configuration.sgd_n_iter:
+            train_classifier(valuation_model, tracked(_training_file_batches(training_files,
+                                                                             sizer,
+                                                                             checkpoint.offset)))
+
+            checkpoint.epoch += 1
+            checkpoint.offset = 0
+
+    try:
+        os.remove(str(path))
+
+    except FileNotFoundError:
+        pass
+
+    return valuation_model
+
+
+def construct_ensemble(Session, size):
+    """
+    Construct a valuation model from ``size`` classifiers, each trained on a
+    bootstrap sample of the training data, in parallel worker processes. The
+    training data is extracted once, by ``extract_training_files``, to
+    memory-mapped files in a temporary directory that all workers share.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+      size: Number of classifiers in the ensemble.
+
+    Returns
+      A trained ``ValuationModel`` whose classifier is a ``BaggedClassifier``.
+
+    """
+
+    valuation_model = create_valuation_model(Session)
+    normalizer = valuation_model.normalizer
+    with tempfile.TemporaryDirectory(prefix='infinium-') as directory:
+        paths, n_samples = extract_training_files(Session, normalizer, directory)
+        workers = min(size, os.cpu_count() or 1)
+        worker_budget = max(memory_budget() - current_rss(), 0) // workers
+        with span('ensemble_fit'), ProcessPoolExecutor(max_workers=workers) as executor:
+            members = list(executor.map(_train_member,
+                                        repeat(paths),
+                                        repeat(n_samples),
+                                        repeat(normalizer),
+                                        repeat(valuation_model.industries),
+                                        repeat(worker_budget),
+                                        range(size)))
+
+    valuation_model.classifier = BaggedClassifier(members)
+    return valuation_model
+
+
+def _train_member(paths, n_samples, normalizer, industries, budget, seed):
+    """
+    Train one ensemble member on a bootstrap sample of memory-mapped training
+    data, in chunks sized to the worker's share of the memory budget. Runs in
+    a worker process.
+    """
+
+    features, industry_ids, labels = open_training_files(paths, n_samples)
+    random_state = np.random.RandomState(seed)
+    sample = random_state.randint(0, n_samples, n_samples)
     classifier = create_classifier()
-    training_data = extract_training_data(database)
-    train_classifier(classifier, training_data)
+    classifier.set_params(random_state=seed)
+    sizer = ChunkSizer(current_rss() + budget, TRAINING_ROW_BYTES)
+    for epoch in range(get_config().sgd_n_iter):
+        # SGD converges poorly on samples in file order, so every epoch visits
+        # the bootstrap sample in a new random order.
+        random_state.shuffle(sample)
+        start = 0
+        while start < n_samples:
+            rows = sample[start:start + sizer.size]
+            codes = industry_codes(industries, industry_ids[rows])
+            model_input = model_matrix(normalizer.transform(features[rows]), codes, len(industries))
+            classifier.partial_fit(model_input, labels[rows], classes=VALUATION_CLASSES)
+            start += len(rows)
 
     return classifier
 
 
+def create_valuation_model(Session):
+    """
+    Create an untrained ``ValuationModel`` with an indicator feature for
+    every industry in the database.
+    """
+
+    industries = [row[0] for row in Session().query(Industry.id)]
+    return ValuationModel(create_classifier(), StreamingNormalizer(len(FINANCE_FEATURES)), industries=industries)
+
+
 def create_classifier():
     configuration = get_config()
     return SGDClassifier(loss=configuration.sgd_loss,
@@ -58,22 +277,215 @@ def create_classifier():
                          power_t=configuration.sgd_power_t)
 
 
-def extract_training_data(database):
+def extract_training_data(Session, chunk_size=None, labels=None, split=None):
+    """
+    Extract training data from database. Finances records are streamed in a
+    stable order and paired with their labels from ``lib.labels``. Records
+    without a label, because their forward return is not known yet, are left
+    out.
+
+    A ``holdout_fraction`` of the companies, chosen by a hash of their IDs so
+    that the choice never changes, is held out of training for evaluation.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+      chunk_size: Maximum number of samples per chunk. If None, chunks are
+                  sized to the configured ``memory_budget``, using the memory
+                  growth measured while extracting earlier chunks.
+      labels: Labels returned by ``lib.labels.get_labels``. Fetched if None.
+      split: 'train' for the records of companies used in training, 'test'
+             for those of held-out companies, or None for all records.
+
+    Returns
+      A generator of (features, industry IDs, labels) chunks, where features
+      is a matrix with one column per entry of ``FINANCE_FEATURES``, and
+      industry IDs is an array of the industry of every sample's company.
+
+    """
+
+    if labels is None:
+        labels = get_labels(Session)
+
+    return _training_batches(Session, chunk_size, labels, split)
+
+
+def extract_training_files(Session, normalizer, directory):
+    """
+    Extract the training split of the training data to memory-mapped files,
+    in a single pass over the database that also gathers the feature scaling
+    statistics.
+
+    Args
+      Session: A SQLAlchemy ``Session`` class.
+      normalizer: A ``StreamingNormalizer`` to update with every chunk.
+      directory: Directory to write the files to.
+
+    Raises
+      ValueError if there is no labeled training data.
+
+    Returns
+      A tuple of (paths, number of samples), for ``open_training_files``.
+
+    """
+
+    paths = [os.path.join(directory, name) for name in ('features.dat', 'industries.dat', 'labels.dat')]
+    n_samples = 0
+    with span('training_files_extract'), \
+         open(paths[0], 'wb') as features_file, \
+         open(paths[1], 'wb') as industries_file, \
+         open(paths[2], 'wb') as labels_file:
+        for features, industry_ids, labels in extract_training_data(Session, split='train'):
+            normalizer.update(features)
+            features_file.write(features.tobytes())
+            industries_file.write(industry_ids.tobytes())
+            labels_file.write(labels.tobytes())
+            n_samples += len(labels)
+
+    if not n_samples:
+        raise ValueError('There is no labeled training data.')
+
+    return paths, n_samples
+
+
+def open_training_files(paths, n_samples):
+    """
+    Open the files written by ``extract_training_files`` as read-only memory
+    maps.
+
+    Returns
+      A tuple of (features, industry IDs, labels) arrays.
+
+    """
+
+    features_path, industries_path, labels_path = paths
+    return (np.memmap(features_path, dtype=np.float64, mode='r', shape=(n_samples, len(FINANCE_FEATURES))),
+            np.memmap(industries_path, dtype=np.int64, mode='r', shape=(n_samples,)),
+            np.memmap(labels_path, dtype=np.int64, mode='r', shape=(n_samples,)))
+
+
+def _training_file_batches(training_files, sizer, start=0):
+    """
+    Generate (features, industry IDs, labels, end) chunks of the arrays
+    returned by ``open_training_files`` in order, from row ``start``. Each
+    chunk is sized by ``sizer`` when it is read, and ``end`` is the row that
+    follows it.
+    """
+
+    features, industry_ids, labels = training_files
+    while start < len(labels):
+        end = start + sizer.size
+        rss = current_rss()
+        yield features[start:end], industry_ids[start:end], labels[start:end], min(end, len(labels))
+        sizer.observe(min(end, len(labels)) - start, current_rss() - rss)
+        start = end
+
+
+def _training_batches(Session, chunk_size, labels, split=None):
+    """ Generate the chunks of ``extract_training_data``. """
+
+    if split not in ('train', 'test', None):
+        raise ValueError('Unknown training data split `{}`.'.format(split))
+
+    holdout_fraction = get_config().label_holdout_fraction
+    sizer = ChunkSizer.from_config(EXTRACTED_ROW_BYTES) if chunk_size is None else None
+    session = Session()
+    columns = [getattr(Finances, feature) for feature in FINANCE_FEATURES]
+    query = session.query(Finances.company_id, Finances.year, Company.industry_id, *columns)
+    query = query.join(Company, Company.id == Finances.company_id)
+    query = query.order_by(Finances.company_id, Finances.year).yield_per(chunk_size or sizer.size)
+    rows = iter(query)
+    while True:
+        rss = current_rss()
+        with span('extract_training_data'):
+            batch = list(islice(rows, chunk_size or sizer.size))
+
+        if not batch:
+            return
+
+        chunk = [row for row in batch if (row[0], row[1].year) in labels and
+                 (split is None or _held_out(row[0], holdout_fraction) == (split == 'test'))]
+        features = np.array([row[3:] for row in chunk], dtype=np.float64)
+        industry_ids = np.array([row[2] for row in chunk], dtype=np.int64)
+        targets = np.array([labels[(row[0], row[1].year)] for row in chunk], dtype=np.int64)
+        if sizer is not None:
+            sizer.observe(len(batch), current_rss() - rss)
+
+        if chunk:
+            yield features, industry_ids, targets
+
+
+def model_matrix(features, codes, n_industries):
+    """
+    Build the input matrix of a classifier: standardized Finances features
+    followed by one indicator column per industry, as a sparse CSR matrix.
+    Only the set indicators are stored, so memory grows with the number of
+    samples rather than the number of industries.
+
+    Args
+      features: Standardized Finances feature matrix.
+      codes: Array of the industry code of every sample, as returned by
+             ``lib.features.industry_codes``; -1 sets no indicator.
+      n_industries: Number of industry indicator columns.
+
+    Returns
+      A ``scipy.sparse.csr_matrix`` of shape
+      (n_samples, n_features + n_industries).
+
+    """
+
+    codes = np.asarray(codes)
+    rows = np.flatnonzero(codes >= 0)
+    indicators = sparse.csr_matrix((np.ones(len(rows)), (rows, codes[rows])),
+                                   shape=(len(codes), n_industries))
+
+    return sparse.hstack([sparse.csr_matrix(features), indicators], format='csr')
+
+
+@timed('normalizer_fit')
+def fit_normalizer(valuation_model, training_data):
     """
-    Extract training data from database.
+    Gather the feature scaling statistics of a valuation model from the
+    training data, one chunk at a time. Call before ``train_classifier``, so
+    that the statistics are final before any chunk is trained on.
+
+    Args
+      valuation_model: A ``ValuationModel`` returned by
+                       ``create_valuation_model``.
+      training_data: An iterable of (features, industry IDs, labels) chunks.
+
+    Returns
+      None
+
     """
 
-    raise NotImplementedError('`extract_training_data` not yet implemented.')
+    for features, industry_ids, labels in training_data:
+        valuation_model.normalizer.update(features)
 
 
-def train_classifier(classifier, training_data):
+@timed('model_fit')
+def train_classifier(valuation_model, training_data):
     """
-    Train classifier using the provided training data.
+    Train the classifier of a valuation model for one epoch using the
+    provided training data. Each chunk is standardized with the statistics
+    gathered beforehand, by ``extract_training_files`` or ``fit_normalizer``.
+
+    Args
+      valuation_model: A ``ValuationModel`` returned by
+                       ``create_valuation_model``.
+      training_data: An iterable of (features, industry IDs, labels) chunks.
+
+    Returns
+      None
+
     """
 
-    raise NotImplementedError('`train_classifier` not yet implemented.')
+    for features, industry_ids, labels in training_data:
+        valuation_model.classifier.partial_fit(valuation_model.encode(features, industry_ids),
+                                               labels,
+                                               classes=VALUATION_CLASSES)
 
 
+@timed('model_load')
 def load_model(path):
     """
     Load valuation model from target file on storage device.
@@ -82,19 +494,20 @@ def load_model(path):
       path: Path to load valuation model from.
 
     Returns
-      The loaded and deserialized valuation model (sklearn classifier).
+      The loaded and deserialized ``ValuationModel``.
 
     """
 
     return joblib.load(path)
 
 
+@timed('model_save')
 def save_model(valuation_model, path):
     """
     Save valuation model to target location on storage device.
 
     Args
-      valuation_model: A classifier returned by ``create_classifier``.
+      valuation_model: A ``ValuationModel`` returned by ``construct_model``.
       path: Path of the file to serialize and write the valuation model to.
 
     Returns
@@ -105,5 +518,229 @@ def save_model(valuation_model, path):
     return joblib.dump(valuation_model, path, compress=1)
 
 
+@timed('checkpoint_save')
+def save_checkpoint(checkpoint, path):
+    """
+    Atomically replace the training checkpoint at ``path``, recording the
+    current state of NumPy's global random number generator.
+
+    Args
+      checkpoint: A ``TrainingCheckpoint``.
+      path: Path of the checkpoint file.
+
+    Returns
+      None
+
+    """
+
+    checkpoint.random_state = np.random.get_state()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = str(path) + '.tmp'
+    save_model(checkpoint, temporary_path)
+    os.replace(temporary_path, str(path))
+
+
+def load_checkpoint(path):
+    """ Load a training checkpoint, or return None if there is none at ``path``. """
+
+    try:
+        return load_model(path)
+
+    except FileNotFoundError:
+        return None
+
+
+@timed('model_export')
+def export_scoring_artifact(valuation_model, path):
+    """
+    Export the parameters that scoring needs from a trained valuation model
+    to a compact file that ``lib.scoring.LinearScorer`` loads without
+    scikit-learn.
+
+    Args
+      valuation_model: A ``ValuationModel`` returned by ``construct_model``.
+      path: Path of the scoring artifact to write.
+
+    Returns
+      None
+
+    """
+
+    classifier = valuation_model.classifier
+    write_artifact(path,
+                   coef=classifier.coef_,
+                   intercept=classifier.intercept_,
+                   classes=classifier.classes_,
+                   features=valuation_model.features,
+                   mean=valuation_model.normalizer.mean,
+                   scale=valuation_model.normalizer.scale,
+                   ensemble=isinstance(classifier, BaggedClassifier),
+                   industries=valuation_model.industries)
+
+
+@timed('model_evaluate')
 def evaluate_model(valuation_model, testing_data):
-    raise NotImplementedError('`evaluate_model` operation not yet implemented.')
\ No newline at end of file
+    """
+    Measure how well a valuation model predicts the labels of testing data,
+    treating undervalued (1) as the positive class.
+
+    Args
+      valuation_model: A ``ValuationModel`` or ``lib.scoring.LinearScorer``.
+      testing_data: An iterable of (features, industry IDs, labels) chunks,
+                    e.g. ``extract_training_data(Session, split='test')``.
+
+    Returns
+      A dict of the number of samples, the confusion matrix counts, and the
+      accuracy, precision, recall and F1 score. Precision, recall and F1 are
+      None where they are undefined.
+
+    Raises
+      ValueError if there is no testing data.
+
+    """
+
+    counts = np.zeros((2, 2), dtype=np.int64)
+    for features, industry_ids, labels in testing_data:
+        predicted = np.asarray(valuation_model.predict(features, industry_ids)) == 1
+        actual = np.asarray(labels) == 1
+        counts += [[np.sum(~actual & ~predicted), np.sum(~actual & predicted)],
+                   [np.sum(actual & ~predicted), np.sum(actual & predicted)]]
+
+    (true_negatives, false_positives), (false_negatives, true_positives) = counts.tolist()
+    samples = int(counts.sum())
+    if not samples:
+        raise ValueError('There is no labeled testing data.')
+
+    precision = _ratio(true_positives, true_positives + false_positives)
+    recall = _ratio(true_positives, true_positives + false_negatives)
+    f1 = None
+    if precision is not None and recall is not None:
+        f1 = _ratio(2 * precision * recall, precision + recall)
+
+    return {'samples': samples,
+            'true_positives': true_positives,
+            'false_positives': false_positives,
+            'true_negatives': true_negatives,
+            'false_negatives': false_negatives,
+            'accuracy': (true_positives + true_negatives) / samples,
+            'precision': precision,
+            'recall': recall,
+            'f1': f1}
+
+
+def _ratio(numerator, denominator):
+    """ Return ``numerator / denominator``, or None if the denominator is 0. """
+
+    return numerator / denominator if denominator else None
+
+
+def _held_out(company_id, fraction):
+    """ Return True if ``company_id`` is among the ``fraction`` of companies held out of training. """
+
+    return zlib.crc32(str(company_id).encode('utf-8')) % 10000 < fraction * 10000
+
+
+class ValuationModel:
+    """
+    A trained classifier together with the feature scaling and the industries
+    it was trained with, so that training and scoring always encode features
+    identically. Serialized as a whole by ``save_model``.
+    """
+
+    # Models saved before industry features were added have no industries.
+    industries = np.zeros(0, dtype=np.int64)
+
+    def __init__(self, classifier, normalizer, features=FINANCE_FEATURES, industries=()):
+        self.classifier = classifier
+        self.normalizer = normalizer
+        self.features = tuple(features)
+        self.industries = np.unique(np.asarray(industries, dtype=np.int64))
+
+    def encode(self, features, industry_ids=None):
+        """
+        Build the classifier input for Finances ``features`` and the
+        ``industry_ids`` of the samples' companies. Industries are left out
+        if ``industry_ids`` is None.
+        """
+
+        if industry_ids is None:
+            industry_ids = np.full(len(features), -1)
+
+        codes = industry_codes(self.industries, industry_ids)
+        return model_matrix(self.normalizer.transform(features), codes, len(self.industries))
+
+    def decision_function(self, features, industry_ids=None):
+        """ Compute signed distances of samples to the decision boundary. """
+
+        return self.classifier.decision_function(self.encode(features, industry_ids))
+
+    def decision_bands(self, features, industry_ids=None):
+        """
+        Compute the mean and standard deviation of the ensemble members'
+        scores of every sample, as ``lib.scoring.LinearScorer.decision_bands``
+        does. The deviation is zero for single classifiers.
+        """
+
+        model_input = self.encode(features, industry_ids)
+        if not isinstance(self.classifier, BaggedClassifier):
+            scores = self.classifier.decision_function(model_input)
+            return scores, np.zeros_like(scores)
+
+        scores = self.classifier.member_scores(model_input)
+        return scores.mean(axis=1), scores.std(axis=1)
+
+    def predict(self, features, industry_ids=None):
+        """ Predict the valuation label of every row of ``features``. """
+
+        return self.classifier.predict(self.encode(features, industry_ids))
+
+
+class TrainingCheckpoint:
+    """
+    The state of a partially trained valuation model: the model, the number
+    of training samples, the training data watermark, the epoch in progress,
+    the offset of the first training file row not yet trained on in that
+    epoch and the random state.
+    """
+
+    def __init__(self, valuation_model, n_samples, watermark):
+        self.valuation_model = valuation_model
+        self.n_samples = n_samples
+        self.watermark = watermark
+        self.epoch = 0
+        self.offset = 0
+        self.random_state = None
+
+
+class BaggedClassifier:
+    """
+    An ensemble of binary linear classifiers, scored as the mean of their
+    decision functions. Only the members' stacked coefficients are kept, so
+    all members score a sample with a single matrix multiplication.
+    """
+
+    def __init__(self, members):
+        self.coef_ = np.vstack([member.coef_ for member in members])
+        self.intercept_ = np.concatenate([member.intercept_ for member in members])
+        self.classes_ = members[0].classes_
+        self.params = dict(members[0].get_params(), random_state=None, ensemble_size=len(members))
+
+    def get_params(self, deep=True):
+        """ Hyperparameters shared by the members, and the ensemble size. """
+
+        return dict(self.params)
+
+    def member_scores(self, features):
+        """ Return a matrix of every member's score of every sample. """
+
+        return features.dot(self.coef_.T) + self.intercept_
+
+    def decision_function(self, features):
+        """ Compute the mean signed distance of samples to the members' boundaries. """
+
+        return self.member_scores(features).mean(axis=1)
+
+    def predict(self, features):
+        """ Predict the class of every row of ``features``. """
+
+        return self.classes_[(self.decision_function(features) > 0).astype(np.intp)]
@@ -0,0 +1,245 @@
+"""
+Query-level statistics for Infinium databases. Listens to SQLAlchemy engine
+events to record call counts, latency and row counts of every statement,
+grouped by normalized SQL, so that statements differing only in their literal
+values are counted together. Statements slower than a threshold are logged,
+along with their query plan on PostgreSQL.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import re
+import time
+import atexit
+import logging
+import threading
+
+# Third-party library imports.
+from sqlalchemy import event
+
+# Infinium library imports.
+from lib.data import Developer
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)'
+_PLACEHOLDER_LIST = re.compile(r'\(\s*{0}(?:\s*,\s*{0})*\s*\)'.format(_PLACEHOLDER))
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    """
+    Reduce a SQL statement to its shape: literals become '?' and lists of
+    values or placeholders, such as the contents of an ``IN`` clause or a
+    multi-row ``VALUES``, collapse to a single '(?)'.
+
+    Args
+      statement: A SQL string.
+
+    Returns
+      The normalized SQL string.
+
+    """
+
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = re.sub(_PLACEHOLDER, '?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(?)', statement)
+    statement = _WHITESPACE.sub(' ', statement).strip()
+
+    return statement
+
+
+class QueryStatistics:
+    """
+    Collects per-statement statistics from any number of SQLAlchemy engines.
+    """
+
+    def __init__(self, slow_query_seconds=None):
+        """
+        Args
+          slow_query_seconds: Log statements that take longer than this many
+                              seconds. None disables slow query logging.
+        """
+
+        self.slow_query_seconds = slow_query_seconds
+        self.__statistics = {}
+        self.__lock = threading.Lock()
+        self.__summary_registered = False
+
+    def attach(self, engine):
+        """ Start collecting statistics for statements executed by ``engine``. """
+
+        event.listen(engine, 'before_cursor_execute', self.__before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.__after_cursor_execute)
+        event.listen(engine, 'handle_error', self.__handle_error)
+
+    def record(self, statement, seconds, rows):
+        """
+        Add one execution of ``statement`` to the statistics.
+
+        Args
+          statement: The SQL string that was executed.
+          seconds: Latency of the execution.
+          rows: Number of rows affected or returned, or None if unknown.
+
+        """
+
+        shape = normalize_sql(statement)
+        with self.__lock:
+            statistic = self.__statistics.setdefault(shape, _Statistic())
+            statistic.calls += 1
+            statistic.total_seconds += seconds
+            statistic.max_seconds = max(statistic.max_seconds, seconds)
+            if rows is not None and rows >= 0:
+                statistic.rows += rows
+
+    def statistics(self):
+        """
+        Returns
+          A list of (normalized SQL, calls, total seconds, max seconds, rows)
+          tuples, ordered by descending total seconds.
+
+        """
+
+        with self.__lock:
+            rows = [(shape, s.calls, s.total_seconds, s.max_seconds, s.rows)
+                    for shape, s in self.__statistics.items()]
+
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def summary(self, limit=20):
+        """ Format the ``limit`` most expensive statement shapes as a table. """
+
+        lines = ['{:>8} {:>12} {:>10} {:>10} {:>10}  {}'.format('calls', 'total_ms', 'mean_ms',
+                                                               'max_ms', 'rows', 'statement')]
+
+        for shape, calls, total, maximum, rows in self.statistics()[:limit]:
+            line = '{:>8} {:>12.1f} {:>10.2f} {:>10.2f} {:>10}  {}'
+            lines.append(line.format(calls, total * 1000, total * 1000 / calls,
+                                     maximum * 1000, rows, shape))
+
+        return '\n'.join(lines)
+
+    def log_summary(self):
+        """ Log ``summary`` if any statements were recorded. """
+
+        if self.statistics():
+            logging.info('Query statistics:\n%s', self.summary())
+
+    def log_summary_at_exit(self):
+        """
+        Call ``log_summary`` when the interpreter exits. Exit handlers run in
+        reverse order of registration, so call this after logging is
+        configured for the summary to be logged before the log listener
+        stops. Repeated calls have no effect.
+        """
+
+        with self.__lock:
+            if self.__summary_registered:
+                return
+
+            self.__summary_registered = True
+
+        atexit.register(self.log_summary)
+
+    def __before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('infinium_stats_start', []).append(time.perf_counter())
+
+    def __after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['infinium_stats_start'].pop()
+        self.record(statement, seconds, getattr(cursor, 'rowcount', None))
+        if self.slow_query_seconds is not None and seconds > self.slow_query_seconds:
+            plan = None
+            if conn.dialect.name == 'postgresql' and not executemany:
+                plan = _explain(cursor, statement, parameters)
+
+            msg = 'Slow query ({:.1f} ms): {}\nParameters: {!r}'
+            msg = msg.format(seconds * 1000, statement, parameters)
+            if plan:
+                msg += '\nPlan:\n' + plan
+
+            logging.warning(msg)
+
+    def __handle_error(self, context):
+        # A failed statement never reaches ``after_cursor_execute``.
+        if context.connection is not None and context.execution_context is not None:
+            starts = context.connection.info.get('infinium_stats_start')
+            if starts:
+                starts.pop()
+
+
+class _Statistic:
+    """ Mutable accumulator for one statement shape. """
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+
+def _explain(cursor, statement, parameters):
+    """
+    Capture the PostgreSQL query plan of a SELECT statement. Runs on a new
+    DBAPI cursor of the same connection, so that it does not trigger engine
+    events or disturb the results of ``cursor``.
+
+    Returns
+      The plan as a string, or None if it could not be captured.
+
+    """
+
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+
+    try:
+        explain_cursor = cursor.connection.cursor()
+        try:
+            # A failed statement aborts the enclosing transaction on
+            # PostgreSQL, so isolate the EXPLAIN in a savepoint.
+            explain_cursor.execute('SAVEPOINT infinium_explain')
+            try:
+                explain_cursor.execute('EXPLAIN ' + statement, parameters)
+                plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+
+            except Exception:
+                explain_cursor.execute('ROLLBACK TO SAVEPOINT infinium_explain')
+                raise
+
+            explain_cursor.execute('RELEASE SAVEPOINT infinium_explain')
+            return plan
+
+        finally:
+            explain_cursor.close()
+
+    except Exception:
+        logging.debug('Could not capture query plan.', exc_info=True)
+        return None
+
+
+# Statistics shared by every engine created by ``lib.db.connect_database``.
+QUERY_STATISTICS = QueryStatistics()
@@ -0,0 +1,267 @@
+"""
+A local registry of trained valuation models. Every published model is stored
+in its own version directory, named by a hash of the model parameters, holding
+the serialized model, its scoring artifact and a JSON metadata file. Publishing
+a fit identical to one already stored reuses the stored version.
+
+The active version is selected by the ``current`` symbolic link, which is
+replaced atomically, so scoring processes switch versions or roll back without
+copying model files and never see a half-written model.
+
+This module does not import scikit-learn.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib.data import Developer
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Names of the files in every version directory.
+MODEL_FILE = 'model.pkl'
+SCORING_FILE = 'scoring.npz'
+METADATA_FILE = 'metadata.json'
+
+# Names of the entries in the registry directory.
+_VERSIONS_DIR = 'versions'
+_CURRENT_LINK = 'current'
+_HISTORY_FILE = 'history'
+
+
+class ModelRegistry:
+    """
+    A model registry rooted at a local directory, which is created on first
+    use. Versions are identified by hexadecimal digests, and may be referred
+    to by any unique prefix of their digest.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def publish(self, write_files, metadata):
+        """
+        Store a new model version. The model files are written to a staging
+        directory inside the registry, which is then renamed into place. If
+        the same model parameters are already stored, the staging directory is
+        discarded and the stored version is returned.
+
+        Args
+          write_files: A callable that takes a directory and writes the
+                       model's ``MODEL_FILE`` and ``SCORING_FILE`` into it.
+          metadata: A JSON-serializable dict describing the model.
+
+        Returns
+          The version of the published model.
+
+        """
+
+        versions = self.root / _VERSIONS_DIR
+        versions.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix='.staging-', dir=str(versions)))
+        try:
+            # Let scoring processes run by other users read the version.
+            staging.chmod(0o755)
+            write_files(staging)
+            version = _digest(staging / SCORING_FILE)
+            target = versions / version
+            if not target.exists():
+                with (staging / METADATA_FILE).open('w') as metadata_file:
+                    json.dump(dict(metadata, version=version), metadata_file, indent=2, sort_keys=True)
+
+                self.__move(staging, target)
+
+        finally:
+            shutil.rmtree(str(staging), ignore_errors=True)
+
+        return version
+
+    def activate(self, version):
+        """
+        Point ``current`` at ``version``.
+
+        Raises
+          KeyError if the version does not exist.
+
+        Returns
+          The full version that was activated.
+
+        """
+
+        version = self.resolve(version)
+        self.__link(version)
+        history = self.__history()
+        if not history or history[-1] != version:
+            self.__write_history(history + [version])
+
+        return version
+
+    def rollback(self):
+        """
+        Point ``current`` back at the version that was active before it.
+
+        Raises
+          KeyError if there is no earlier version to roll back to.
+
+        Returns
+          The version that is now active.
+
+        """
+
+        history = self.__history()
+        if len(history) < 2:
+            raise KeyError('No earlier model version to roll back to.')
+
+        self.__link(history[-2])
+        self.__write_history(history[:-1])
+
+        return history[-2]
+
+    @property
+    def current(self):
+        """ The active version, or None if no version has been activated. """
+
+        try:
+            return Path(os.readlink(str(self.root / _CURRENT_LINK))).name
+
+        except FileNotFoundError:
+            return None
+
+    def path(self, version=None, name=SCORING_FILE):
+        """
+        Return the path of a file in a version directory. The active version
+        is used if ``version`` is None.
+
+        Raises
+          KeyError if the version does not exist or no version is active.
+
+        """
+
+        version = self.current if version is None else self.resolve(version)
+        if version is None:
+            raise KeyError('No model version is active in "{}".'.format(self.root))
+
+        return self.root / _VERSIONS_DIR / version / name
+
+    def metadata(self, version=None):
+        """ Return the metadata of a version, by default the active one. """
+
+        with self.path(version, METADATA_FILE).open() as metadata_file:
+            return json.load(metadata_file)
+
+    def versions(self):
+        """ Return the metadata of every stored version, oldest first. """
+
+        versions = self.root / _VERSIONS_DIR
+        if not versions.is_dir():
+            return []
+
+        stored = [self.metadata(entry.name) for entry in versions.iterdir()
+                  if not entry.name.startswith('.')]
+
+        return sorted(stored, key=lambda metadata: metadata.get('created', ''))
+
+    def resolve(self, version):
+        """
+        Return the full version matching a version or unique version prefix.
+
+        Raises
+          KeyError if no version, or more than one version, matches.
+
+        """
+
+        versions = self.root / _VERSIONS_DIR
+        matches = [entry.name for entry in versions.glob(version + '*')
+                   if not entry.name.startswith('.')] if version else []
+
+        if len(matches) != 1:
+            msg = 'No model version matches `{}`.' if not matches else 'Model version `{}` is ambiguous.'
+            raise KeyError(msg.format(version))
+
+        return matches[0]
+
+    @staticmethod
+    def __move(staging, target):
+        """ Rename ``staging`` to ``target`` unless another process got there first. """
+
+        try:
+            os.rename(str(staging), str(target))
+
+        except OSError:
+            if not target.exists():
+                raise
+
+    def __link(self, version):
+        """ Atomically replace the ``current`` link with one to ``version``. """
+
+        temporary_link = self.root / (_CURRENT_LINK + '.tmp')
+        if temporary_link.is_symlink():
+            temporary_link.unlink()
+
+        os.symlink(os.path.join(_VERSIONS_DIR, version), str(temporary_link))
+        os.replace(str(temporary_link), str(self.root / _CURRENT_LINK))
+
+    def __history(self):
+        """ Return the versions activated so far, oldest first. """
+
+        try:
+            with (self.root / _HISTORY_FILE).open() as history_file:
+                return history_file.read().split()
+
+        except FileNotFoundError:
+            return []
+
+    def __write_history(self, history):
+        path = self.root / _HISTORY_FILE
+        temporary_path = path.with_name(path.name + '.tmp')
+        with temporary_path.open('w') as history_file:
+            history_file.writelines(version + '\n' for version in history)
+
+        os.replace(str(temporary_path), str(path))
+
+
+def _digest(artifact_path):
+    """
+    Hash the arrays of a scoring artifact. Archive metadata such as file
+    timestamps is ignored, so identical fits always hash identically.
+    """
+
+    digest = hashlib.sha256()
+    with np.load(str(artifact_path), allow_pickle=False) as artifact:
+        for name in sorted(artifact.files):
+            array = np.ascontiguousarray(artifact[name])
+            digest.update('{}:{}:{}\n'.format(name, array.dtype.str, array.shape).encode())
+            digest.update(array.tobytes())
+
+    return digest.hexdigest()
@@ -0,0 +1,202 @@
+"""
+Fast scoring with linear valuation models, without scikit-learn. A trained
+model is exported by ``lib.ml.export_scoring_artifact`` to a small versioned
+``.npz`` file holding its coefficients, intercept, classes, feature order and
+feature scaling parameters. An ensemble of linear models is exported with one
+row of coefficients per member, and scored as the mean of the members' scores
+with a single matrix multiplication. Industry indicator coefficients are
+looked up by industry instead of being multiplied with one-hot columns.
+``LinearScorer`` loads that file and scores feature matrices with NumPy
+alone, so scoring processes start quickly and stay small.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib.data import Developer
+from lib.features import industry_codes
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Version of the scoring artifact format written by ``write_artifact``.
+ARTIFACT_VERSION = 3
+
+# Versions of the scoring artifact format that ``LinearScorer`` can load.
+# Version 1 artifacts predate ensembles, and version 2 artifacts predate
+# industry features.
+SUPPORTED_ARTIFACT_VERSIONS = (1, 2, 3)
+
+
+def write_artifact(path, coef, intercept, classes, features, mean=None, scale=None, ensemble=False, industries=()):
+    """
+    Write a scoring artifact.
+
+    Args
+      path: Path of the file to write.
+      coef: Coefficient matrix of shape (n_classes or 1, n_features), or
+            (n_members, n_features) for an ensemble of binary models, where
+            the columns are ``features`` followed by one indicator per
+            industry in ``industries``.
+      intercept: Intercept vector of length n_classes or 1, or n_members.
+      classes: Class labels, in the order used by ``coef``.
+      features: Names of the Finances features, in column order.
+      mean: Per-feature mean subtracted before scoring. Defaults to zeros.
+      scale: Per-feature divisor applied before scoring. Defaults to ones.
+      ensemble: Whether the rows of ``coef`` are members of an ensemble.
+      industries: Sorted IDs of the industries with indicator columns.
+
+    Returns
+      None
+
+    """
+
+    coef = np.atleast_2d(np.asarray(coef, dtype=np.float64))
+    n_features = coef.shape[1] - len(industries)
+    if len(features) != n_features:
+        raise ValueError('Expected {} feature names, got {}.'.format(n_features, len(features)))
+
+    mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+    scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+    with open(str(path), 'wb') as artifact_file:
+        np.savez(artifact_file,
+                 version=np.array(ARTIFACT_VERSION),
+                 coef=coef,
+                 intercept=np.atleast_1d(np.asarray(intercept, dtype=np.float64)),
+                 classes=np.asarray(classes),
+                 features=np.array(features, dtype=np.str_),
+                 mean=mean,
+                 scale=scale,
+                 ensemble=np.array(ensemble),
+                 industries=np.asarray(industries, dtype=np.int64))
+
+
+class LinearScorer:
+    """
+    Scores feature matrices with the parameters of an exported linear model.
+    """
+
+    def __init__(self, coef, intercept, classes, features, mean, scale, ensemble=False, industries=()):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes = classes
+        self.features = tuple(features)
+        self.mean = mean
+        self.scale = scale
+        self.ensemble = ensemble
+        self.industries = np.asarray(industries, dtype=np.int64)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a scoring artifact written by ``write_artifact``.
+
+        Raises
+          ValueError if the artifact was written in an unsupported format.
+
+        """
+
+        with np.load(str(path), allow_pickle=False) as artifact:
+            version = int(artifact['version'])
+            if version not in SUPPORTED_ARTIFACT_VERSIONS:
+                msg = 'Unsupported scoring artifact version {} in "{}".'
+                raise ValueError(msg.format(version, path))
+
+            return cls(artifact['coef'],
+                       artifact['intercept'],
+                       artifact['classes'],
+                       artifact['features'].tolist(),
+                       artifact['mean'],
+                       artifact['scale'],
+                       bool(artifact['ensemble']) if 'ensemble' in artifact.files else False,
+                       artifact['industries'] if 'industries' in artifact.files else ())
+
+    def decision_function(self, features, industry_ids=None):
+        """
+        Compute signed distances of samples to the decision boundary.
+
+        Args
+          features: Matrix of shape (n_samples, n_features) in the column order
+                    given by ``self.features``.
+          industry_ids: Array of the industry ID of every sample, -1 if
+                        unknown. Industries are ignored if None.
+
+        Returns
+          A vector of length n_samples for binary models and ensembles,
+          otherwise a matrix of shape (n_samples, n_classes).
+
+        """
+
+        scores = self.__scores(features, industry_ids)
+        if self.ensemble:
+            return scores.mean(axis=1)
+
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def decision_bands(self, features, industry_ids=None):
+        """
+        Compute the mean and standard deviation of the ensemble members'
+        scores of every sample. The deviation is zero for single models.
+
+        Returns
+          A tuple of (scores, deviations), shaped like the result of
+          ``decision_function``.
+
+        """
+
+        if not self.ensemble:
+            scores = self.decision_function(features, industry_ids)
+            return scores, np.zeros_like(scores)
+
+        scores = self.__scores(features, industry_ids)
+        return scores.mean(axis=1), scores.std(axis=1)
+
+    def predict(self, features, industry_ids=None):
+        """ Predict the class of every row of ``features``. """
+
+        scores = self.decision_function(features, industry_ids)
+        if scores.ndim == 1:
+            indices = (scores > 0).astype(np.intp)
+
+        else:
+            indices = scores.argmax(axis=1)
+
+        return self.classes[indices]
+
+    def __scores(self, features, industry_ids):
+        """
+        Score samples with every row of ``self.coef`` in one multiplication,
+        then add the coefficient of each sample's industry indicator.
+        """
+
+        n_features = len(self.features)
+        features = (np.asarray(features, dtype=np.float64) - self.mean) / self.scale
+        scores = features.dot(self.coef[:, :n_features].T) + self.intercept
+        if industry_ids is not None and len(self.industries):
+            codes = industry_codes(self.industries, industry_ids)
+            known = codes >= 0
+            scores[known] += self.coef[:, n_features + codes[known]].T
+
+        return scores
@@ -23,9 +23,14 @@ along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
 # Python standard library imports.
 import re
 import sys
+import asyncio
+import json
+import time
 import logging
+import resource
 from enum import Enum
-from datetime import date
+from collections import defaultdict
+from datetime import date, datetime
 from getpass import getpass
 
 # Third-party library imports.
@@ -33,9 +38,13 @@ from sqlalchemy.exc import OperationalError
 
 # Infinium library imports.
 import argparse
-from lib import db
-from lib.ml import construct_model
-from lib.data import PROGRAM_NAME, Developer, ExitCode
+from lib import db, metrics
+from lib.scoring import LinearScorer
+from lib.cache import ValuationCache, snapshot_watermark
+from lib.registry import ModelRegistry, MODEL_FILE, SCORING_FILE
+from lib.features import FINANCE_FEATURES, finance_matrix
+from lib.validation import validate_csv, RejectsFile
+from lib.data import PROGRAM_NAME, Developer, ExitCode, DOLLARS, NUMBER, YEARS, MONTHS, DAYS
 from lib.ui.config import get_config
 
 
@@ -44,12 +53,6 @@ __contact__ = Developer.EMAIL[__maintainer__]
 
 
 # Module constants
-DOLLARS = '^\d*\.?\d{0,2}$'
-YEARS = '^\d{4}$'
-MONTHS = '^\d{1,2}$'
-DAYS = '^\d{1,2}$'
-RATIO = '^0*\.\d+$'
-
 WELCOME_MESSAGE = """
 Welcome to Infinium - cutting-edge stock valuation and analysis software.
 
@@ -110,7 +113,8 @@ def launch_cli():
         # or construct a new valuation model.
         main_operation = _main_prompt()
         if main_operation is _MainOperation.construct_model:
-            construct_model()
+            from lib.ml import construct_model
+            construct_model(Session)
 
         elif main_operation is _MainOperation.add_database_entry:
             _add_database_entry(Session)
@@ -119,7 +123,7 @@ def launch_cli():
             raise NotImplementedError()
 
         elif main_operation is _MainOperation.analyze_stock:
-            raise NotImplementedError()
+            _analyze_stock(Session)
 
         elif main_operation is _MainOperation.exit:
             sys.exit(ExitCode.success.value)
@@ -145,6 +149,130 @@ def parse_command_line():
                         action='store_true',
                         dest='debug')
 
+    parser.add_argument('--profile',
+                        help='Run under cProfile and write the statistics to this file.',
+                        metavar='PATH',
+                        dest='profile')
+
+    parser.add_argument('--metrics',
+                        help='Write timing metrics to this file in Prometheus text format on exit.',
+                        metavar='PATH',
+                        dest='metrics')
+
+    subparsers = parser.add_subparsers(dest='command',
+                                       help='Run an operation non-interactively and exit.')
+
+    train_parser = subparsers.add_parser('train',
+                                         help='Construct a new valuation model and publish it to the model registry.')
+
+    train_parser.add_argument('--resume',
+                              help='Continue an interrupted training run from its last checkpoint. '
+                                   'Requires a configured checkpoint path and an ensemble size of 1.',
+                              action='store_true',
+                              dest='resume')
+
+    score_parser = subparsers.add_parser('score',
+                                         help='Score companies with the saved valuation model. Write JSON lines to stdout.')
+
+    score_parser.add_argument('company_ids',
+                              help='IDs of the companies to score. Score all companies if omitted.',
+                              nargs='*',
+                              metavar='COMPANY_ID')
+
+    ingest_parser = subparsers.add_parser('ingest',
+                                          help='Bulk load records from a CSV file into the database.')
+
+    ingest_parser.add_argument('table',
+                               help='Name of the table to load records into.',
+                               choices=sorted(db.TABLES))
+
+    ingest_parser.add_argument('path',
+                               help='CSV file with a header row naming the table columns.')
+
+    ingest_parser.add_argument('--concurrency',
+                               help='Load stocks or finances in this many concurrent transactions, '
+                                    'split by company, instead of in a single transaction. Transactions '
+                                    'only run concurrently on PostgreSQL.',
+                               type=int,
+                               default=1)
+
+    ingest_parser.add_argument('--rejects',
+                               help='CSV file to write records that fail validation to, with the '
+                                    'reasons. Defaults to the input path with `.rejects.csv` appended.',
+                               dest='rejects_path')
+
+    subparsers.add_parser('evaluate',
+                          help='Evaluate the saved valuation model against the held-out companies.')
+
+    subparsers.add_parser('snapshot',
+                          help='Rebuild the latest price and finances snapshot of every company.')
+
+    backtest_parser = subparsers.add_parser('backtest',
+                                            help='Simulate investing by the saved valuation model over past dates.',
+                                            description='Simulate investing by the saved valuation model over past '
+                                                        'dates. The model is labeled with returns over its whole '
+                                                        'training history, so dates before its training watermark '
+                                                        'are not out of sample, and are refused unless '
+                                                        '--allow-lookahead is given.')
+
+    backtest_parser.add_argument('--start',
+                                 help='First rebalancing date, as YYYY-MM-DD.',
+                                 type=_parse_date,
+                                 required=True)
+
+    backtest_parser.add_argument('--end',
+                                 help='Last rebalancing date, as YYYY-MM-DD. Defaults to today.',
+                                 type=_parse_date,
+                                 default=date.today())
+
+    backtest_parser.add_argument('--months',
+                                 help='Months between rebalancing dates.',
+                                 type=int,
+                                 default=1)
+
+    backtest_parser.add_argument('--top',
+                                 help='Maximum number of companies to hold.',
+                                 type=int,
+                                 default=20)
+
+    backtest_parser.add_argument('--allow-lookahead',
+                                 help='Backtest from before the training watermark of the model with a warning.',
+                                 action='store_true')
+
+    screen_parser = subparsers.add_parser('screen',
+                                          help='Screen scored companies by intrinsic value to price ratio.')
+
+    screen_parser.add_argument('--top',
+                               help='Maximum number of companies per industry.',
+                               type=int,
+                               dest='top_per_industry')
+
+    screen_parser.add_argument('--min-ratio',
+                               help='Smallest intrinsic value to price ratio to include.',
+                               type=float,
+                               dest='min_ratio')
+
+    screen_parser.add_argument('--industry',
+                               help='Name of an industry to screen. May be given more than once.',
+                               action='append',
+                               dest='industries')
+
+    screen_parser.add_argument('--undervalued',
+                               help='Include only companies the model values as undervalued.',
+                               action='store_true',
+                               dest='undervalued_only')
+
+    models_parser = subparsers.add_parser('models',
+                                          help='List, activate or roll back versions in the model registry.')
+
+    models_parser.add_argument('action',
+                               help='Operation to perform on the model registry.',
+                               choices=('list', 'activate', 'rollback'))
+
+    models_parser.add_argument('version',
+                               help='Version, or unique version prefix, to activate.',
+                               nargs='?')
+
 # TODO: Uncomment when GUI is ready to be used.
 #    parser.add_argument('-g', '--graphical',
 #                        help='Launch {} with GUI. Note: currently not functional.'.format(PROGRAM_NAME),
@@ -159,6 +287,466 @@ def parse_command_line():
     return cl_args
 
 
+def run_batch(cl_args):
+    """
+    Run the operation selected by a batch subcommand without prompting the
+    user. The result is written to stdout as JSON, and errors are written to
+    stderr as JSON.
+
+    Args
+      cl_args: A namespace created by ``parse_command_line`` with a
+               ``command`` attribute.
+
+    Return
+      An ``ExitCode`` describing the outcome of the operation.
+
+    """
+
+    operations = {'train': _batch_train,
+                  'score': _batch_score,
+                  'ingest': _batch_ingest,
+                  'evaluate': _batch_evaluate,
+                  'snapshot': _batch_snapshot,
+                  'backtest': _batch_backtest,
+                  'screen': _batch_screen,
+                  'models': _batch_models}
+
+    try:
+        Session = db.connect_database()
+        operations[cl_args.command](Session, cl_args)
+        return ExitCode.success
+
+    except OperationalError as error:
+        logging.error('Database connection failed: %s', error)
+        exit_code, message = ExitCode.database_connection_failed, str(error)
+
+    except NotImplementedError as error:
+        logging.error(str(error))
+        exit_code, message = ExitCode.operation_not_implemented, str(error)
+
+    except (OSError, ValueError, KeyError) as error:
+        logging.error('Invalid input: %s', error)
+        exit_code, message = ExitCode.invalid_input, str(error)
+
+    except Exception as error:
+        logging.exception('Operation `%s` failed.', cl_args.command)
+        exit_code, message = ExitCode.operation_failed, str(error)
+
+    _write_json({'command': cl_args.command,
+                 'status': exit_code.name,
+                 'error': message},
+                stream=sys.stderr)
+
+    return exit_code
+
+
+def _batch_train(Session, cl_args):
+    """
+    Construct a valuation model. Publish it to the model registry and make it
+    the active version, or save it to the configured paths if no registry is
+    configured.
+    """
+
+    from lib.ml import construct_model, save_model, export_scoring_artifact
+
+    configuration = get_config()
+    watermark = db.get_watermark(Session())
+    start_time = time.perf_counter()
+    valuation_model = construct_model(Session, resume=cl_args.resume)
+    training_seconds = time.perf_counter() - start_time
+    if configuration.registry_path is None:
+        save_model(valuation_model, configuration.model_path)
+        export_scoring_artifact(valuation_model, configuration.scoring_artifact_path)
+        _write_json({'command': 'train',
+                     'model_path': str(configuration.model_path),
+                     'scoring_artifact_path': str(configuration.scoring_artifact_path)})
+
+        return
+
+    def write_files(directory):
+        save_model(valuation_model, str(directory / MODEL_FILE))
+        export_scoring_artifact(valuation_model, directory / SCORING_FILE)
+
+    metadata = {'created': datetime.utcnow().isoformat(),
+                'watermark': watermark,
+                'features': list(valuation_model.features),
+                'hyperparameters': valuation_model.classifier.get_params(),
+                'metrics': _training_metrics(Session, valuation_model),
+                'training_seconds': training_seconds,
+                'peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+    registry = ModelRegistry(configuration.registry_path)
+    version = registry.publish(write_files, metadata)
+    registry.activate(version)
+    _write_json({'command': 'train', 'version': version, 'registry_path': str(registry.root)})
+
+
+def _batch_score(Session, cl_args):
+    """
+    Score companies by their latest finances and write one JSON line each,
+    with the valuation and the mean and standard deviation of the model's
+    scores. The valuations are also stored in the screening index.
+    """
+
+    session = Session()
+    company_ids = cl_args.company_ids or None
+    # The screening index is rewritten from the snapshots, so read them from the primary.
+    with session.using_primary():
+        snapshots = [snapshot for snapshot in db.get_company_snapshots(session, company_ids)
+                     if snapshot.finance_year is not None]
+
+    if not snapshots:
+        logging.warning('No companies with finances on record to score.')
+
+    model_paths = _model_paths()
+    predictions = _predict_snapshots(session, snapshots, model_paths) if snapshots else []
+    valuations = [valuation for valuation, score, deviation in predictions]
+    db.refresh_screening_index(session, snapshots, valuations, model_paths[0], replace_all=company_ids is None)
+    session.commit()
+    unscreenable = sum(snapshot.intrinsic_value is None or not snapshot.price for snapshot in snapshots)
+    if unscreenable:
+        logging.warning('%d of %d scored companies have no intrinsic value to price ratio and are left out of screens.',
+                        unscreenable, len(snapshots))
+
+    for snapshot, (valuation, score, deviation) in zip(snapshots, predictions):
+        _write_json({'company_id': snapshot.company_id,
+                     'year': snapshot.finance_year.year,
+                     'price': snapshot.price,
+                     'valuation': valuation,
+                     'score': score,
+                     'deviation': deviation})
+
+
+def _batch_ingest(Session, cl_args):
+    """
+    Bulk load a CSV file into a table in a single transaction, or, if a
+    concurrency above 1 is given for stocks or finances, in concurrent
+    transactions over the asyncio database driver. Each chunk of validated
+    records is inserted as soon as it is read, so memory use does not grow
+    with the size of the file. Records that fail validation are written to a
+    rejects file instead of being loaded.
+    """
+
+    table = db.TABLES[cl_args.table]
+    rejects_path = cl_args.rejects_path or cl_args.path + '.rejects.csv'
+    with open(cl_args.path, newline='') as csv_file:
+        header, chunks = validate_csv(table, csv_file)
+        with RejectsFile(rejects_path, header) as rejects_file:
+            if cl_args.concurrency > 1 and table in (db.Stock, db.Finances):
+                rows = asyncio.run(_ingest_concurrently(table, chunks, rejects_file, cl_args.concurrency))
+
+            else:
+                session = Session()
+                try:
+                    rows = 0
+                    for valid, rejected in chunks:
+                        rejects_file.write(rejected)
+                        rows += db.bulk_insert(session, table, valid)
+
+                    session.commit()
+
+                except Exception:
+                    session.rollback()
+                    raise
+
+    result = {'command': 'ingest', 'table': cl_args.table, 'rows': rows, 'rejected': rejects_file.count}
+    if rejects_file.count:
+        result['rejects_path'] = rejects_path
+
+    _write_json(result)
+
+
+async def _ingest_concurrently(table, chunks, rejects_file, concurrency):
+    """
+    Insert chunks of validated records in up to ``concurrency`` concurrent
+    transactions per chunk, split by company, writing their rejects to
+    ``rejects_file``. Return the number of rows inserted.
+    """
+
+    from lib import aiodb
+
+    rows = 0
+    async with aiodb.connect_database_async() as AsyncSession:
+        for valid, rejected in chunks:
+            rejects_file.write(rejected)
+            batches = _company_batches(valid, concurrency)
+            rows += await aiodb.bulk_insert_concurrently(AsyncSession, table, batches, concurrency)
+
+    return rows
+
+
+def _batch_evaluate(Session, cl_args):
+    """ Evaluate the saved valuation model on the held-out companies and write its metrics. """
+
+    from lib.ml import load_model, extract_training_data, evaluate_model
+
+    valuation_model = load_model(_model_paths()[1])
+    testing_data = extract_training_data(Session, split='test')
+    results = evaluate_model(valuation_model, testing_data)
+    _write_json({'command': 'evaluate', 'metrics': results})
+
+
+def _batch_snapshot(Session, cl_args):
+    """ Rebuild the company snapshot table from the full history. """
+
+    session = Session()
+    db.refresh_company_snapshot(session)
+    session.commit()
+    _write_json({'command': 'snapshot', 'companies': len(db.get_company_snapshots(session))})
+
+
+def _batch_backtest(Session, cl_args):
+    """
+    Backtest the saved model and write one JSON line per period and a summary.
+    The training watermark of a registry version is checked against the start
+    date; models outside of a registry have no recorded watermark.
+    """
+
+    from lib import backtest
+
+    model_paths = _model_paths()
+    version = model_paths[0]
+    watermark = None
+    if version is not None:
+        watermark = ModelRegistry(get_config().registry_path).metadata(version).get('watermark')
+
+    backtest.check_training_watermark(watermark, cl_args.start, cl_args.allow_lookahead)
+    valuation_model = _load_scorer(model_paths)
+    history = backtest.load_history(Session)
+    as_of_dates = backtest.monthly_dates(cl_args.start, cl_args.end, cl_args.months)
+    results = backtest.run_backtest(history, valuation_model, as_of_dates, cl_args.top)
+    for period in results['periods']:
+        _write_json(period)
+
+    _write_json({'command': 'backtest', 'summary': results['summary']})
+
+
+def _batch_screen(Session, cl_args):
+    """ Screen companies by the screening index and write one JSON line each. """
+
+    session = Session()
+    industry_ids = None
+    if cl_args.industries:
+        known = {industry.name: industry.id for industry in session.query(db.Industry)}
+        unknown = [name for name in cl_args.industries if name not in known]
+        if unknown:
+            raise ValueError('Unknown industries: {}.'.format(', '.join(unknown)))
+
+        industry_ids = [known[name] for name in cl_args.industries]
+
+    entries = db.screen_companies(session,
+                                  top_per_industry=cl_args.top_per_industry,
+                                  min_ratio=cl_args.min_ratio,
+                                  undervalued_only=cl_args.undervalued_only,
+                                  industry_ids=industry_ids)
+
+    if not entries and session.query(db.ScreeningEntry.company_id).first() is None:
+        logging.warning('The screening index is empty; run `score` to fill it.')
+
+    unscreenable = db.count_unscreenable(session, industry_ids)
+    if unscreenable:
+        logging.warning('%d companies are left out of the screen for lack of an intrinsic value.', unscreenable)
+
+    for entry in entries:
+        _write_json({'company_id': entry.company_id,
+                     'industry': entry.industry.name,
+                     'value_ratio': entry.value_ratio,
+                     'price': entry.price,
+                     'intrinsic_value': entry.intrinsic_value,
+                     'valuation': entry.valuation})
+
+
+def _batch_models(Session, cl_args):
+    """ List, activate or roll back model versions in the registry. """
+
+    configuration = get_config()
+    if configuration.registry_path is None:
+        raise ValueError('No model registry is configured.')
+
+    registry = ModelRegistry(configuration.registry_path)
+    if cl_args.action == 'activate':
+        _write_json({'command': 'models', 'current': registry.activate(cl_args.version)})
+
+    elif cl_args.action == 'rollback':
+        _write_json({'command': 'models', 'current': registry.rollback()})
+
+    else:
+        current = registry.current
+        for metadata in registry.versions():
+            _write_json(dict(metadata, current=metadata['version'] == current))
+
+
+def _training_metrics(Session, valuation_model):
+    """
+    Evaluate a newly trained model on the held-out companies. Return None,
+    with a warning, if no companies are held out or none of them have labeled
+    finances, so that the model is still registered.
+    """
+
+    from lib.ml import extract_training_data, evaluate_model
+
+    if get_config().label_holdout_fraction == 0:
+        logging.warning('No companies are held out of training, so the model is registered without metrics.')
+        return None
+
+    samples = 0
+
+    def testing_data():
+        nonlocal samples
+        for chunk in extract_training_data(Session, split='test'):
+            samples += len(chunk[2])
+            yield chunk
+
+    try:
+        return evaluate_model(valuation_model, testing_data())
+
+    except ValueError:
+        if samples:
+            raise
+
+    logging.warning('No held-out company has labeled finances, so the model is registered without metrics.')
+    return None
+
+
+def _model_paths():
+    """
+    Return the version and the paths of the valuation model and scoring
+    artifact to use: those of the active registry version if there is one,
+    otherwise the configured paths with a version of None.
+    """
+
+    configuration = get_config()
+    if configuration.registry_path is not None:
+        registry = ModelRegistry(configuration.registry_path)
+        version = registry.current
+        if version is not None:
+            return version, registry.path(version, MODEL_FILE), registry.path(version, SCORING_FILE)
+
+    return None, configuration.model_path, configuration.scoring_artifact_path
+
+
+def _load_scorer(model_paths=None):
+    """
+    Load the active scoring artifact, which does not need scikit-learn. Fall
+    back to the full valuation model if no artifact has been exported.
+
+    Args
+      model_paths: A tuple returned by ``_model_paths``. Looked up if None.
+
+    Raises
+      ValueError if the artifact's features differ from ``FINANCE_FEATURES``.
+
+    """
+
+    version, model_path, artifact_path = model_paths or _model_paths()
+    try:
+        scorer = LinearScorer.load(artifact_path)
+
+    except FileNotFoundError:
+        from lib.ml import load_model
+        return load_model(model_path)
+
+    if scorer.features != FINANCE_FEATURES:
+        msg = 'Scoring artifact "{}" was built for different features.'
+        raise ValueError(msg.format(artifact_path))
+
+    return scorer
+
+
+def _predict_snapshots(session, snapshots, model_paths=None):
+    """
+    Predict the valuation of the company of every ``CompanySnapshot``, with
+    the mean and standard deviation of the model's scores, which bound the
+    confidence of ensemble valuations. Valuations by a registry version are
+    looked up in the valuation cache first, and the model is only loaded if
+    some company is not cached. Models outside the registry may be
+    overwritten in place, so their valuations are never cached.
+
+    Args
+      session: The Session object the snapshots were read with.
+      snapshots: A list of ``CompanySnapshot`` records.
+      model_paths: A tuple returned by ``_model_paths``. Looked up if None.
+
+    Returns
+      A list of (valuation, score, deviation) tuples in the order of
+      ``snapshots``.
+
+    """
+
+    configuration = get_config()
+    model_paths = model_paths or _model_paths()
+    version = model_paths[0]
+    watermarks = {snapshot.company_id: snapshot_watermark(snapshot) for snapshot in snapshots}
+    cache = None
+    valuations = {}
+    if version is not None and configuration.valuation_cache_path is not None:
+        cache = ValuationCache(configuration.valuation_cache_path,
+                               configuration.valuation_cache_max_entries)
+
+        valuations = cache.get_many(version, watermarks)
+
+    missing = [snapshot for snapshot in snapshots if snapshot.company_id not in valuations]
+    if missing:
+        valuation_model = _load_scorer(model_paths)
+        industries = db.get_company_industries(session, [snapshot.company_id for snapshot in missing])
+        industry_ids = [industries.get(snapshot.company_id, -1) for snapshot in missing]
+        features = finance_matrix(missing)
+        with metrics.span('model_predict'):
+            predicted = valuation_model.predict(features, industry_ids)
+            scores, deviations = valuation_model.decision_bands(features, industry_ids)
+
+        predicted = {snapshot.company_id: (valuation.item(), score.item(), deviation.item())
+                     for snapshot, valuation, score, deviation in zip(missing, predicted, scores, deviations)}
+        valuations.update(predicted)
+        if cache is not None:
+            cache.put_many(version, watermarks, predicted)
+
+    if cache is not None:
+        cache.close()
+
+    return [valuations[snapshot.company_id] for snapshot in snapshots]
+
+
+def _company_batches(rows, count, batch_size=10000):
+    """
+    Split rows into batches of about ``batch_size`` rows, and at least
+    ``count`` batches when there are enough companies, without splitting any
+    company's rows between batches.
+    """
+
+    by_company = defaultdict(list)
+    for row in rows:
+        by_company[row['company_id']].append(row)
+
+    batch_size = max(1, min(batch_size, len(rows) // count))
+    batches = [[]]
+    for company_id in sorted(by_company):
+        if len(batches[-1]) >= batch_size:
+            batches.append([])
+
+        batches[-1].extend(by_company[company_id])
+
+    return [batch for batch in batches if batch]
+
+
+def _parse_date(value):
+    """ Parse a YYYY-MM-DD string, for use as an ``argparse`` type. """
+
+    try:
+        return date(*(int(x) for x in value.split('-')))
+
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError('Invalid date `{}`; expected YYYY-MM-DD.'.format(value))
+
+
+def _write_json(document, stream=None):
+    """ Write ``document`` to ``stream`` (stdout by default) as one line of JSON. """
+
+    stream = stream or sys.stdout
+    stream.write(json.dumps(document, sort_keys=True) + '\n')
+    stream.flush()
+
+
 def _show_welcome():
     """ Display Infinium welcome message. """
 
@@ -223,7 +811,8 @@ def _add_database_entry(Session):
             industry_table = db.Industry(name=industry_name)
             session.add(industry_table)
             session.commit()
-            industry_id = db.get_industry_id(session, industry_name)
+            with session.using_primary():
+                industry_id = db.get_industry_id(session, industry_name)
 
         company = db.Company(id=company_id,
                              industry_id=industry_id,
@@ -259,9 +848,41 @@ def _add_database_entry(Session):
     if year and not db.get_finance_record(session, company_id, year):
         _prompt_financials(session, company_id, year)
 
+    session.flush()
+    db.refresh_company_snapshot(session, [company_id])
     session.commit()
 
 
+def _analyze_stock(Session):
+    """
+    Event handler for `Analyze stock`.
+
+    Args:
+      Session: A SQLAlchemy ``Session`` class.
+
+    Returns:
+      None
+
+    """
+
+    session = Session()
+    company_id = _prompt_until_valid('\nEnter company ID: ')
+    snapshots = db.get_company_snapshots(session, [company_id])
+    if not snapshots or snapshots[0].finance_year is None:
+        print('\nNo finances on record for company `{}`.\n'.format(company_id))
+        return
+
+    snapshot = snapshots[0]
+    valuation, score, deviation = _predict_snapshots(session, snapshots)[0]
+    print('\nCompany: {}'.format(company_id))
+    print('Finances year: {}'.format(snapshot.finance_year.year))
+    if snapshot.price is not None:
+        print('Latest price: {} on {}'.format(snapshot.price, snapshot.stock_date))
+
+    print('Valuation: {}'.format(valuation))
+    print('Score: {:.3f} +/- {:.3f}\n'.format(score, deviation))
+
+
 def _prompt_financials(session, company_id, year):
         shareholders_equity = _prompt_until_valid("Enter shareholder's equity: ",
                                                   type_=float,
@@ -273,7 +894,7 @@ def _prompt_financials(session, company_id, year):
 
         npm = _prompt_until_valid('Enter net profit margin: ',
                                   type_=float,
-                                  pattern=DOLLARS)
+                                  pattern=NUMBER)
 
         net_sales = _prompt_until_valid('Enter net sales: ',
                                         type_=float,
@@ -281,12 +902,12 @@ def _prompt_financials(session, company_id, year):
 
         net_income = _prompt_until_valid('Enter net income: ',
                                          type_=float,
-                                         pattern=DOLLARS)
+                                         pattern=NUMBER)
 
         roe = net_income / shareholders_equity
         epsg = _prompt_until_valid('Enter earnings per share growth: ',
                                    type_=float,
-                                   pattern=DOLLARS)
+                                   pattern=NUMBER)
 
         tca = _prompt_until_valid('Enter total current assets: ',
                                   type_=float,
@@ -298,11 +919,11 @@ def _prompt_financials(session, company_id, year):
 
         fcf = _prompt_until_valid('Enter free cash flow: ',
                                   type_=float,
-                                  pattern=DOLLARS)
+                                  pattern=NUMBER)
 
         operating_margin = _prompt_until_valid('Enter operating margin: ',
                                                type_=float,
-                                               pattern=DOLLARS)
+                                               pattern=NUMBER)
 
         finances = db.Finances(company_id=company_id,
                                year=date(year, 1, 1),
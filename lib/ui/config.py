@@ -34,6 +34,7 @@ along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
 # Python standard library imports.
 import threading
 from pathlib import Path
+from contextlib import contextmanager
 from os import getenv
 
 # Third-party library imports.
@@ -166,6 +167,30 @@ def get_config():
             finally:
                 thread_lock.release()
 
+        @contextmanager
+        def override(self, section, **fields):
+            """
+            Replace fields of a configuration file section within a ``with``
+            block. The configuration file is not written, so the fields are
+            restored when the block exits.
+
+            Args
+              section: Name of the configuration file section.
+              fields: New values of the section's fields, by field name.
+
+            """
+
+            with thread_lock:
+                old_fields = dict(self.__configuration[section])
+                self.__configuration[section].update(fields)
+
+            try:
+                yield self
+
+            finally:
+                with thread_lock:
+                    self.__configuration[section] = old_fields
+
         def __handle_key_error(self, section, field_name):
             msg = 'Config file section "{}" field "{}" missing from config file "{}".'
             msg = msg.format(section, field_name, self.config_path)
@@ -185,6 +210,30 @@ def get_config():
         def model_path(self, value):
             self.__update_field('general', 'model_path', value)
 
+        @property
+        def scoring_artifact_path(self):
+            return self.__get_field('general', 'scoring_artifact_path')
+
+        @scoring_artifact_path.setter
+        def scoring_artifact_path(self, value):
+            self.__update_field('general', 'scoring_artifact_path', value)
+
+        @property
+        def memory_budget(self):
+            return self.__get_field('general', 'memory_budget')
+
+        @property
+        def checkpoint_path(self):
+            return self.__get_field('general', 'checkpoint_path') or None
+
+        @property
+        def checkpoint_seconds(self):
+            return float(self.__get_field('general', 'checkpoint_seconds'))
+
+        @property
+        def registry_path(self):
+            return self.__get_field('general', 'registry_path') or None
+
         @property
         def log_path(self):
             return self.__get_field('general', 'log_path')
@@ -193,6 +242,26 @@ def get_config():
         def log_path(self, value):
             self.__update_field('general', 'log_path', value)
 
+        @property
+        def log_format(self):
+            return self.__get_field('general', 'log_format')
+
+        @property
+        def log_max_bytes(self):
+            return int(self.__get_field('general', 'log_max_bytes'))
+
+        @property
+        def log_rotate_when(self):
+            return self.__get_field('general', 'log_rotate_when')
+
+        @property
+        def log_backup_count(self):
+            return int(self.__get_field('general', 'log_backup_count'))
+
+        @property
+        def log_debug_sample_rate(self):
+            return float(self.__get_field('general', 'log_debug_sample_rate'))
+
         @property
         def verbose(self):
             return bool(self.__get_field('general', 'verbose'))
@@ -251,6 +320,42 @@ def get_config():
         def sgd_power_t(self):
             return float(self.__get_field('sgd_classifier', 'power_t'))
 
+        @property
+        def sgd_ensemble_size(self):
+            return int(self.__get_field('sgd_classifier', 'ensemble_size'))
+
+
+        ## labels section ##
+        @property
+        def label_horizons(self):
+            return [int(horizon) for horizon in self.__get_field('labels', 'horizons')]
+
+        @property
+        def label_training_horizon(self):
+            return int(self.__get_field('labels', 'training_horizon'))
+
+        @property
+        def label_threshold(self):
+            return float(self.__get_field('labels', 'threshold'))
+
+        @property
+        def label_cache_path(self):
+            return self.__get_field('labels', 'cache_path')
+
+        @property
+        def label_holdout_fraction(self):
+            return float(self.__get_field('labels', 'holdout_fraction'))
+
+
+        ## valuation_cache section ##
+        @property
+        def valuation_cache_path(self):
+            return self.__get_field('valuation_cache', 'path') or None
+
+        @property
+        def valuation_cache_max_entries(self):
+            return int(self.__get_field('valuation_cache', 'max_entries'))
+
 
         ## database section ##
         @property
@@ -285,6 +390,22 @@ def get_config():
         def db_echo(self):
             return bool(self.__get_field('database', 'echo'))
 
+        @property
+        def db_query_stats(self):
+            return bool(self.__get_field('database', 'query_stats'))
+
+        @property
+        def db_slow_query_ms(self):
+            return float(self.__get_field('database', 'slow_query_ms'))
+
+        @property
+        def db_replica_url(self):
+            return self.__get_field('database', 'replica_url') or None
+
+        @property
+        def db_partition_stocks(self):
+            return bool(self.__get_field('database', 'partition_stocks'))
+
     return Configuration()
 
 
@@ -0,0 +1,361 @@
+"""
+Validation of bulk loaded records. The rules are those enforced on typed
+input: each value must match the pattern of its column, convert to the
+column's type and fall within the column's bounds. Values are matched against
+patterns one at a time, while conversions and bounds are applied to whole
+columns of a batch at once. Rows that break any rule are split off as
+rejects, with the reasons, instead of failing the batch.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import re
+import csv
+from datetime import date
+from itertools import islice
+from collections import namedtuple
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib.data import Developer, DOLLARS, INTEGER, NUMBER, DATE
+
+
+__maintainer__ = Developer.JERRAD_GENSON
+__contact__ = Developer.EMAIL[__maintainer__]
+
+
+# Module constants.
+# Number of CSV rows validated at once.
+CHUNK_SIZE = 100000
+
+# Rule applied to a column's values. ``bounds`` is a half-open interval of
+# allowed values, as in ``_prompt_until_valid``, or None.
+Rule = namedtuple('Rule', 'pattern type_ nullable bounds')
+
+# Patterns of columns without an explicit rule, by Python type.
+_TYPE_PATTERNS = {str: '.+',
+                  int: INTEGER,
+                  float: NUMBER,
+                  date: DATE}
+
+# Rules of the columns typed in as amounts. Amounts that cannot be negative
+# are dollar amounts. Amounts that can, such as losses, and ratios are signed
+# numbers of any precision.
+RULES = {'stocks': {'price': Rule(DOLLARS, float, False, None),
+                    'intrinsic_value': Rule(DOLLARS, float, True, None)},
+         'finances': dict({name: Rule(DOLLARS, float, False, None)
+                           for name in ('net_sales',
+                                        'total_current_assets',
+                                        'total_current_liabilities')},
+                          **{name: Rule(NUMBER, float, False, None)
+                             for name in ('net_profit_margin',
+                                          'net_income',
+                                          'earnings_per_share_growth',
+                                          'free_cash_flow',
+                                          'operating_margin')})}
+
+# Compiled patterns, by pattern.
+_MATCHERS = {}
+
+
+def column_rules(table):
+    """
+    Return the rules of the columns of ``table``: the explicit rules in
+    ``RULES``, or otherwise the pattern of the column's type. Columns the
+    database fills in, such as autoincrement keys, may be empty.
+
+    Returns
+      A dict mapping column names to ``Rule`` tuples.
+
+    """
+
+    explicit = RULES.get(table.__tablename__, {})
+    rules = {}
+    for column in table.__table__.columns:
+        if column.name in explicit:
+            rules[column.name] = explicit[column.name]
+            continue
+
+        type_ = column.type.python_type
+        nullable = column.nullable or column.autoincrement is True
+        rules[column.name] = Rule(_TYPE_PATTERNS.get(type_, '.+'), type_, nullable, None)
+
+    return rules
+
+
+def validate_csv(table, csv_file, chunk_size=CHUNK_SIZE):
+    """
+    Validate the records of a CSV file for ``table`` in chunks.
+
+    Args
+      table: The mapped class the records are for, e.g. ``lib.db.Stock``.
+      csv_file: An open CSV file with a header row naming the table columns.
+      chunk_size: Number of rows validated at once.
+
+    Returns
+      A tuple of (header, chunks). ``header`` is the list of column names.
+      ``chunks`` is a generator of (rows, rejects) tuples, one per chunk.
+      ``rows`` is a list of dicts of converted values, ready for
+      ``lib.db.bulk_insert``. ``rejects`` is a list of (line number, fields,
+      reason) tuples.
+
+    Raises
+      ValueError if the header names a column ``table`` does not have, or
+      lacks a column that may not be empty.
+
+    """
+
+    reader = csv.reader(csv_file)
+    header = [name.strip() for name in next(reader, [])]
+    rules = column_rules(table)
+    unknown = [name for name in header if name not in rules]
+    if unknown:
+        msg = 'Table `{}` has no columns {}.'
+        raise ValueError(msg.format(table.__tablename__, ', '.join(unknown)))
+
+    missing = [name for name, rule in rules.items() if not rule.nullable and name not in header]
+    if missing:
+        msg = 'Records for table `{}` need columns {}.'
+        raise ValueError(msg.format(table.__tablename__, ', '.join(missing)))
+
+    return header, _validate_chunks(reader, header, [rules[name] for name in header], chunk_size)
+
+
+def validate_batch(header, rules, records, first_line=1):
+    """
+    Validate a batch of records column by column.
+
+    Args
+      header: Names of the columns of the records.
+      rules: A ``Rule`` for every column of ``header``.
+      records: A list of lists of string values.
+      first_line: Line number of the first record, used in rejects.
+
+    Returns
+      A tuple of (rows, rejects), as described in ``validate_csv``.
+
+    """
+
+    lines = np.arange(first_line, first_line + len(records))
+    reasons = [[] for record in records]
+    complete = np.array([len(record) == len(header) for record in records], dtype=bool)
+    for index in np.flatnonzero(~complete):
+        reasons[index].append('expected {} fields, found {}'.format(len(header), len(records[index])))
+
+    table = np.array([record for record, ok in zip(records, complete) if ok], dtype=str)
+    table = table.reshape(-1, len(header))
+    rejected = np.zeros(len(table), dtype=bool)
+    columns = []
+    # Maps rows of ``table`` back to their records.
+    positions = np.flatnonzero(complete)
+    for position, (name, rule) in enumerate(zip(header, rules)):
+        values, errors = _check_column(table[:, position], rule)
+        for reason, mask in errors:
+            for index in positions[mask]:
+                reasons[index].append('{}: {}'.format(name, reason))
+
+            rejected |= mask
+
+        columns.append(values)
+
+    accepted = np.flatnonzero(~rejected)
+    columns = [values[accepted].tolist() for values in columns]
+    rows = [dict(zip(header, values)) for values in zip(*columns)]
+
+    rejects = [(lines[index].item(), records[index], '; '.join(reasons[index]))
+               for index in range(len(records)) if reasons[index]]
+
+    return rows, rejects
+
+
+def write_rejects(path, header, rejects):
+    """
+    Write rejected records to a CSV file, with the line number and reason
+    for the rejection ahead of the record's fields.
+    """
+
+    with RejectsFile(path, header) as rejects_file:
+        rejects_file.write(rejects)
+
+
+class RejectsFile:
+    """
+    A CSV file of rejected records, as written by ``write_rejects``, that is
+    appended to one chunk of rejects at a time. The file is only created
+    when the first rejects are written.
+
+    Args
+      path: Path of the CSV file.
+      header: Names of the columns of the records.
+
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.count = 0
+        self.__file = None
+        self.__writer = None
+
+    def write(self, rejects):
+        """ Append (line number, fields, reason) tuples to the file. """
+
+        if not rejects:
+            return
+
+        if self.__file is None:
+            self.__file = open(self.path, 'w', newline='')
+            self.__writer = csv.writer(self.__file)
+            self.__writer.writerow(['line', 'reason'] + self.header)
+
+        for line, fields, reason in rejects:
+            self.__writer.writerow([line, reason] + fields)
+
+        self.count += len(rejects)
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _validate_chunks(reader, header, rules, chunk_size):
+    """ Validate the records of a CSV reader in chunks of ``chunk_size`` records. """
+
+    # Line 1 is the header.
+    line = 2
+    while True:
+        chunk = list(islice(reader, chunk_size))
+        if not chunk:
+            return
+
+        yield validate_batch(header, rules, chunk, line)
+        line += len(chunk)
+
+
+def _check_column(values, rule):
+    """
+    Apply ``rule`` to an array of strings.
+
+    Returns
+      A tuple of (values, errors). ``values`` is an object array of the
+      converted values, with None for empty values, and is only meaningful
+      where no error applies. ``errors`` is a list of (reason, mask) tuples.
+
+    """
+
+    values = np.char.strip(values)
+    empty = values == ''
+    errors = []
+    if not rule.nullable:
+        errors.append(('missing value', empty))
+
+    matched = _matcher(rule.pattern)(values).astype(bool) | empty
+    errors.append(('does not match `{}`'.format(rule.pattern), ~matched))
+    valid = matched & ~empty
+    if rule.type_ is date:
+        converted, invalid = _to_dates(values, valid)
+
+    elif rule.type_ in (int, float):
+        converted, invalid = _to_numbers(values, valid, rule.type_)
+
+    else:
+        converted, invalid = values, np.zeros(len(values), dtype=bool)
+
+    errors.append(('not a valid {}'.format(rule.type_.__name__), invalid))
+    if rule.bounds:
+        valid &= ~invalid
+        outside = valid & ((converted < rule.bounds[0]) | (converted >= rule.bounds[1]))
+        errors.append(('outside [{}, {})'.format(*rule.bounds), outside))
+
+    converted = converted.astype(object)
+    converted[empty] = None
+
+    return converted, [(reason, mask) for reason, mask in errors if mask.any()]
+
+
+def _to_numbers(values, valid, type_):
+    """
+    Convert the valid entries of an array of strings to numbers. Entries that
+    match a pattern but still fail to convert, such as a lone ``.``, are
+    found one at a time, and only when the array does not convert at once.
+
+    Returns
+      A tuple of (numbers, invalid).
+
+    """
+
+    invalid = np.zeros(len(values), dtype=bool)
+    try:
+        return np.where(valid, values, '0').astype(type_), invalid
+
+    except ValueError:
+        for index in np.flatnonzero(valid):
+            try:
+                type_(values[index])
+
+            except ValueError:
+                invalid[index] = True
+
+        return np.where(valid & ~invalid, values, '0').astype(type_), invalid
+
+
+def _to_dates(values, valid):
+    """
+    Convert the valid entries of an array of ``YYYY-MM-DD`` strings, whose
+    month and day may have one digit, to ``datetime64`` dates.
+
+    Returns
+      A tuple of (dates, invalid).
+
+    """
+
+    values = np.where(valid, values, '1970-1-1')
+    year, _, rest = np.rollaxis(np.char.partition(values, '-'), 1)
+    month, _, day = np.rollaxis(np.char.partition(rest, '-'), 1)
+    year, month, day = year.astype(int), month.astype(int), day.astype(int)
+    invalid = valid & ((month < 1) | (month > 12) | (day < 1))
+    month = np.where(invalid, 1, month)
+    start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days_in_month = ((start + 1).astype('datetime64[D]') - start.astype('datetime64[D]')).astype(int)
+    invalid |= valid & (day > days_in_month)
+    dates = start.astype('datetime64[D]') + np.where(invalid, 1, day) - 1
+
+    return dates, invalid
+
+
+def _matcher(pattern):
+    """
+    Return a NumPy ufunc that tests the strings of an array against a regular
+    expression. The ufunc calls the compiled expression once per string.
+    """
+
+    if pattern not in _MATCHERS:
+        search = re.compile(pattern).search
+        _MATCHERS[pattern] = np.frompyfunc(lambda value: search(value) is not None, 1, 1)
+
+    return _MATCHERS[pattern]
@@ -0,0 +1,81 @@
+"""
+Shared fixtures of the Infinium test suite. Run the suite from the
+repository root, so that the default ``.infinium.yml`` is used.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import os
+from datetime import date
+from pathlib import Path
+
+# Third-party library imports.
+import pytest
+
+# The configuration is read when ``lib.ui.config`` is first imported.
+os.environ.setdefault('INFINIUM_CONFIG', str(Path(__file__).resolve().parents[1]))
+
+# Infinium library imports.
+from lib import db
+from lib.features import FINANCE_FEATURES
+from lib.ui.config import get_config
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """
+    Override configuration fields for one test, e.g.
+    ``configure(label_holdout_fraction=0.5)``.
+    """
+
+    def configure(**fields):
+        for name, value in fields.items():
+            monkeypatch.setattr(type(get_config()), name, property(lambda self, value=value: value))
+
+    return configure
+
+
+@pytest.fixture
+def Session(tmp_path):
+    """ A ``Session`` class connected to a new SQLite database. """
+
+    return db.connect_database('sqlite:///{}'.format(tmp_path / 'infinium.sqlite'))
+
+
+def add_companies(session, count, industry='Technology'):
+    """ Add ``count`` companies, named 'C000', 'C001', ..., in one industry. """
+
+    industry = db.Industry(name=industry)
+    session.add(industry)
+    session.flush()
+    company_ids = ['C{:03}'.format(number) for number in range(count)]
+    session.add_all(db.Company(id=company_id, industry_id=industry.id, name=company_id)
+                    for company_id in company_ids)
+
+    session.flush()
+    return company_ids
+
+
+def finances_row(company_id, year, **values):
+    """ Return a Finances row dict with every feature set to 1.0 unless given. """
+
+    row = dict({feature: 1.0 for feature in FINANCE_FEATURES}, company_id=company_id, year=date(year, 1, 1))
+    row.update(values)
+    return row
@@ -0,0 +1,100 @@
+"""
+Tests of asynchronous database access.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import asyncio
+from datetime import date
+
+# Third-party library imports.
+import pytest
+
+# Infinium library imports.
+from lib import aiodb, db
+from conftest import add_companies, finances_row
+
+
+pytest.importorskip('aiosqlite')
+
+
+def test_concurrent_sqlite_inserts_are_serialized(tmp_path, monkeypatch):
+    url = 'sqlite:///{}'.format(tmp_path / 'infinium.sqlite')
+    session = db.connect_database(url)()
+    company_ids = add_companies(session, 4)
+    session.commit()
+
+    in_flight = []
+    peak = []
+    bulk_insert = aiodb.bulk_insert
+
+    async def tracked_bulk_insert(session, table, rows):
+        in_flight.append(rows)
+        peak.append(len(in_flight))
+        try:
+            await asyncio.sleep(0.01)
+            return await bulk_insert(session, table, rows)
+
+        finally:
+            in_flight.remove(rows)
+
+    monkeypatch.setattr(aiodb, 'bulk_insert', tracked_bulk_insert)
+
+    async def ingest():
+        async with aiodb.connect_database_async(url) as Session:
+            batches = [[finances_row(company_id, 2010)] for company_id in company_ids]
+            count = await aiodb.bulk_insert_concurrently(Session, db.Finances, batches, 4)
+
+        return count, Session.kw['primary']
+
+    count, engine = asyncio.run(ingest())
+    assert count == 4
+    assert max(peak) == 1
+    assert engine.pool.checkedout() == 0
+    session = db.connect_database(url)()
+    assert [snapshot.finance_year for snapshot in db.get_company_snapshots(session)] == [date(2010, 1, 1)] * 4
+
+
+def test_stock_partitions_are_created_before_concurrent_batches(tmp_path, monkeypatch, configure):
+    configure(db_partition_stocks=True)
+    path = str(tmp_path / 'partitioned.sqlite')
+    url = 'sqlite:///{}'.format(path)
+    session = db.connect_database(url)()
+    company_ids = add_companies(session, 3)
+    session.commit()
+
+    known_years = []
+    bulk_insert = aiodb.bulk_insert
+
+    async def tracked_bulk_insert(session, table, rows):
+        known_years.append({year for known_url, year in db._known_partitions if known_url.endswith(path)})
+        return await bulk_insert(session, table, rows)
+
+    monkeypatch.setattr(aiodb, 'bulk_insert', tracked_bulk_insert)
+
+    async def ingest():
+        async with aiodb.connect_database_async(url) as Session:
+            batches = [[{'company_id': company_id, 'date': date(2010 + number, 6, 1), 'price': 1.0,
+                         'intrinsic_value': None}] for number, company_id in enumerate(company_ids)]
+
+            return await aiodb.bulk_insert_concurrently(Session, db.Stock, iter(batches), 3)
+
+    assert asyncio.run(ingest()) == 3
+    assert known_years == [{2010, 2011, 2012}] * 3
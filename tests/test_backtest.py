@@ -0,0 +1,90 @@
+"""
+Tests of the backtest's handling of point-in-time data.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+from datetime import date
+
+# Third-party library imports.
+import numpy as np
+import pytest
+
+# Infinium library imports.
+from lib.backtest import check_training_watermark, run_backtest
+from lib.labels import Timeline, date_days
+
+
+class AlwaysBuy:
+    def decision_function(self, features, industries):
+        return np.ones(len(features))
+
+
+def history(price_rows, finance_rows):
+    prices = Timeline.from_prices(price_rows)
+    company_ids, available = zip(*finance_rows)
+    finances = Timeline(company_ids, date_days(available), np.arange(len(finance_rows)),
+                        companies=prices.companies)
+    features = np.zeros((len(finance_rows), 1))
+
+    return prices, finances, features, np.full(len(prices.companies), -1)
+
+
+def test_trades_strictly_after_as_of_dates():
+    price_rows = [('A', date(2014, 1, 1), 10.0),
+                  ('A', date(2014, 1, 2), 11.0),
+                  ('A', date(2014, 2, 1), 15.0),
+                  ('A', date(2014, 2, 2), 22.0)]
+    result = run_backtest(history(price_rows, [('A', date(2014, 1, 1))]),
+                          AlwaysBuy(), [date(2014, 1, 1), date(2014, 2, 1)], 1)
+
+    assert result['periods'] == [{'date': '2014-01-01', 'holdings': 1,
+                                  'return': 1.0, 'universe_return': 1.0}]
+
+
+def test_ignores_finances_available_after_as_of_date():
+    price_rows = [('A', date(2014, 1, 1), 10.0),
+                  ('A', date(2014, 1, 2), 11.0),
+                  ('A', date(2014, 2, 2), 22.0)]
+    result = run_backtest(history(price_rows, [('A', date(2014, 1, 2))]),
+                          AlwaysBuy(), [date(2014, 1, 1), date(2014, 2, 1)], 1)
+
+    assert result['periods'][0]['holdings'] == 0
+
+
+def test_skips_companies_without_a_trade_in_the_period():
+    price_rows = [('A', date(2014, 1, 1), 10.0),
+                  ('A', date(2014, 2, 15), 10.0),
+                  ('A', date(2014, 3, 2), 22.0)]
+    result = run_backtest(history(price_rows, [('A', date(2014, 1, 1))]),
+                          AlwaysBuy(), [date(2014, 1, 1), date(2014, 2, 1), date(2014, 3, 1)], 1)
+
+    assert [period['holdings'] for period in result['periods']] == [0, 1]
+
+
+def test_models_trained_after_the_start_are_refused(caplog):
+    watermark = (10, '2014-06-30', 2, '2013-01-01')
+    check_training_watermark(watermark, date(2014, 6, 30))
+    with pytest.raises(ValueError, match='after the backtest start'):
+        check_training_watermark(watermark, date(2014, 1, 1))
+
+    check_training_watermark(watermark, date(2014, 1, 1), allow_lookahead=True)
+    check_training_watermark(None, date(2014, 1, 1))
+    assert ['trained on prices up to 2014-06-30' in record.message for record in caplog.records] == [True, False]
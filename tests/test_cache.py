@@ -0,0 +1,67 @@
+"""
+Tests of the valuation cache.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import sqlite3
+import itertools
+
+# Infinium library imports.
+from lib import cache
+from lib.cache import ValuationCache
+
+
+def test_stale_watermarks_and_other_models_miss(tmp_path):
+    valuations = ValuationCache(tmp_path / 'cache' / 'valuations.sqlite', 10)
+    valuations.put_many('m1', {'A': '2014-01-02/2013', 'B': '2014-01-02/2013'},
+                        {'A': (1, 0.5, 0.1), 'B': (0, -0.5, 0.0)})
+
+    assert valuations.get_many('m1', {'A': '2014-01-02/2013', 'B': '2014-01-03/2013'}) == {'A': (1, 0.5, 0.1)}
+    assert valuations.get_many('m2', {'A': '2014-01-02/2013'}) == {}
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache.time, 'time', lambda: next(clock))
+    valuations = ValuationCache(tmp_path / 'valuations.sqlite', 2)
+    watermarks = {'A': 'w', 'B': 'w', 'C': 'w'}
+    valuations.put_many('m', watermarks, {'A': (1, 1.0, 0.0)})
+    valuations.put_many('m', watermarks, {'B': (1, 1.0, 0.0)})
+    # Using A makes B the least recently used entry.
+    valuations.get_many('m', {'A': 'w'})
+    valuations.put_many('m', watermarks, {'C': (0, -1.0, 0.0)})
+
+    assert valuations.get_many('m', watermarks) == {'A': (1, 1.0, 0.0), 'C': (0, -1.0, 0.0)}
+
+
+def test_discards_caches_of_older_schemas(tmp_path):
+    path = tmp_path / 'valuations.sqlite'
+    connection = sqlite3.connect(str(path))
+    connection.execute('CREATE TABLE valuations (company_id TEXT, watermark TEXT, model TEXT, '
+                       'valuation INTEGER, last_used REAL)')
+    connection.execute("INSERT INTO valuations VALUES ('A', 'w', 'm', 1, 0)")
+    connection.commit()
+    connection.close()
+
+    valuations = ValuationCache(path, 10)
+    assert valuations.get_many('m', {'A': 'w'}) == {}
+    valuations.put_many('m', {'A': 'w'}, {'A': (1, 1.0, 0.0)})
+    assert valuations.get_many('m', {'A': 'w'}) == {'A': (1, 1.0, 0.0)}
@@ -0,0 +1,75 @@
+"""
+Tests of the batch commands of ``lib.ui.cli``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import json
+import argparse
+from functools import partial
+
+# Infinium library imports.
+from lib import db
+from lib.ui import cli
+from conftest import add_companies, finances_row
+
+
+def test_training_metrics_are_empty_without_labeled_held_out_data(Session, configure, tmp_path, caplog):
+    configure(label_holdout_fraction=0.5, label_cache_path=tmp_path / 'labels.npz')
+    session = Session()
+    company_ids = add_companies(session, 4)
+    db.bulk_insert(session, db.Finances, [finances_row(company_id, 2012) for company_id in company_ids])
+    session.commit()
+
+    # Without prices no finances are labeled, so the model is kept unevaluated.
+    assert cli._training_metrics(Session, None) is None
+    assert 'without metrics' in caplog.text
+
+
+def test_ingest_inserts_each_chunk_as_it_is_validated(Session, monkeypatch, tmp_path, capsys):
+    session = Session()
+    add_companies(session, 2)
+    session.commit()
+    path = tmp_path / 'stocks.csv'
+    path.write_text('company_id,date,price\n'
+                    'C000,2014-01-02,10\n'
+                    'C000,2014-02-30,11\n'
+                    'C001,2014-01-02,12\n'
+                    'C001,2014-01-03,13\n'
+                    'C000,2014-01-03,x\n')
+
+    inserted = []
+    bulk_insert = db.bulk_insert
+
+    def tracked_bulk_insert(session, table, rows):
+        inserted.append(len(rows))
+        return bulk_insert(session, table, rows)
+
+    monkeypatch.setattr(cli, 'validate_csv', partial(cli.validate_csv, chunk_size=2))
+    monkeypatch.setattr(db, 'bulk_insert', tracked_bulk_insert)
+    cl_args = argparse.Namespace(table='stocks', path=str(path), rejects_path=None, concurrency=1)
+    cli._batch_ingest(Session, cl_args)
+
+    result = json.loads(capsys.readouterr().out)
+    assert (result['rows'], result['rejected']) == (3, 2)
+    assert inserted == [1, 2, 0]
+    rejects = (tmp_path / 'stocks.csv.rejects.csv').read_text().splitlines()
+    assert [line.split(',')[0] for line in rejects] == ['line', '3', '6']
+    assert db.get_watermark(Session())[0] == 3
@@ -0,0 +1,227 @@
+"""
+Tests of ``lib.db``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+from datetime import date
+
+# Third-party library imports.
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+# Infinium library imports.
+from lib import db
+from conftest import add_companies
+
+
+def stock_row(company_id, day, price=10.0):
+    return {'company_id': company_id, 'date': day, 'price': price, 'intrinsic_value': None}
+
+
+def test_orm_reads_see_every_sqlite_shard(tmp_path, configure):
+    url = 'sqlite:///{}'.format(tmp_path / 'partitioned.sqlite')
+    session = db.connect_database(url)()
+    add_companies(session, 1)
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2010, 6, 1))])
+    session.commit()
+
+    configure(db_partition_stocks=True)
+    Session = db.connect_database(url)
+    session = Session()
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2011, 6, 1)), stock_row('C000', date(2012, 6, 1))])
+    session.add(db.Stock(company_id='C000', date=date(2013, 6, 1), price=11.0))
+    session.commit()
+
+    session = Session()
+    dates = [stock.date.year for stock in session.query(db.Stock).order_by(db.Stock.date)]
+    assert dates == [2010, 2011, 2012, 2013]
+    assert len(db.get_company_record(session, 'C000').stocks) == 4
+    assert session.execute(text('SELECT count(*) FROM stocks_y2013')).scalar() == 1
+    assert session.execute(text('SELECT count(*) FROM stocks_unpartitioned')).scalar() == 1
+    window = db.get_stock_prices(session, date(2011, 1, 1), date(2012, 12, 31))
+    assert [row[1].year for row in window] == [2011, 2012]
+
+    db.detach_stock_partition(session, 2011)
+    session.commit()
+    assert [stock.date.year for stock in session.query(db.Stock).order_by(db.Stock.date)] == [2010, 2012, 2013]
+    assert db.get_watermark(session)[0] == 3
+
+
+def test_watermark_is_read_from_the_snapshot_table(tmp_path):
+    url = 'sqlite:///{}'.format(tmp_path / 'watermark.sqlite')
+    session = db.connect_database(url)()
+    add_companies(session, 2)
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2012, 1, 2)),
+                                       stock_row('C000', date(2012, 1, 3)),
+                                       stock_row('C001', date(2012, 1, 4))])
+    session.commit()
+    assert db.get_watermark(session) == (3, '2012-01-04', 0, None)
+
+    # Backfilling older prices changes the row count, though not the date.
+    db.bulk_insert(session, db.Stock, [stock_row('C001', date(2011, 1, 4))])
+    session.commit()
+    assert db.get_watermark(session) == (4, '2012-01-04', 0, None)
+
+    # A snapshot table without the row counts is counted again on connect.
+    session.execute(text('ALTER TABLE company_snapshot DROP COLUMN stock_rows'))
+    session.execute(text('ALTER TABLE company_snapshot DROP COLUMN finance_rows'))
+    session.commit()
+    session.close()
+    session = db.connect_database(url)()
+    assert db.get_watermark(session) == (4, '2012-01-04', 0, None)
+
+
+def test_unpartitioned_snapshot_tracks_latest_rows(Session):
+    session = Session()
+    add_companies(session, 2)
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2012, 1, 2), 10.0),
+                                       stock_row('C000', date(2012, 1, 3), 12.0),
+                                       stock_row('C001', date(2012, 1, 2), 5.0)])
+
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2011, 1, 3), 1.0)])
+    session.commit()
+    snapshots = db.get_company_snapshots(session)
+    assert [(s.company_id, s.stock_date, s.price) for s in snapshots] == [('C000', date(2012, 1, 3), 12.0),
+                                                                          ('C001', date(2012, 1, 2), 5.0)]
+
+
+def test_snapshot_table_is_backfilled_on_connect(tmp_path):
+    url = 'sqlite:///{}'.format(tmp_path / 'existing.sqlite')
+    session = db.connect_database(url)()
+    add_companies(session, 2)
+    session.execute(db.Stock.__table__.insert(), [stock_row('C000', date(2012, 1, 2)),
+                                                  stock_row('C001', date(2012, 1, 3))])
+    session.commit()
+    assert db.get_company_snapshots(session) == []
+
+    session = db.connect_database(url)()
+    assert [snapshot.company_id for snapshot in db.get_company_snapshots(session)] == ['C000', 'C001']
+    assert not db.backfill_company_snapshot(session)
+
+
+def test_read_then_write_paths_read_from_the_primary(tmp_path):
+    primary_url = 'sqlite:///{}'.format(tmp_path / 'primary.sqlite')
+    db.connect_database(primary_url)
+    db.connect_database('sqlite:///{}'.format(tmp_path / 'replica.sqlite'))
+    Session = sessionmaker(class_=db.RoutingSession,
+                           primary=create_engine(primary_url),
+                           replica=create_engine('sqlite:///{}'.format(tmp_path / 'replica.sqlite')))
+
+    session = Session()
+    add_companies(session, 1)
+    session.execute(db.Stock.__table__.insert(), [stock_row('C000', date(2012, 1, 2), 4.0)])
+    session.commit()
+
+    # A new transaction reads from the replica, which has not caught up.
+    assert db.get_company_snapshots(session) == []
+    db.refresh_company_snapshot(session)
+    session.commit()
+    with session.using_primary():
+        snapshots = db.get_company_snapshots(session)
+
+    assert [(snapshot.company_id, snapshot.price) for snapshot in snapshots] == [('C000', 4.0)]
+
+    db.refresh_screening_index(session, snapshots, [1])
+    session.commit()
+    db.refresh_screening_index(session, snapshots, [0])
+    session.commit()
+    with session.using_primary():
+        assert [entry.valuation for entry in session.query(db.ScreeningEntry)] == [0]
+
+
+
+def test_locking_reads_and_explicit_transactions_use_the_primary(tmp_path):
+    primary_url = 'sqlite:///{}'.format(tmp_path / 'primary.sqlite')
+    db.connect_database(primary_url)
+    db.connect_database('sqlite:///{}'.format(tmp_path / 'replica.sqlite'))
+    Session = sessionmaker(class_=db.RoutingSession,
+                           primary=create_engine(primary_url),
+                           replica=create_engine('sqlite:///{}'.format(tmp_path / 'replica.sqlite')))
+
+    session = Session()
+    add_companies(session, 1)
+    session.commit()
+
+    assert session.query(db.Company).all() == []
+    assert [company.id for company in session.query(db.Company).with_for_update()] == ['C000']
+    session.commit()
+    with session.begin():
+        assert [company.id for company in session.query(db.Company)] == ['C000']
+
+    assert db._is_read(text('SELECT id FROM companies'))
+    assert not db._is_read(text('SELECT id FROM companies FOR NO KEY UPDATE'))
+
+
+def test_screens_count_companies_without_intrinsic_value(Session):
+    session = Session()
+    add_companies(session, 3)
+    db.bulk_insert(session, db.Stock, [dict(stock_row('C000', date(2012, 1, 2)), intrinsic_value=20.0),
+                                       stock_row('C001', date(2012, 1, 2)),
+                                       stock_row('C002', date(2012, 1, 2))])
+    snapshots = db.get_company_snapshots(session)
+    db.refresh_screening_index(session, snapshots, [1, 1, 0], replace_all=True)
+    session.commit()
+
+    assert [entry.company_id for entry in db.screen_companies(session)] == ['C000']
+    assert db.count_unscreenable(session) == 2
+    assert db.count_unscreenable(session, industry_ids=[-1]) == 0
+
+
+def test_orm_updates_and_deletes_reach_sqlite_shards(tmp_path, configure):
+    configure(db_partition_stocks=True)
+    Session = db.connect_database('sqlite:///{}'.format(tmp_path / 'partitioned.sqlite'))
+    session = Session()
+    add_companies(session, 1)
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2012, 6, 1)), stock_row('C000', date(2013, 6, 1))])
+    session.commit()
+
+    stock = session.query(db.Stock).filter_by(date=date(2012, 6, 1)).one()
+    stock.intrinsic_value = 15.0
+    session.commit()
+    assert session.execute(text('SELECT intrinsic_value FROM stocks_y2012')).scalar() == 15.0
+
+    stock.date = date(2013, 7, 1)
+    session.commit()
+    assert session.execute(text('SELECT count(*) FROM stocks_y2012')).scalar() == 0
+    assert session.execute(text('SELECT count(*) FROM stocks_y2013')).scalar() == 2
+
+    session.delete(session.query(db.Stock).filter_by(date=date(2013, 6, 1)).one())
+    session.commit()
+    assert [(stock.date, stock.intrinsic_value) for stock in session.query(db.Stock)] == [(date(2013, 7, 1), 15.0)]
+
+
+def test_partitions_of_rolled_back_transactions_are_recreated(tmp_path, configure):
+    configure(db_partition_stocks=True)
+    Session = db.connect_database('sqlite:///{}'.format(tmp_path / 'partitioned.sqlite'))
+    session = Session()
+    add_companies(session, 1)
+    session.commit()
+
+    # The partition is created in the transaction of the new company.
+    session.add(db.Industry(name='Energy'))
+    session.flush()
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2014, 6, 1))])
+    session.rollback()
+    assert session.execute(text("SELECT count(*) FROM sqlite_master WHERE name = 'stocks_y2014'")).scalar() == 0
+
+    db.bulk_insert(session, db.Stock, [stock_row('C000', date(2014, 6, 1))])
+    session.commit()
+    assert session.execute(text('SELECT count(*) FROM stocks_y2014')).scalar() == 1
@@ -0,0 +1,61 @@
+"""
+Tests of ``lib.features``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib.features import StreamingNormalizer, industry_codes
+
+
+def test_streaming_statistics_match_a_single_pass():
+    features = np.random.RandomState(0).normal(loc=1e9, scale=3.0, size=(1000, 3))
+    normalizer = StreamingNormalizer(3)
+    for chunk in np.array_split(features, [1, 7, 300, 301]):
+        normalizer.update(chunk)
+
+    assert normalizer.count == 1000
+    np.testing.assert_allclose(normalizer.mean, features.mean(axis=0))
+    np.testing.assert_allclose(normalizer.scale, features.std(axis=0))
+    np.testing.assert_allclose(normalizer.transform(features).mean(axis=0), 0, atol=1e-6)
+
+
+def test_merged_normalizers_match_one_normalizer():
+    features = np.random.RandomState(1).normal(size=(100, 2))
+    left, right, whole = StreamingNormalizer(2), StreamingNormalizer(2), StreamingNormalizer(2)
+    left.update(features[:30])
+    right.update(features[30:])
+    right.update(np.zeros((0, 2)))
+    left.merge(right)
+    whole.update(features)
+    np.testing.assert_allclose(left.mean, whole.mean)
+    np.testing.assert_allclose(left.variance, whole.variance)
+
+
+def test_constant_features_keep_unit_scale():
+    normalizer = StreamingNormalizer(2)
+    normalizer.update([[1.0, 2.0], [1.0, 4.0]])
+    np.testing.assert_allclose(normalizer.scale, [1.0, 1.0])
+
+
+def test_unknown_industries_have_no_code():
+    np.testing.assert_array_equal(industry_codes(np.array([3, 5, 9]), [5, 4, 9, 10, 3]), [1, -1, 2, -1, 0])
@@ -0,0 +1,87 @@
+"""
+Tests of point-in-time lookups and forward return labels.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+from datetime import date
+
+# Third-party library imports.
+import numpy as np
+
+# Infinium library imports.
+from lib import db, labels
+from lib.labels import Timeline, date_days, forward_returns
+from conftest import add_companies
+
+
+def timeline():
+    return Timeline.from_prices([('B', date(2014, 1, 2), 20.0),
+                                 ('A', date(2014, 1, 3), 11.0),
+                                 ('A', date(2014, 1, 1), 10.0),
+                                 ('B', date(2014, 1, 5), 21.0)])
+
+
+def test_last_at_or_before_includes_as_of_date():
+    prices = timeline()
+    codes = prices.codes(['A', 'A', 'A', 'B', 'C'])
+    days = date_days([date(2013, 12, 31), date(2014, 1, 1), date(2014, 1, 2),
+                      date(2014, 1, 4), date(2014, 1, 9)])
+    indices = prices.last_at_or_before(codes, days)
+
+    assert indices[[0, 4]].tolist() == [-1, -1]
+    assert prices.values[indices[1:4]].tolist() == [10.0, 10.0, 20.0]
+
+
+def test_first_at_or_after_stays_within_company():
+    prices = timeline()
+    codes = prices.codes(['A', 'A', 'B'])
+    days = date_days([date(2014, 1, 2), date(2014, 1, 4), date(2014, 1, 5)])
+    indices = prices.first_at_or_after(codes, days)
+
+    assert indices[1] == -1
+    assert prices.values[indices[[0, 2]]].tolist() == [11.0, 21.0]
+
+
+def test_forward_returns_start_after_finances_are_available():
+    price_rows = [('A', date(2014, 1, 1), 10.0),
+                  ('A', date(2014, 1, 2), 12.0),
+                  ('A', date(2014, 1, 12), 18.0)]
+    returns = forward_returns(np.array(['A']), np.array([2013]), Timeline.from_prices(price_rows), [10])
+
+    # The price on the day the finances become available is not tradable.
+    assert returns[0, 0] == 0.5
+
+
+def test_stock_history_is_read_in_chunks(Session, monkeypatch):
+    session = Session()
+    add_companies(session, 3)
+    rows = [{'company_id': company_id, 'date': date(2014, 1, day), 'price': float(day), 'intrinsic_value': None}
+            for company_id in ('C002', 'C000', 'C001') for day in range(1, 6)]
+
+    db.bulk_insert(session, db.Stock, rows)
+    session.commit()
+    monkeypatch.setattr(labels.ChunkSizer, 'size', property(lambda self: 4))
+    chunked = Timeline.from_stock_history(session)
+    whole = Timeline.from_prices(db.get_stock_prices(session))
+
+    assert chunked.companies.tolist() == ['C000', 'C001', 'C002']
+    assert chunked.keys.tolist() == whole.keys.tolist()
+    assert chunked.values.tolist() == whole.values.tolist()
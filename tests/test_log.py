@@ -0,0 +1,112 @@
+"""
+Tests of ``lib.log``.
+
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import json
+import logging
+from logging.handlers import TimedRotatingFileHandler
+
+# Infinium library imports.
+from lib import log
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+def queue_logger(monkeypatch, name, handler, debug_sample_rate=1.0):
+    monkeypatch.setattr(log.atexit, 'register', lambda function: None)
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    listener = log.start_queue_logging(logger, [handler], debug_sample_rate)
+
+    return logger, listener
+
+
+def test_arguments_are_captured_when_logged(monkeypatch):
+    handler = ListHandler()
+    logger, listener = queue_logger(monkeypatch, 'test_log.arguments', handler)
+    items = [1]
+    logger.info('items %s', items)
+    items.append(2)
+    try:
+        raise ValueError('bad')
+
+    except ValueError:
+        logger.exception('failed')
+
+    listener.stop()
+    assert handler.messages[0] == 'items [1]'
+    assert handler.messages[1].startswith('failed\nTraceback')
+    assert handler.messages[1].endswith('ValueError: bad')
+
+
+def test_json_output(monkeypatch):
+    handler = ListHandler()
+    handler.setFormatter(log.create_formatter('json'))
+    logger, listener = queue_logger(monkeypatch, 'test_log.json', handler)
+    try:
+        raise KeyError('missing')
+
+    except KeyError:
+        logger.error('lookup of %s failed', 'x', exc_info=True)
+
+    listener.stop()
+    document = json.loads(handler.messages[0])
+    assert (document['level'], document['logger'], document['message']) == ('ERROR', 'test_log.json',
+                                                                          'lookup of x failed')
+    assert "KeyError: 'missing'" in document['exception']
+
+
+def test_debug_sampling_keeps_every_nth_debug_record(monkeypatch):
+    handler = ListHandler()
+    logger, listener = queue_logger(monkeypatch, 'test_log.sampling', handler, debug_sample_rate=0.25)
+    for number in range(8):
+        logger.debug('debug %d', number)
+
+    logger.warning('warning')
+    listener.stop()
+    assert handler.messages == ['debug 3', 'debug 7', 'warning']
+
+
+def test_size_based_rotation(tmp_path):
+    handler = log.create_file_handler(tmp_path / 'infinium.log', max_bytes=100, backup_count=2)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    for number in range(10):
+        handler.emit(logging.makeLogRecord({'msg': 'line {:02} '.format(number) + 'x' * 40}))
+
+    handler.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['infinium.log', 'infinium.log.1', 'infinium.log.2']
+    assert (tmp_path / 'infinium.log').read_text().startswith('line 08')
+
+
+def test_time_based_rotation_takes_precedence(tmp_path):
+    handler = log.create_file_handler(tmp_path / 'infinium.log', max_bytes=100, rotate_when='midnight')
+    handler.close()
+    assert isinstance(handler, TimedRotatingFileHandler)
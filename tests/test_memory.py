@@ -0,0 +1,95 @@
+"""
+Tests of ``lib.memory``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Third-party library imports.
+import pytest
+
+# Infinium library imports.
+from lib import memory
+from lib.memory import ChunkSizer, memory_budget, parse_size
+
+
+MB = 2 ** 20
+
+
+@pytest.mark.parametrize('size, expected', [('512', 512),
+                                            ('64KB', 64 * 2 ** 10),
+                                            ('1.5 MB', int(1.5 * MB)),
+                                            ('8GiB', 8 * 2 ** 30),
+                                            (' 2t ', 2 * 2 ** 40)])
+def test_parse_size_suffixes(size, expected):
+    assert parse_size(size) == expected
+
+
+@pytest.mark.parametrize('size', ['', 'MB', '-1GB', '1PB', '1 G B', 'lots'])
+def test_parse_size_rejects_bad_input(size):
+    with pytest.raises(ValueError, match='Invalid memory size'):
+        parse_size(size)
+
+
+def test_memory_budget_settings(configure, monkeypatch):
+    monkeypatch.setattr(memory, 'current_rss', lambda: 100 * MB)
+    monkeypatch.setattr(memory, 'available_memory', lambda: 1000 * MB)
+    configure(memory_budget='auto')
+    assert memory_budget() == 100 * MB + 1000 * MB * memory.AUTO_BUDGET_FRACTION
+
+    configure(memory_budget='256MB')
+    assert memory_budget() == 256 * MB
+
+    configure(memory_budget='some')
+    with pytest.raises(ValueError):
+        memory_budget()
+
+
+def test_chunk_size_is_clamped(monkeypatch):
+    monkeypatch.setattr(memory, 'current_rss', lambda: 100 * MB)
+    assert ChunkSizer(1000 * MB, 1, maximum=5000).size == 5000
+    assert ChunkSizer(1000 * MB, 10 * MB, minimum=50).size == 50
+
+    # Above the high water mark chunks shrink to the minimum.
+    assert ChunkSizer(105 * MB, 1, minimum=50).size == 50
+
+
+def test_chunk_size_follows_measured_row_size(monkeypatch):
+    rss = [100 * MB]
+    monkeypatch.setattr(memory, 'current_rss', lambda: rss[0])
+    sizer = ChunkSizer(500 * MB, 1024, minimum=1, maximum=10 ** 9)
+    assert sizer.size == 100 * 1024
+
+    # Larger rows are adopted at once.
+    sizer.observe(1000, 4096 * 1000)
+    assert sizer.size == 100 * 256
+
+    # Smaller rows are adopted gradually.
+    sizer.observe(1000, 1024 * 1000)
+    assert sizer.bytes_per_row == 0.75 * 4096 + 0.25 * 1024
+    assert 100 * 256 < sizer.size < 100 * 1024
+
+    # Measurements without rows or growth are ignored.
+    sizer.observe(0, MB)
+    sizer.observe(1000, 0)
+    assert sizer.bytes_per_row == 0.75 * 4096 + 0.25 * 1024
+
+    # Chunks shrink as resident memory approaches the budget.
+    size = sizer.size
+    rss[0] = 300 * MB
+    assert sizer.size == size // 2
@@ -0,0 +1,52 @@
+"""
+Tests of ``lib.metrics``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Third-party library imports.
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+# Infinium library imports.
+from lib import metrics
+
+
+def test_failed_statements_do_not_leak_start_times():
+    engine = create_engine('sqlite://')
+    metrics.instrument_engine(engine)
+    with engine.connect() as connection:
+        for attempt in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM missing'))
+
+        assert connection.execute(text('SELECT 1')).scalar() == 1
+        assert connection.info['infinium_query_start'] == []
+
+
+def test_histogram_counts_observations():
+    registry = metrics.Registry()
+    histogram = metrics.Histogram('test_seconds', 'Test.', buckets=(0.1, 1.0), registry=registry)
+    histogram.observe(0.05, verb='SELECT')
+    histogram.observe(0.5, verb='SELECT')
+    exposed = registry.expose()
+    assert 'test_seconds_bucket{verb="SELECT",le="0.1"} 1' in exposed
+    assert 'test_seconds_bucket{verb="SELECT",le="1.0"} 2' in exposed
+    assert 'test_seconds_count{verb="SELECT"} 2' in exposed
@@ -0,0 +1,235 @@
+"""
+Tests of ``lib.ml``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Third-party library imports.
+import numpy as np
+import pytest
+
+# Infinium library imports.
+from lib import db, ml
+from lib.features import FINANCE_FEATURES, StreamingNormalizer, industry_codes
+from lib.scoring import LinearScorer
+from conftest import add_companies, finances_row
+
+
+class FixedModel:
+    """ A model that predicts given labels. """
+
+    def __init__(self, predictions):
+        self.predictions = iter(predictions)
+
+    def predict(self, features, industry_ids=None):
+        return np.array(next(self.predictions))
+
+
+def test_evaluate_model_counts_every_chunk():
+    testing_data = [(np.zeros((3, 1)), None, [1, 0, 1]),
+                    (np.zeros((2, 1)), None, [0, 1])]
+
+    metrics = ml.evaluate_model(FixedModel([[1, 1, 0], [0, 1]]), testing_data)
+    assert metrics['samples'] == 5
+    assert (metrics['true_positives'], metrics['false_positives']) == (2, 1)
+    assert (metrics['true_negatives'], metrics['false_negatives']) == (1, 1)
+    assert metrics['accuracy'] == pytest.approx(0.6)
+    assert metrics['precision'] == pytest.approx(2 / 3)
+    assert metrics['recall'] == pytest.approx(2 / 3)
+    assert metrics['f1'] == pytest.approx(2 / 3)
+
+
+def test_evaluate_model_leaves_undefined_metrics_empty():
+    metrics = ml.evaluate_model(FixedModel([[0, 0]]), [(np.zeros((2, 1)), None, [0, 0])])
+    assert metrics['accuracy'] == 1.0
+    assert metrics['precision'] is None
+    assert metrics['recall'] is None
+    assert metrics['f1'] is None
+
+
+def test_evaluate_model_without_data():
+    with pytest.raises(ValueError):
+        ml.evaluate_model(FixedModel([]), [])
+
+
+def test_splits_hold_out_whole_companies(Session, configure):
+    configure(label_holdout_fraction=0.3)
+    session = Session()
+    company_ids = add_companies(session, 40)
+    rows = [finances_row(company_id, year, net_sales=float(number))
+            for number, company_id in enumerate(company_ids) for year in (2010, 2011)]
+
+    db.bulk_insert(session, db.Finances, rows)
+    session.commit()
+    labels = {(row['company_id'], row['year'].year): 1 for row in rows}
+    column = FINANCE_FEATURES.index('net_sales')
+
+    def companies(split):
+        chunks = ml.extract_training_data(Session, chunk_size=7, labels=labels, split=split)
+        return [number for features, industry_ids, targets in chunks for number in features[:, column]]
+
+    train, test = companies('train'), companies('test')
+    assert sorted(train + test) == sorted(companies(None))
+    assert train and test
+    assert not set(train) & set(test)
+    assert len(test) == 2 * len(set(test))
+
+
+def test_unknown_split():
+    with pytest.raises(ValueError):
+        list(ml.extract_training_data(None, labels={}, split='validation'))
+
+
+def test_training_reads_the_database_once_with_final_scaling(Session, configure, monkeypatch):
+    configure(label_holdout_fraction=0.0, checkpoint_path=None, sgd_ensemble_size=1, sgd_n_iter=2)
+    session = Session()
+    company_ids = add_companies(session, 30)
+    rows = [finances_row(company_id, year, net_sales=float(year * number))
+            for number, company_id in enumerate(company_ids) for year in (2010, 2011)]
+
+    db.bulk_insert(session, db.Finances, rows)
+    session.commit()
+    labels = {(row['company_id'], row['year'].year): number % 2 for number, row in enumerate(rows)}
+    monkeypatch.setattr(ml, 'get_labels', lambda Session: labels)
+    monkeypatch.setattr(ml.ChunkSizer, 'size', property(lambda self: 10))
+    counts = []
+    original = ml.train_classifier
+
+    def train_classifier(valuation_model, training_data):
+        for chunk in training_data:
+            counts.append(valuation_model.normalizer.count)
+            original(valuation_model, [chunk])
+
+    reads = []
+    training_batches = ml._training_batches
+
+    def counted_training_batches(*args, **kwargs):
+        reads.append(args)
+        return training_batches(*args, **kwargs)
+
+    monkeypatch.setattr(ml, 'train_classifier', train_classifier)
+    monkeypatch.setattr(ml, '_training_batches', counted_training_batches)
+    valuation_model = ml.construct_model(Session)
+    assert counts == [len(rows)] * 12
+    assert len(reads) == 1
+    features = np.array([[row[feature] for feature in FINANCE_FEATURES] for row in rows])
+    np.testing.assert_allclose(valuation_model.normalizer.mean, features.mean(axis=0))
+
+
+def test_ensemble_bands_match_scoring_artifact(tmp_path):
+    random_state = np.random.RandomState(0)
+    features = random_state.normal(size=(40, len(FINANCE_FEATURES)))
+    labels = (features[:, 0] > 0).astype(int)
+    normalizer = StreamingNormalizer(len(FINANCE_FEATURES))
+    normalizer.update(features)
+    members = []
+    for seed in range(3):
+        sample = np.random.RandomState(seed).randint(0, 40, 40)
+        member = ml.create_classifier()
+        member.partial_fit(ml.model_matrix(normalizer.transform(features[sample]), np.full(40, -1), 0),
+                           labels[sample], classes=ml.VALUATION_CLASSES)
+        members.append(member)
+
+    valuation_model = ml.ValuationModel(ml.BaggedClassifier(members), normalizer)
+    scores, deviations = valuation_model.decision_bands(features)
+    np.testing.assert_allclose(scores, valuation_model.decision_function(features))
+    assert (deviations > 0).all()
+
+    ml.export_scoring_artifact(valuation_model, tmp_path / 'scoring.npz')
+    artifact_scores, artifact_deviations = LinearScorer.load(tmp_path / 'scoring.npz').decision_bands(features)
+    np.testing.assert_allclose(artifact_scores, scores)
+    np.testing.assert_allclose(artifact_deviations, deviations)
+
+
+def test_scoring_artifact_matches_model_for_every_industry(tmp_path):
+    random_state = np.random.RandomState(1)
+    features = random_state.normal(size=(60, len(FINANCE_FEATURES)))
+    industries = [3, 7]
+    industry_ids = np.array([3, 7, 99, -1] * 15)
+    labels = ((features[:, 0] > 0) | (industry_ids == 7)).astype(int)
+    normalizer = StreamingNormalizer(len(FINANCE_FEATURES))
+    normalizer.update(features)
+    classifier = ml.create_classifier()
+    model_input = ml.model_matrix(normalizer.transform(features), industry_codes(industries, industry_ids), 2)
+    classifier.partial_fit(model_input, labels, classes=ml.VALUATION_CLASSES)
+
+    valuation_model = ml.ValuationModel(classifier, normalizer, industries=industries)
+    ml.export_scoring_artifact(valuation_model, tmp_path / 'scoring.npz')
+    scorer = LinearScorer.load(tmp_path / 'scoring.npz')
+
+    # Known, unknown (99) and missing (-1) industries score alike.
+    np.testing.assert_allclose(scorer.decision_function(features, industry_ids),
+                               valuation_model.decision_function(features, industry_ids))
+
+    np.testing.assert_array_equal(scorer.predict(features, industry_ids),
+                                  valuation_model.predict(features, industry_ids))
+
+    assert len(set(valuation_model.predict(features, industry_ids).tolist())) == 2
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_resumed_training_matches_uninterrupted_training(Session, configure, monkeypatch, tmp_path):
+    path = tmp_path / 'missing' / 'training.ckpt'
+    configure(label_holdout_fraction=0.0, checkpoint_path=path, checkpoint_seconds=0,
+              sgd_ensemble_size=1, sgd_n_iter=3)
+
+    session = Session()
+    company_ids = add_companies(session, 20)
+    rows = [finances_row(company_id, 2010, net_sales=float(number)) for number, company_id in enumerate(company_ids)]
+    db.bulk_insert(session, db.Finances, rows)
+    session.commit()
+    monkeypatch.setattr(ml, 'get_labels', lambda Session: {(row['company_id'], 2010): number % 2
+                                                           for number, row in enumerate(rows)})
+
+    monkeypatch.setattr(ml.ChunkSizer, 'size', property(lambda self: 5))
+    expected = ml.construct_model(Session).classifier.coef_
+    assert not path.exists()
+
+    saves = []
+    save_checkpoint = ml.save_checkpoint
+
+    def interrupting_save_checkpoint(checkpoint, path):
+        save_checkpoint(checkpoint, path)
+        saves.append(checkpoint.epoch)
+        if len(saves) == 6:
+            raise Interrupted()
+
+    monkeypatch.setattr(ml, 'save_checkpoint', interrupting_save_checkpoint)
+    with pytest.raises(Interrupted):
+        ml.construct_model(Session)
+
+    assert path.exists()
+    assert ml.load_checkpoint(path).offset == 10
+
+    # The resumed run sizes its chunks anew, from the checkpointed row.
+    monkeypatch.setattr(ml.ChunkSizer, 'size', property(lambda self: 3))
+    monkeypatch.setattr(ml, 'save_checkpoint', save_checkpoint)
+    resumed = ml.construct_model(Session, resume=True).classifier.coef_
+    np.testing.assert_allclose(resumed, expected, atol=1e-12)
+
+
+@pytest.mark.parametrize('fields', [{'checkpoint_path': None, 'sgd_ensemble_size': 1},
+                                    {'checkpoint_path': 'training.ckpt', 'sgd_ensemble_size': 2}])
+def test_resume_requires_checkpointed_training(Session, configure, fields):
+    configure(**fields)
+    with pytest.raises(ValueError, match='can be resumed'):
+        ml.construct_model(Session, resume=True)
@@ -0,0 +1,81 @@
+"""
+Tests of ``lib.querystats``.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import logging
+
+# Third-party library imports.
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+# Infinium library imports.
+from lib import log, querystats
+
+
+def test_normalize_sql_collapses_literals_and_lists():
+    statement = "SELECT * FROM stocks WHERE price > 10.5 AND company_id IN (?, ?, ?) AND name = 'a''b'"
+    assert querystats.normalize_sql(statement) == 'SELECT * FROM stocks WHERE price > ? AND company_id IN (?) AND name = ?'
+
+
+def test_statements_are_grouped_by_shape():
+    engine = create_engine('sqlite://')
+    statistics = querystats.QueryStatistics()
+    statistics.attach(engine)
+    with engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT * FROM missing'))
+
+        for number in range(3):
+            connection.execute(text('SELECT {}'.format(number)))
+
+        assert connection.info['infinium_stats_start'] == []
+
+    calls = {shape: calls for shape, calls, total, maximum, rows in statistics.statistics()}
+    assert calls['SELECT ?'] == 3
+
+
+def test_summary_is_logged_before_the_log_listener_stops(monkeypatch):
+    handlers = []
+    monkeypatch.setattr(log.atexit, 'register', handlers.append)
+    monkeypatch.setattr(querystats.atexit, 'register', handlers.append)
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger()
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    log.start_queue_logging(logger, [handler])
+    try:
+        statistics = querystats.QueryStatistics()
+        statistics.record('SELECT 1', 0.5, 1)
+        statistics.log_summary_at_exit()
+        statistics.log_summary_at_exit()
+        assert len(handlers) == 2
+        for exit_handler in reversed(handlers):
+            exit_handler()
+
+    finally:
+        logger.handlers = [h for h in logger.handlers if not isinstance(h, log.DeferredQueueHandler)]
+        logger.setLevel(level)
+
+    assert any(record.getMessage().startswith('Query statistics:') for record in records)
@@ -0,0 +1,87 @@
+"""
+Tests of the model registry.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import os
+
+# Third-party library imports.
+import numpy as np
+import pytest
+
+# Infinium library imports.
+from lib.registry import ModelRegistry, MODEL_FILE, SCORING_FILE
+
+
+def publish(registry, coefficient):
+    def write_files(directory):
+        (directory / MODEL_FILE).write_bytes(b'model')
+        np.savez(str(directory / SCORING_FILE), coefficients=np.array([coefficient]))
+
+    return registry.publish(write_files, {'created': str(coefficient)})
+
+
+def test_identical_models_share_a_version(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+
+    assert publish(registry, 1.0) == publish(registry, 1.0)
+    assert len(registry.versions()) == 1
+    assert not [entry for entry in (tmp_path / 'registry' / 'versions').iterdir()
+                if entry.name.startswith('.')]
+
+
+def test_activate_swaps_current_link(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+    first, second = publish(registry, 1.0), publish(registry, 2.0)
+    registry.activate(first)
+    registry.activate(second[:8])
+
+    assert registry.current == second
+    assert os.readlink(str(tmp_path / 'registry' / 'current')) == os.path.join('versions', second)
+    assert not (tmp_path / 'registry' / 'current.tmp').exists()
+    assert registry.metadata()['version'] == second
+
+
+def test_rollback_returns_to_previous_version(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+    first, second = publish(registry, 1.0), publish(registry, 2.0)
+    registry.activate(first)
+    registry.activate(second)
+
+    assert registry.rollback() == first
+    assert registry.current == first
+    with pytest.raises(KeyError):
+        registry.rollback()
+
+
+def test_resolve_rejects_unknown_versions(tmp_path):
+    registry = ModelRegistry(tmp_path / 'registry')
+    publish(registry, 1.0)
+    publish(registry, 2.0)
+
+    with pytest.raises(KeyError):
+        registry.resolve('x')
+
+    with pytest.raises(KeyError):
+        registry.resolve('')
+
+    with pytest.raises(KeyError):
+        registry.path()
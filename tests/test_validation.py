@@ -0,0 +1,86 @@
+"""
+Tests of the validation of bulk loaded records.
+
+Copyright 2014, 2015 Jerrad M. Genson
+
+This file is part of Infinium.
+
+Infinium is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Infinium is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Infinium.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Python standard library imports.
+import io
+from datetime import date
+
+# Third-party library imports.
+import pytest
+
+# Infinium library imports.
+from lib import db
+from lib.validation import validate_csv, write_rejects
+from lib.features import FINANCE_FEATURES
+
+
+def validate(table, text):
+    header, chunks = validate_csv(table, io.StringIO(text), chunk_size=2)
+    rows, rejects = [], []
+    for valid, rejected in chunks:
+        rows.extend(valid)
+        rejects.extend(rejected)
+
+    return header, rows, rejects
+
+
+def test_finances_accept_losses_and_precise_ratios():
+    values = {feature: '1' for feature in FINANCE_FEATURES}
+    values.update(net_income='-1500.25', operating_margin='0.1234', return_on_equity='-.5')
+    header = ['company_id', 'year'] + list(values)
+    text = ','.join(header) + '\nC000,2013-1-1,' + ','.join(values.values()) + '\n'
+    header, rows, rejects = validate(db.Finances, text)
+
+    assert rejects == []
+    assert rows[0]['year'] == date(2013, 1, 1)
+    assert (rows[0]['net_income'], rows[0]['operating_margin']) == (-1500.25, 0.1234)
+
+
+def test_stocks_reject_negative_prices_and_invalid_dates_with_reasons(tmp_path):
+    text = ('company_id,date,price,intrinsic_value\n'
+            'A,2014-01-02,10.50,\n'
+            'A,2014-02-30,10,\n'
+            'A,2014-01-03,-1,12\n'
+            'A,2014-01-04\n'
+            ',2014-01-05,1.123,\n')
+    header, rows, rejects = validate(db.Stock, text)
+
+    assert [(row['company_id'], row['price'], row['intrinsic_value']) for row in rows] == [('A', 10.5, None)]
+    reasons = {line: reason for line, fields, reason in rejects}
+    assert sorted(reasons) == [3, 4, 5, 6]
+    assert reasons[3] == 'date: not a valid date'
+    assert reasons[4].startswith('price: does not match')
+    assert reasons[5] == 'expected 4 fields, found 2'
+    assert 'company_id: missing value' in reasons[6] and 'price: does not match' in reasons[6]
+
+    path = tmp_path / 'rejects.csv'
+    write_rejects(str(path), header, rejects)
+    assert path.read_text().splitlines()[:2] == ['line,reason,company_id,date,price,intrinsic_value',
+                                                 '3,date: not a valid date,A,2014-02-30,10,']
+
+
+def test_header_must_name_required_columns():
+    with pytest.raises(ValueError):
+        validate_csv(db.Stock, io.StringIO('company_id,date\n'))
+
+    with pytest.raises(ValueError):
+        validate_csv(db.Stock, io.StringIO('company_id,date,price,colour\n'))